@@ -1,10 +1,20 @@
+from .agent.view import router as agent_router
 from .authentication.view import router as auth_router
+from .dispatch.view import router as dispatch_router
+from .executions.view import router as executions_router
 from .health_check.view import router as health_check_router
 from .jobs.queues.view import router as queue_router
 from .jobs.view import router as job_router
 from .logs.view import router as log_router
+from .metrics.view import router as metrics_router
 from .northbound.view import router as northbound_router
+from .presence.view import router as presence_router
+from .profiling.view import router as profiling_router
+from .queue_runs.view import router as queue_runs_router
 from .roles.view import router as roles_router
+from .rollouts.view import router as rollouts_router
+from .schedules.view import router as schedules_router
+from .sync.view import router as sync_router
 from .vbce.view import router as vbce_router
 from .vbuser.view import router as vbuser_router
 from .websocket.constants import WS_PATH
@@ -23,6 +33,15 @@ routers = (
     log_router,
     auth_router,
     wireguard_router,
+    sync_router,
+    agent_router,
+    profiling_router,
+    rollouts_router,
+    dispatch_router,
+    executions_router,
+    schedules_router,
+    queue_runs_router,
+    presence_router,
 )
 
 ws_urls = (WS_PATH,)
@@ -0,0 +1,5 @@
+from domain.api.sync.schemas import SyncEntity
+
+# Entity types the role part of a bundle is assembled from; a change to any
+# of them invalidates the cached role part.
+ROLE_BUNDLE_TYPES = (SyncEntity.ROLE, SyncEntity.JOB, SyncEntity.QUEUE)
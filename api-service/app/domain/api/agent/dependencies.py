@@ -0,0 +1,186 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from services.logging.logger import log as logger
+from services.redis.exceptions import RedisResponseError
+from services.singleflight import coalesce
+from domain.api.jobs.constants import JOB_PREFIX
+from domain.api.jobs.core import job_role_key
+from domain.api.jobs.queues.core import QueueRepository
+from domain.api.jobs.queues.expansion import expansion_key, queue_role_key
+from domain.api.jobs.queues.schemas import ExpandedQueue, JobQueueSchema
+from domain.api.jobs.schemas import JobSchema
+from domain.api.northbound.constants import UDPU_ENTITY
+from domain.api.roles.constants import ROLE_PREFIX
+from domain.api.roles.dependencies import decode_role, get_primary_ghn_interfaces
+from domain.api.sync.constants import SYNC_TYPE_REVISIONS_KEY
+from domain.api.sync.core import max_type_revision
+from domain.api.vbuser.constants import VBUSER_ENTITY
+from utils.utils import get_vb_uid
+
+from .constants import ROLE_BUNDLE_TYPES
+
+settings = get_app_settings()
+
+
+class RoleBundleCache:
+    """
+    Per-worker LRU of assembled role parts keyed by role name.
+
+    An entry is served only while its revision matches the current
+    role/job/queue revision; the TTL bounds staleness if a change log
+    write was ever lost.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[int, float, dict]]" = OrderedDict()
+
+    def get(self, role: str, revision: int) -> Optional[dict]:
+        entry = self._entries.get(role)
+        if entry is None:
+            return None
+        cached_revision, stored_at, value = entry
+        if cached_revision != revision or time.monotonic() - stored_at > self.ttl:
+            self._entries.pop(role, None)
+            return None
+        self._entries.move_to_end(role)
+        return value
+
+    def put(self, role: str, revision: int, value: dict) -> None:
+        self._entries[role] = (revision, time.monotonic(), value)
+        self._entries.move_to_end(role)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+role_bundle_cache = RoleBundleCache(settings.agent_bundle_cache_size, settings.agent_bundle_cache_ttl)
+
+
+async def build_role_part(redis: Redis, role_name: str) -> Optional[dict]:
+    """
+    Assemble the role, its jobs and its queues with every queue expanded
+    into the job definitions it runs. Jobs and queues are found through
+    their role indexes and queues read from their stored expansions, so
+    a build is two round trips whatever the size of the keyspace.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(f"{ROLE_PREFIX}:{role_name}")
+        pipe.smembers(job_role_key(role_name))
+        pipe.smembers(queue_role_key(role_name))
+        role_data, job_names, queue_names = await pipe.execute()
+    role = decode_role(role_data)
+    if role is None:
+        return None
+
+    job_names, queue_names = sorted(job_names), sorted(queue_names)
+    async with redis.pipeline(transaction=False) as pipe:
+        for name in job_names:
+            pipe.hgetall(f"{JOB_PREFIX}:{name}:{JobSchema._generate_uid(name)}")
+        for name in queue_names:
+            pipe.hgetall(expansion_key(JobQueueSchema._generate_uid(name)))
+        replies = await pipe.execute()
+
+    jobs = []
+    for data in replies[:len(job_names)]:
+        if not data:
+            continue
+        try:
+            job = JobSchema(**data)
+        except Exception as e:
+            logger.warning("Skipping malformed job %s: %s", data.get("name"), e)
+            continue
+        if job.role == role_name:
+            jobs.append(job.model_dump(mode="json"))
+
+    queues = []
+    for name, stored in zip(queue_names, replies[len(job_names):]):
+        # queues written before expansions existed get theirs built here
+        stored = stored or await QueueRepository(redis).get_expanded(name)
+        if not stored:
+            continue
+        expanded = ExpandedQueue.model_validate_json(stored["body"])
+        if expanded.queue.role != role_name:
+            continue
+        queue = expanded.queue.model_dump(mode="json")
+        queue["jobs"] = [job.model_dump(mode="json") for job in expanded.jobs]
+        queue["missing_jobs"] = expanded.missing_jobs
+        queues.append(queue)
+
+    return {"role": role, "jobs": jobs, "queues": queues}
+
+
+@coalesce("agent_bundle")
+async def get_role_part(redis: Redis, role_name: str, revision: int) -> Optional[dict]:
+    """
+    The role part at *revision*, cached per worker. Concurrent misses for
+    the same role and revision share one build.
+    """
+    cached = role_bundle_cache.get(role_name, revision)
+    if cached is not None:
+        return cached
+    part = await build_role_part(redis, role_name)
+    if part is not None:
+        role_bundle_cache.put(role_name, revision, part)
+    return part
+
+
+async def get_agent_bundle(redis: Redis, subscriber_uid: str) -> Optional[dict]:
+    """
+    Everything an agent fetches at boot, in two round trips when the role
+    part is cached: the UDPU with the change log revisions, then the vbuser.
+
+    :return: the bundle, or None if the UDPU does not exist.
+    """
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hgetall(f"{UDPU_ENTITY}:{subscriber_uid}")
+        pipe.hgetall(SYNC_TYPE_REVISIONS_KEY)
+        udpu, type_revisions = await pipe.execute()
+        if not udpu:
+            return None
+
+        revision = max_type_revision({k: int(v) for k, v in (type_revisions or {}).items()}, ROLE_BUNDLE_TYPES)
+        role_part = await get_role_part(redis, udpu.get("role", ""), revision) if udpu.get("role") else None
+
+        vbuser = None
+        if role_part is not None:
+            ghn_interface, lcmp_interface = get_primary_ghn_interfaces(role_part["role"])
+            vbuser = await redis.hgetall(f"{VBUSER_ENTITY}:{get_vb_uid(subscriber_uid, ghn_interface)}")
+            if vbuser:
+                vbuser["ghn_interface"] = ghn_interface
+                vbuser["lcmp_interface"] = lcmp_interface
+    except RedisError as e:
+        logger.error(e)
+        raise RedisResponseError(message=str(e))
+
+    return {
+        "revision": revision,
+        "udpu": udpu,
+        "role": role_part["role"] if role_part else None,
+        "vbuser": vbuser or None,
+        "jobs": role_part["jobs"] if role_part else [],
+        "queues": role_part["queues"] if role_part else [],
+    }
+
+
+def bundle_etag(bundle: Dict) -> str:
+    body = json.dumps(bundle, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(body.encode()).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi_utils.cbv import cbv
+
+from config import get_app_settings
+from services.redis import get_batching_redis
+from services.redis.exceptions import RedisResponseError
+
+from .dependencies import bundle_etag, etag_matches, get_agent_bundle
+
+router = APIRouter()
+
+
+@cbv(router)
+class AgentBundleResource:
+    settings = get_app_settings()
+
+    @router.get("/agent/{subscriber_uid}/bundle")
+    async def get(
+        self,
+        subscriber_uid: str,
+        request: Request,
+        if_none_match: Optional[str] = Header(None),
+    ):
+        """
+        Return the UDPU, role, vbuser, role jobs and expanded queues in one
+        response. Send the previous ETag as If-None-Match to get 304 when
+        nothing changed.
+        """
+        redis = get_batching_redis(request)
+        try:
+            bundle = await get_agent_bundle(redis, subscriber_uid)
+        except RedisResponseError as e:
+            return JSONResponse(status_code=500, content={"message": e.message})
+
+        if bundle is None:
+            return JSONResponse(
+                status_code=404,
+                content={"message": f"Udpu object with subscriber_uid {subscriber_uid} not found"},
+            )
+
+        etag = bundle_etag(bundle)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(status_code=200, content=bundle, headers=headers)
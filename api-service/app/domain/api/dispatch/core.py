@@ -0,0 +1,78 @@
+"""
+One-shot fan-out of a job or queue to every selected device.
+
+A dispatch is stored as a rollout of a single wave without a success gate,
+so results, timeouts and aborts are handled by the rollout engine. Unlike
+a rollout, its stream entries are all written while the request is served.
+"""
+import time
+import uuid
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from domain.api.rollouts.core import (
+    RolloutError,
+    activate_rollout,
+    dispatch,
+    fail_undispatched,
+    resolve_payload,
+    resolve_targets,
+    store_rollout,
+)
+from domain.api.rollouts.schemas import Rollout, RolloutKind, RolloutStatus
+from services.logging.logger import log as logger
+from services.redis.exceptions import RedisResponseError
+
+from .schemas import DispatchCreate
+
+settings = get_app_settings()
+
+
+async def create_dispatch(redis: Redis, request: DispatchCreate) -> Rollout:
+    """
+    :raises RolloutError: unknown or locked payload, or no device matches.
+    :raises RedisResponseError: writing the stream entries failed; devices
+        reached before the failure are still tracked, the others are
+        recorded as failed.
+    """
+    action_type, payload_name, message, awaited = await resolve_payload(redis, request)
+    subscribers = await resolve_targets(redis, request.target)
+    if not subscribers:
+        raise RolloutError("No devices match the target")
+
+    now = time.time()
+    rollout = Rollout(
+        id=uuid.uuid4().hex,
+        kind=RolloutKind.DISPATCH,
+        action_type=action_type,
+        payload_name=payload_name,
+        lane=request.lane,
+        jobs=awaited,
+        status=RolloutStatus.RUNNING,
+        wave_size=len(subscribers),
+        max_concurrency=len(subscribers),
+        success_threshold=0,
+        device_timeout=request.device_timeout or settings.rollout_device_timeout,
+        total=len(subscribers),
+        created_at=now,
+        updated_at=now,
+    )
+    # the engine would see an empty, finished rollout before the first chunk lands
+    await store_rollout(redis, rollout, message, active=False)
+    try:
+        await dispatch(redis, rollout, message, subscribers)
+    except RedisError as e:
+        logger.error("Dispatch %s stopped: %s", rollout.id, e)
+        try:
+            missed = await fail_undispatched(redis, rollout, subscribers)
+            logger.error("Dispatch %s: %s devices not reached", rollout.id, missed)
+        except RedisError as error:
+            logger.error("Cannot record the devices dispatch %s did not reach: %s", rollout.id, error)
+        raise RedisResponseError(message=str(e))
+    finally:
+        await activate_rollout(redis, rollout.id)
+    logger.info(f"Dispatch {rollout.id}: {action_type} {payload_name} to {len(subscribers)} devices "
+                f"in {time.time() - now:.2f}s")
+    return rollout
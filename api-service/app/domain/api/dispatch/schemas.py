@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from domain.api.rollouts.schemas import Rollout, RolloutStatus, RolloutTarget
+from domain.api.websocket.constants import CommandLane
+
+
+class DispatchCreate(BaseModel):
+    job: Optional[str] = Field(None, description="Job name or uid")
+    queue: Optional[str] = Field(None, description="Queue name or uid")
+    target: RolloutTarget
+    device_timeout: Optional[int] = Field(None, ge=1, description="Seconds to wait for a device's job log")
+    lane: CommandLane = CommandLane.BULK
+
+    @model_validator(mode="after")
+    def _one_payload(self) -> "DispatchCreate":
+        if bool(self.job) == bool(self.queue):
+            raise ValueError("set exactly one of job and queue")
+        return self
+
+
+class DispatchProgress(BaseModel):
+    """Aggregate progress; ``settled`` counts devices with a final result."""
+
+    id: str
+    status: RolloutStatus
+    action_type: str
+    payload_name: str
+    total: int
+    dispatched: int
+    in_flight: int
+    settled: int
+    succeeded: int
+    failed: int
+    timed_out: int
+    cancelled: int
+    created_at: float
+
+    @classmethod
+    def from_rollout(cls, rollout: Rollout) -> "DispatchProgress":
+        return cls(settled=rollout.resolved + rollout.cancelled, **rollout.model_dump())
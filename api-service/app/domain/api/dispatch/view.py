@@ -0,0 +1,54 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi_utils.cbv import cbv
+
+from domain.api.rollouts.core import RolloutConflict, RolloutError, abort_rollout, get_rollout
+from domain.api.rollouts.schemas import RolloutKind
+from services.redis.exceptions import RedisResponseError
+
+from .core import create_dispatch
+from .schemas import DispatchCreate, DispatchProgress
+
+router = APIRouter()
+
+
+@cbv(router)
+class DispatchAPI:
+    """
+    Send a job or queue to many devices in one call.
+    """
+
+    @router.post("/dispatch", response_model=DispatchProgress, status_code=HTTPStatus.ACCEPTED)
+    async def create(self, request: Request, body: DispatchCreate) -> DispatchProgress:
+        """
+        Write the command to every target's stream and return the dispatch
+        id; poll `GET /dispatch/{id}` for results.
+        """
+        redis = request.app.state.redis
+        try:
+            rollout = await create_dispatch(redis, body)
+        except RolloutError as e:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.message)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+        return DispatchProgress.from_rollout(await get_rollout(redis, rollout.id))
+
+    @router.get("/dispatch/{dispatch_id}", response_model=DispatchProgress)
+    async def get(self, request: Request, dispatch_id: str) -> DispatchProgress:
+        rollout = await get_rollout(request.app.state.redis, dispatch_id)
+        if rollout is None or rollout.kind != RolloutKind.DISPATCH:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Dispatch '{dispatch_id}' not found")
+        return DispatchProgress.from_rollout(rollout)
+
+    @router.post("/dispatch/{dispatch_id}/abort", response_model=DispatchProgress)
+    async def abort(self, request: Request, dispatch_id: str) -> DispatchProgress:
+        """Withdraw the commands agents have not read yet."""
+        redis = request.app.state.redis
+        try:
+            await abort_rollout(redis, dispatch_id)
+        except RolloutConflict as e:
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=e.message)
+        except RolloutError as e:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.message)
+        return DispatchProgress.from_rollout(await get_rollout(redis, dispatch_id))
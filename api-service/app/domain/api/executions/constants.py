@@ -0,0 +1,19 @@
+from enum import Enum
+
+EXECUTION_PREFIX = "EXEC"
+
+# stages timed for every dispatched command, see core.record_report
+STAGE_QUEUED = "queued"
+STAGE_TRANSIT = "transit"
+STAGE_EXECUTION = "execution"
+STAGE_TOTAL = "total"
+
+
+class OutputEvent(str, Enum):
+    """Entries of an execution's output stream, also the SSE event names."""
+    # a chunk of a job's stdout or stderr
+    OUTPUT = "output"
+    # a job finished, with its exit code
+    EXIT = "exit"
+    # the agent is done with the execution
+    END = "end"
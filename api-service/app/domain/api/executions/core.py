@@ -0,0 +1,259 @@
+"""
+End-to-end timing of commands dispatched to devices.
+
+Every job or queue entry written to a device stream gets an execution id
+and a record at EXEC:<id>. The deliverer stamps it when the entry goes
+out on the agent's WebSocket, and the agent echoes the id in its job log
+together with its own start time and run duration. Stages:
+
+- queued: dispatch to delivery, the entry waiting in the device stream;
+- execution: the command's run time measured by the agent;
+- transit: the rest of the round trip, delivery to the log arriving,
+  minus the execution;
+- total: dispatch to the log arriving.
+
+Agent clocks are never compared with server ones. A queue reports once per
+job: each report adds an execution sample for that job, and the queued
+stage is taken from the first one; transit and total are only kept for
+single jobs.
+
+What the commands print goes to a separate stream, EXEC:<id>:output. The
+agent sends its output over the WebSocket in chunks while a job runs, then
+the job's exit code, then an end marker once the whole execution is done;
+clients follow the stream as server-sent events and resume from the last
+entry id they saw.
+"""
+import json
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from domain.api.logs.schemas import JobLogSchema
+from domain.api.northbound.constants import UDPU_ENTITY
+from services.logging.logger import log as logger
+from services.metrics import (
+    COMMAND_STAGE_BY_JOB,
+    COMMAND_STAGE_BY_ROLE,
+    EXECUTION_OUTPUT_STREAMS,
+    bucket_quantile,
+    histogram_buckets_by,
+)
+from services.redis.redis import REDIS_SOCKET_TIMEOUT
+
+from .constants import (
+    EXECUTION_PREFIX,
+    STAGE_EXECUTION,
+    STAGE_QUEUED,
+    STAGE_TOTAL,
+    STAGE_TRANSIT,
+    OutputEvent,
+)
+from .schemas import Execution, StageLatency
+
+settings = get_app_settings()
+
+_HISTOGRAM_NAMES = {
+    "job": "command_stage_seconds_by_job",
+    "role": "command_stage_seconds_by_role",
+}
+
+# Appends entry ARGV[3..] to output stream KEYS[2] if execution KEYS[1] is known.
+_APPEND_OUTPUT_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local id = redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[1], '*', unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return id
+"""
+
+
+def execution_key(execution_id: str) -> str:
+    return f"{EXECUTION_PREFIX}:{execution_id}"
+
+
+def output_key(execution_id: str) -> str:
+    return f"{EXECUTION_PREFIX}:{execution_id}:output"
+
+
+def track_execution(pipe, subscriber_uid: str, message: dict) -> dict:
+    """
+    Queue the record of a new execution on *pipe*, to be executed with the
+    XADD of the returned entry.
+
+    :return: *message* tagged with the execution id.
+    """
+    execution_id = uuid.uuid4().hex
+    key = execution_key(execution_id)
+    pipe.hset(key, mapping={
+        "id": execution_id,
+        "subscriber_uid": subscriber_uid,
+        "action_type": message["action_type"],
+        "name": message["name"],
+        "dispatched_at": time.time(),
+    })
+    pipe.expire(key, settings.execution_retention)
+    return {**message, "execution_id": execution_id}
+
+
+async def mark_delivered(redis: Redis, execution_id: str) -> None:
+    """Record when the entry was sent to the agent; a resend keeps the first time."""
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hsetnx(execution_key(execution_id), "delivered_at", time.time())
+        pipe.expire(execution_key(execution_id), settings.execution_retention)
+        await pipe.execute()
+
+
+def _observe(stage: str, job: str, role: str, seconds: float) -> None:
+    COMMAND_STAGE_BY_JOB.labels(stage, job).observe(max(seconds, 0.0))
+    COMMAND_STAGE_BY_ROLE.labels(stage, role).observe(max(seconds, 0.0))
+
+
+async def record_report(redis: Redis, job_log: JobLogSchema) -> None:
+    """
+    Close the stages of the execution a job log reports on. Logs without an
+    execution id, or whose record has expired, are ignored. Never raises:
+    the log itself is already stored.
+    """
+    if not job_log.execution_id:
+        return
+    key = execution_key(job_log.execution_id)
+    now = time.time()
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.hget(f"{UDPU_ENTITY}:{job_log.client}", "role")
+            record, role = await pipe.execute()
+        if not record:
+            return
+
+        first = "reported_at" not in record
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping={"reported_at": now, "status_code": job_log.status_code})
+            pipe.hincrby(key, "steps", 1)
+            if job_log.started_at:
+                pipe.hsetnx(key, "started_at", job_log.started_at)
+            if job_log.duration_ms is not None:
+                pipe.hincrby(key, "duration_ms", job_log.duration_ms)
+            await pipe.execute()
+    except RedisError as e:
+        logger.error("Failed to record execution %s: %s", job_log.execution_id, e)
+        return
+
+    role = role or "unknown"
+    execution = job_log.duration_ms / 1000 if job_log.duration_ms is not None else None
+    if execution is not None:
+        _observe(STAGE_EXECUTION, job_log.name, role, execution)
+    if not first:
+        return
+    dispatched = float(record["dispatched_at"])
+    delivered = float(record["delivered_at"]) if "delivered_at" in record else None
+    if delivered is not None:
+        _observe(STAGE_QUEUED, record["name"], role, delivered - dispatched)
+    if record["action_type"] == "job":
+        _observe(STAGE_TOTAL, record["name"], role, now - dispatched)
+        if delivered is not None and execution is not None:
+            _observe(STAGE_TRANSIT, record["name"], role, now - delivered - execution)
+
+
+async def get_execution(redis: Redis, execution_id: str) -> Optional[Execution]:
+    data = await redis.hgetall(execution_key(execution_id))
+    return Execution(**data) if data else None
+
+
+def output_entry(frame: dict) -> Optional[Dict[str, str]]:
+    """Output stream entry for an agent frame, None if the frame is of no known kind."""
+    job = str(frame.get("job", ""))
+    if frame.get("end"):
+        return {"event": OutputEvent.END.value}
+    if "exit_code" in frame:
+        try:
+            exit_code = int(frame["exit_code"])
+        except (TypeError, ValueError):
+            return None
+        return {"event": OutputEvent.EXIT.value, "job": job, "exit_code": str(exit_code)}
+    if "output" in frame:
+        return {
+            "event": OutputEvent.OUTPUT.value,
+            "job": job,
+            "stream": str(frame.get("stream") or "stdout"),
+            "text": str(frame["output"]),
+        }
+    return None
+
+
+async def append_output(redis: Redis, frame: dict) -> None:
+    """
+    Append an agent frame carrying an ``execution_id`` to the execution's
+    output stream. Frames of unknown or expired executions are dropped.
+    """
+    entry = output_entry(frame)
+    if entry is None:
+        return
+    execution_id = str(frame["execution_id"])
+    args = [settings.execution_output_maxlen, settings.execution_retention]
+    for field, value in entry.items():
+        args += [field, value]
+    script = redis.register_script(_APPEND_OUTPUT_LUA)
+    await script(keys=[execution_key(execution_id), output_key(execution_id)], args=args)
+
+
+def _event(entry_id: str, fields: Dict[str, str]) -> str:
+    event = fields.pop("event", OutputEvent.OUTPUT.value)
+    if "exit_code" in fields:
+        fields["exit_code"] = int(fields["exit_code"])
+    return f"id: {entry_id}\nevent: {event}\ndata: {json.dumps(fields)}\n\n"
+
+
+async def follow_output(redis: Redis, execution_id: str, after: str = "0-0") -> AsyncIterator[str]:
+    """
+    Server-sent events of an execution's output, from the entry after
+    *after* on. Each event's id is its entry id. The stream ends with the
+    agent's end entry, once the execution has expired, or on a Redis
+    error; while no output comes, a comment is sent every
+    EXECUTION_OUTPUT_HEARTBEAT seconds.
+    """
+    key = output_key(execution_id)
+    # the read must return before the client's socket timeout fires
+    block = int(min(settings.execution_output_heartbeat, REDIS_SOCKET_TIMEOUT / 2) * 1000)
+    EXECUTION_OUTPUT_STREAMS.inc()
+    try:
+        while True:
+            try:
+                resp = await redis.xread(streams={key: after}, count=100, block=block)
+                if not resp and not await redis.exists(execution_key(execution_id), key):
+                    return
+            except RedisError as e:
+                logger.error("Failed to read output of execution %s: %s", execution_id, e)
+                return
+            if not resp:
+                yield ": keep-alive\n\n"
+                continue
+            _, entries = resp[0]
+            for entry_id, fields in entries:
+                after = entry_id
+                yield _event(entry_id, dict(fields))
+                if fields.get("event") == OutputEvent.END.value:
+                    return
+    finally:
+        EXECUTION_OUTPUT_STREAMS.dec()
+
+
+def latency_report(by: str) -> List[StageLatency]:
+    """Per-stage quantiles for every job or role, merged over all workers."""
+    series: Dict[tuple, Dict[float, float]] = histogram_buckets_by(_HISTOGRAM_NAMES[by], "stage", by)
+    stages = []
+    for (stage, label), buckets in sorted(series.items(), key=lambda item: (item[0][1], item[0][0])):
+        stages.append(StageLatency(
+            label=label,
+            stage=stage,
+            count=int(max(buckets.values(), default=0)),
+            p50=bucket_quantile(buckets, 0.5),
+            p90=bucket_quantile(buckets, 0.9),
+            p99=bucket_quantile(buckets, 0.99),
+        ))
+    return stages
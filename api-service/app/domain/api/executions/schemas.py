@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, computed_field, model_validator
+
+from domain.api.websocket.constants import CommandLane
+
+
+class ExecutionCreate(BaseModel):
+    subscriber_uid: str
+    job: Optional[str] = Field(None, description="Job name or uid")
+    queue: Optional[str] = Field(None, description="Queue name or uid")
+    lane: CommandLane = CommandLane.NORMAL
+
+    @model_validator(mode="after")
+    def _one_payload(self) -> "ExecutionCreate":
+        if bool(self.job) == bool(self.queue):
+            raise ValueError("set exactly one of job and queue")
+        return self
+
+
+class Execution(BaseModel):
+    """
+    One command dispatched to one device. Server times are epoch seconds
+    taken by the API; ``started_at`` and ``duration_ms`` come from the agent.
+    A queue reports once per job: ``steps`` counts the reports,
+    ``duration_ms`` sums them and ``reported_at`` is the latest.
+    """
+    id: str
+    subscriber_uid: str
+    action_type: str
+    name: str
+    dispatched_at: float
+    delivered_at: Optional[float] = None
+    started_at: Optional[str] = None
+    reported_at: Optional[float] = None
+    duration_ms: Optional[int] = None
+    status_code: Optional[str] = None
+    steps: int = 0
+
+    model_config = {
+        "extra": "ignore",
+    }
+
+    @computed_field
+    @property
+    def queued_s(self) -> Optional[float]:
+        """Time the entry waited in the device stream."""
+        if self.delivered_at is None:
+            return None
+        return round(self.delivered_at - self.dispatched_at, 3)
+
+    @computed_field
+    @property
+    def total_s(self) -> Optional[float]:
+        if self.reported_at is None:
+            return None
+        return round(self.reported_at - self.dispatched_at, 3)
+
+
+class StageLatency(BaseModel):
+    """Quantiles are bucket upper bounds, in seconds."""
+    label: str
+    stage: str
+    count: int
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+
+
+class LatencyReport(BaseModel):
+    by: str
+    stages: List[StageLatency]
@@ -0,0 +1,81 @@
+import re
+from http import HTTPStatus
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi_utils.cbv import cbv
+
+from domain.api.rollouts.core import RolloutError, resolve_payload
+from domain.api.websocket.messages import publish_command
+from services.redis.exceptions import RedisResponseError
+
+from .core import follow_output, get_execution, latency_report
+from .schemas import Execution, ExecutionCreate, LatencyReport
+
+router = APIRouter()
+
+_ENTRY_ID = re.compile(r"^\d+(-\d+)?$")
+
+
+@cbv(router)
+class ExecutionsAPI:
+    """
+    Commands dispatched to devices: their timing and their output.
+    """
+
+    @router.post("/executions", response_model=Execution, status_code=HTTPStatus.ACCEPTED)
+    async def create(self, request: Request, body: ExecutionCreate) -> Execution:
+        """
+        Send a job or queue to one device; follow what it prints at
+        `GET /executions/{id}/output`.
+        """
+        redis = request.app.state.redis
+        try:
+            _, _, message, _ = await resolve_payload(redis, body)
+        except RolloutError as e:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.message)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+        execution_id = await publish_command(redis, body.subscriber_uid, message, body.lane)
+        return await get_execution(redis, execution_id)
+
+    @router.get("/executions/latency", response_model=LatencyReport)
+    async def latency(self, by: Literal["job", "role"] = Query("job")) -> LatencyReport:
+        """
+        Quantiles of the queued, transit, execution and total stages per job
+        or per device role, since the service started.
+        """
+        return LatencyReport(by=by, stages=latency_report(by))
+
+    @router.get("/executions/{execution_id}", response_model=Execution)
+    async def get(self, request: Request, execution_id: str) -> Execution:
+        execution = await get_execution(request.app.state.redis, execution_id)
+        if execution is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Execution '{execution_id}' not found")
+        return execution
+
+    @router.get("/executions/{execution_id}/output", response_class=StreamingResponse)
+    async def output(
+        self,
+        request: Request,
+        execution_id: str,
+        after: Optional[str] = Query(None, description="Entry id to resume after"),
+        last_event_id: Optional[str] = Header(None),
+    ) -> StreamingResponse:
+        """
+        The execution's output as server-sent events: ``output`` chunks,
+        an ``exit`` per job and a final ``end``. A reconnecting client
+        resumes with ``Last-Event-ID`` or ``after``.
+        """
+        redis = request.app.state.redis
+        after = last_event_id or after or "0-0"
+        if not _ENTRY_ID.match(after):
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Invalid entry id '{after}'")
+        if await get_execution(redis, execution_id) is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Execution '{execution_id}' not found")
+        return StreamingResponse(
+            follow_output(redis, execution_id, after),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
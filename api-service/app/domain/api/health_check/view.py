@@ -1,5 +1,7 @@
 from fastapi_utils.cbv import cbv
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+
+from services.singleflight import singleflight
 
 router = APIRouter()
 
@@ -9,3 +11,14 @@ class HealthCheck:
     @router.get("/health")
     def get(self):
         return {"status": "success"}
+
+    @router.get("/health/redis/batching")
+    def get_redis_batching(self, request: Request):
+        """Auto-batching counters of the worker that served the request."""
+        stats = getattr(request.app.state.redis_batch, "stats", None)
+        return {"enabled": stats is not None, **(stats.snapshot() if stats else {})}
+
+    @router.get("/health/singleflight")
+    def get_singleflight(self):
+        """Per-operation call, execution and coalesced counts of this worker."""
+        return singleflight.snapshot()
@@ -1 +1,6 @@
 JOB_PREFIX = "JOB"
+
+# per role: names of the role's jobs
+JOB_ROLE_PREFIX = "JOB_ROLE"
+# set once the role index holds the jobs stored before it existed
+JOB_ROLE_INDEXED_KEY = "JOB_ROLE_INDEXED"
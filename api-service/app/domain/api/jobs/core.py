@@ -1,4 +1,4 @@
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 from uuid import UUID
 
 from services.logging.logger import log as logger
@@ -7,9 +7,12 @@ from redis.asyncio.client import Redis
 from redis.exceptions import RedisError
 
 from services.redis.exceptions import RedisResponseError
-from domain.api.jobs.constants import JOB_PREFIX
+from services.singleflight import coalesce
+from domain.api.jobs.constants import JOB_PREFIX, JOB_ROLE_INDEXED_KEY, JOB_ROLE_PREFIX
 from domain.api.jobs.schemas import JobSchema, JobSchemaUpdate
 from domain.api.jobs.schemas import JobFrequency
+from domain.api.sync.core import record_change
+from domain.api.sync.schemas import ChangeOp, SyncEntity
 
 
 def _is_uid(identifier: str) -> bool:
@@ -25,6 +28,49 @@ def _is_job_storage_key(key: str) -> bool:
     return key.startswith(f"{JOB_PREFIX}:") and len(key.split(":")) == 3
 
 
+def job_role_key(role: str) -> str:
+    return f"{JOB_ROLE_PREFIX}:{role}"
+
+
+def _index_role(pipe, previous: Optional[JobSchema], job: Optional[JobSchema]) -> None:
+    """Queue on *pipe* the role index moves of a job written from *previous* to *job*."""
+    if previous is not None and previous.role:
+        pipe.srem(job_role_key(previous.role), previous.name)
+    if job is not None and job.role:
+        pipe.sadd(job_role_key(job.role), job.name)
+
+
+async def build_job_role_index(redis: Redis) -> int:
+    """
+    Fill the job role index from the stored jobs. Runs once, while
+    ``JOB_ROLE_INDEXED`` is missing; afterwards writes keep the index current.
+
+    :return: number of indexed jobs.
+    """
+    if await redis.exists(JOB_ROLE_INDEXED_KEY):
+        return 0
+    indexed = 0
+    pipe = redis.pipeline(transaction=False)
+    async for key in redis.scan_iter(match=f"{JOB_PREFIX}:*", count=500):
+        if not _is_job_storage_key(key):
+            continue
+        name, role = await redis.hmget(key, "name", "role")
+        if not name or not role:
+            continue
+        pipe.sadd(job_role_key(role), name)
+        indexed += 1
+    pipe.set(JOB_ROLE_INDEXED_KEY, 1)
+    await pipe.execute()
+    return indexed
+
+
+async def _refresh_queues(redis: Redis, *jobs: JobSchema) -> None:
+    """Rebuild the expansions of the queues listing *jobs*, by name or uid."""
+    from domain.api.jobs.queues.expansion import refresh_expansions
+
+    await refresh_expansions(redis, [identifier for job in jobs for identifier in (job.name, job.uid)])
+
+
 class JobRepository:
     """
     Repository for managing Job entities in Redis storage.
@@ -38,12 +84,18 @@ class JobRepository:
             key = job.key
             if await self.redis.exists(key):
                 raise RedisResponseError(message=f"Job {job.name} already exists")
-            await self.redis.hset(key, mapping=job.serialize())
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping=job.serialize())
+                _index_role(pipe, None, job)
+                await pipe.execute()
         except RedisError as e:
             logger.error("Failed to create job %s: %s", job.name, e)
             raise RedisResponseError(message=str(e))
+        await record_change(self.redis, SyncEntity.JOB, job.name)
+        await _refresh_queues(self.redis, job)
         return await self.get(job.uid)
 
+    @coalesce("job")
     async def get(self, identifier: str, scan_count: int = 100) -> Optional[JobSchema]:
         if not identifier:
             return None
@@ -65,12 +117,35 @@ class JobRepository:
             return JobSchema(**data)
         return None
 
+    async def get_many(self, identifiers: List[str]) -> Dict[str, Optional[JobSchema]]:
+        """
+        Jobs by identifier, names fetched in one pipeline. Uids need a scan
+        each and are looked up one by one.
+        """
+        names = [identifier for identifier in dict.fromkeys(identifiers) if identifier and not _is_uid(identifier)]
+        found: Dict[str, Optional[JobSchema]] = {}
+        if names:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for name in names:
+                        pipe.hgetall(f"{JOB_PREFIX}:{name}:{JobSchema._generate_uid(name)}")
+                    replies = await pipe.execute()
+            except RedisError as e:
+                logger.error("Failed to fetch jobs %s: %s", ", ".join(names), e)
+                raise RedisResponseError(message=str(e))
+            found.update((name, JobSchema(**data) if data else None) for name, data in zip(names, replies))
+        for identifier in identifiers:
+            if identifier not in found:
+                found[identifier] = await self.get(identifier)
+        return found
+
     async def update(self, identifier: str, update_data: dict) -> Optional[JobSchema]:
         job = await self.get(identifier)
         if not job:
             return None
 
         old_key = job.key
+        previous = job.model_copy()
         patch = JobSchemaUpdate(**update_data)
         for k, v in patch.model_dump(exclude_none=True).items():
             setattr(job, k, v)
@@ -83,9 +158,13 @@ class JobRepository:
                 await pipe.delete(old_key)
             else:
                 await pipe.hset(old_key, mapping=job.serialize())
+            _index_role(pipe, previous, job)
             await pipe.execute()
         except RedisError as e:
             logger.error("Failed to update job %s: %s", job.name, e)
+        else:
+            await record_change(self.redis, SyncEntity.JOB, job.name)
+            await _refresh_queues(self.redis, previous, job)
         return await self.get(job.uid)
 
     async def delete(self, identifier: str, scan_count: int = 100):
@@ -95,12 +174,18 @@ class JobRepository:
             return
 
         try:
-            await self.redis.delete(job.key)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(job.key)
+                _index_role(pipe, job, None)
+                await pipe.execute()
+            await record_change(self.redis, SyncEntity.JOB, job.name, ChangeOp.DELETE)
+            await _refresh_queues(self.redis, job)
             return True
         except RedisError as e:
             logger.error("Failed to delete job %s: %s", identifier, e)
             raise RedisResponseError(message=str(e))
 
+    @coalesce("job")
     async def get_all(self) -> List[JobSchema]:
         jobs = []
         async for key in self.redis.scan_iter(match=f"{JOB_PREFIX}:*", count=100):
@@ -117,12 +202,14 @@ class JobRepository:
             return False
         return entity in {j.name for j in jobs}
 
+    @coalesce("job")
     async def get_by_role(self, role_name: str, frequency: JobFrequency = JobFrequency.FIRST_BOOT):
         return [
             j for j in await self.get_all()
             if getattr(j, "role", None) == role_name and getattr(j, "frequency", None) == frequency
         ]
 
+    @coalesce("job")
     async def get_by_frequency(self, frequency: Union[JobFrequency, str]) -> List[JobSchema]:
         freq = frequency if isinstance(frequency, JobFrequency) else JobFrequency.parse(frequency)
 
@@ -1 +1,10 @@
 QUEUE_PREFIX = "QUEUE"
+
+# resolved job definitions of a queue, per queue uid
+QUEUE_EXPANDED_PREFIX = "QUEUE_EXPANDED"
+# per job name or uid: names of the queues listing it
+QUEUE_EXPANDED_REFS_PREFIX = f"{QUEUE_EXPANDED_PREFIX}:refs"
+# per role: names of the role's queues
+QUEUE_ROLE_PREFIX = "QUEUE_ROLE"
+# set once the role index holds the queues stored before it existed
+QUEUE_ROLE_INDEXED_KEY = "QUEUE_ROLE_INDEXED"
@@ -1,14 +1,18 @@
 from services.logging.logger import log as logger
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from redis.asyncio.client import Redis
 from redis.exceptions import RedisError
 
 from services.redis.exceptions import RedisResponseError
+from services.singleflight import coalesce
 from domain.api.jobs.queues.constants import QUEUE_PREFIX
+from domain.api.jobs.queues.expansion import _split_queue_jobs, build_expansion, drop_expansion, load_expansion
 from domain.api.jobs.queues.schemas import JobQueueSchema
 from domain.api.jobs.core import JobRepository
+from domain.api.sync.core import record_change, record_changes
+from domain.api.sync.schemas import ChangeOp, SyncEntity
 
 
 
@@ -21,10 +25,6 @@ def _is_uid(identifier: str) -> bool:
         return False
 
 
-def _split_queue_jobs(queue_value):
-    return [item.strip() for item in str(queue_value or "").split(",") if item.strip()]
-
-
 class QueueRepository:
     """
     CRUD operations for job queues in Redis with decode_responses=True.
@@ -33,6 +33,7 @@ class QueueRepository:
         self.redis = redis
         self.jobs = JobRepository(redis)
 
+    @coalesce("queue")
     async def get_all(self) -> List[JobQueueSchema]:
         queues = []
         async for key in self.redis.scan_iter(match=f"{QUEUE_PREFIX}:*", count=100):
@@ -41,6 +42,7 @@ class QueueRepository:
                 queues.append(JobQueueSchema(**data))
         return queues
 
+    @coalesce("queue")
     async def get(self, identifier: str, scan_count: int = 100) -> Optional[JobQueueSchema]:
         if not identifier:
             return None
@@ -62,12 +64,26 @@ class QueueRepository:
             return JobQueueSchema(**data)
         return None
 
+    async def get_expanded(self, identifier: str) -> Optional[Dict[str, str]]:
+        """
+        Stored expansion of a queue, its ``body`` and ``etag``. Queues written
+        before expansions existed get theirs built on the first read.
+        """
+        try:
+            stored = await load_expansion(self.redis, identifier)
+            if stored:
+                return stored
+            queue = await self.get(identifier)
+            if not queue:
+                return None
+            return await build_expansion(self.redis, queue)
+        except RedisError as e:
+            logger.error("Failed to load expansion of queue %s: %s", identifier, e)
+            raise RedisResponseError(message=str(e))
+
     async def validate_jobs(self, queue_jobs):
-        invalid_jobs = []
-        for job_identifier in _split_queue_jobs(queue_jobs):
-            if not await self.jobs.get(job_identifier):
-                invalid_jobs.append(job_identifier)
-        return invalid_jobs
+        found = await self.jobs.get_many(_split_queue_jobs(queue_jobs))
+        return [job_identifier for job_identifier, job in found.items() if not job]
 
     async def is_role_unique(self, role_name, exclude_identifier=None):
         role_name = str(role_name or "").strip()
@@ -86,6 +102,7 @@ class QueueRepository:
                 return False
         return True
 
+    @coalesce("queue")
     async def get_by_role(self, role_name):
         role_name = str(role_name or "").strip()
         return [queue for queue in await self.get_all() if queue.role == role_name]
@@ -96,9 +113,11 @@ class QueueRepository:
             raise Exception(f"Job(s) '{', '.join(invalid_jobs)}' do not exist")
         try:
             await self.redis.hset(queue.key, mapping=queue.serialize())
+            await build_expansion(self.redis, queue)
         except RedisError as e:
             logger.error("Failed to create queue %s: %s", queue.name, e)
             raise RedisResponseError(message=str(e))
+        await record_change(self.redis, SyncEntity.QUEUE, queue.name)
         return await self.get(queue.uid)
 
     async def update(self, identifier: str, update_data: dict) -> Optional[JobQueueSchema]:
@@ -106,7 +125,9 @@ class QueueRepository:
         if not existing:
             return None
         queue = existing
+        previous = existing.model_copy()
         old_key = existing.key
+        old_name = existing.name
 
         for k, v in update_data.items():
             if k == "uid":
@@ -127,9 +148,14 @@ class QueueRepository:
             else:
                 await pipe.hset(old_key, mapping=queue.serialize())
             await pipe.execute()
+            await build_expansion(self.redis, queue, previous)
         except RedisError as e:
             logger.error("Failed to update job %s: %s", queue.key, e)
             raise RedisResponseError(message=str(e))
+        changes = [(SyncEntity.QUEUE, queue.name, ChangeOp.UPSERT)]
+        if queue.name != old_name:
+            changes.insert(0, (SyncEntity.QUEUE, old_name, ChangeOp.DELETE))
+        await record_changes(self.redis, changes)
         return await self.get(queue.uid)
 
     async def delete(self, identifier: str, scan_count: int = 100) -> None:
@@ -139,6 +165,8 @@ class QueueRepository:
             return False
         try:
             await self.redis.delete(queue.key)
+            await drop_expansion(self.redis, queue)
+            await record_change(self.redis, SyncEntity.QUEUE, queue.name, ChangeOp.DELETE)
             return True
         except RedisError as e:
             logger.error("Failed to delete job %s: %s", identifier, e)
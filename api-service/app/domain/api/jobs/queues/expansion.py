@@ -0,0 +1,160 @@
+"""
+Materialized queue expansions: a queue with its jobs already resolved,
+stored as the JSON body served to clients plus its ETag.
+
+Resolving a queue otherwise costs one lookup per job, a keyspace scan for
+jobs listed by uid. Expansions are rebuilt on writes instead of reads: a
+queue write rebuilds its own, a job write the ones of the queues listing
+the job, found through a reverse index keyed by the name or uid as the
+queue lists it. Reads are a single HGETALL.
+
+The same writes keep the role index, the names of a role's queues, so the
+queues of one role are found without scanning.
+"""
+import hashlib
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from domain.api.jobs.core import JobRepository
+from domain.api.jobs.queues.constants import (
+    QUEUE_EXPANDED_PREFIX,
+    QUEUE_EXPANDED_REFS_PREFIX,
+    QUEUE_PREFIX,
+    QUEUE_ROLE_INDEXED_KEY,
+    QUEUE_ROLE_PREFIX,
+)
+from domain.api.jobs.queues.schemas import ExpandedQueue, JobQueueSchema
+from services.logging.logger import log as logger
+
+
+def _split_queue_jobs(queue_value) -> List[str]:
+    return [item.strip() for item in str(queue_value or "").split(",") if item.strip()]
+
+
+def expansion_key(queue_uid: str) -> str:
+    return f"{QUEUE_EXPANDED_PREFIX}:{queue_uid}"
+
+
+def refs_key(job_identifier: str) -> str:
+    return f"{QUEUE_EXPANDED_REFS_PREFIX}:{job_identifier}"
+
+
+def queue_role_key(role: str) -> str:
+    return f"{QUEUE_ROLE_PREFIX}:{role}"
+
+
+def _queue_uid(identifier: str) -> str:
+    try:
+        return UUID(identifier).hex
+    except ValueError:
+        return JobQueueSchema._generate_uid(identifier)
+
+
+async def build_expansion(redis: Redis, queue: JobQueueSchema,
+                          previous: Optional[JobQueueSchema] = None) -> Dict[str, str]:
+    """
+    Resolve and store the expansion of *queue*. *previous* is the queue as
+    it was before an update, whose references and expansion are dropped.
+
+    :return: the stored ``body`` and ``etag``.
+    """
+    identifiers = _split_queue_jobs(queue.queue)
+    found = await JobRepository(redis).get_many(identifiers)
+    expanded = ExpandedQueue(
+        queue=queue,
+        jobs=[found[identifier] for identifier in identifiers if found[identifier]],
+        missing_jobs=[identifier for identifier in identifiers if not found[identifier]],
+    )
+    body = expanded.model_dump_json()
+    stored = {"body": body, "etag": '"' + hashlib.sha256(body.encode()).hexdigest() + '"'}
+
+    async with redis.pipeline(transaction=False) as pipe:
+        if previous is not None:
+            for identifier in set(_split_queue_jobs(previous.queue)):
+                pipe.srem(refs_key(identifier), previous.name)
+            if previous.uid != queue.uid:
+                pipe.delete(expansion_key(previous.uid))
+            if previous.role:
+                pipe.srem(queue_role_key(previous.role), previous.name)
+        for identifier in set(identifiers):
+            pipe.sadd(refs_key(identifier), queue.name)
+        if queue.role:
+            pipe.sadd(queue_role_key(queue.role), queue.name)
+        pipe.hset(expansion_key(queue.uid), mapping=stored)
+        await pipe.execute()
+    return stored
+
+
+async def drop_expansion(redis: Redis, queue: JobQueueSchema) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        for identifier in set(_split_queue_jobs(queue.queue)):
+            pipe.srem(refs_key(identifier), queue.name)
+        pipe.delete(expansion_key(queue.uid))
+        if queue.role:
+            pipe.srem(queue_role_key(queue.role), queue.name)
+        await pipe.execute()
+
+
+async def build_queue_role_index(redis: Redis) -> int:
+    """
+    Fill the queue role index from the stored queues. Runs once, while
+    ``QUEUE_ROLE_INDEXED`` is missing; afterwards writes keep the index current.
+
+    :return: number of indexed queues.
+    """
+    if await redis.exists(QUEUE_ROLE_INDEXED_KEY):
+        return 0
+    indexed = 0
+    pipe = redis.pipeline(transaction=False)
+    async for key in redis.scan_iter(match=f"{QUEUE_PREFIX}:*", count=500):
+        name, role = await redis.hmget(key, "name", "role")
+        if not name or not role:
+            continue
+        pipe.sadd(queue_role_key(role), name)
+        indexed += 1
+    pipe.set(QUEUE_ROLE_INDEXED_KEY, 1)
+    await pipe.execute()
+    return indexed
+
+
+async def refresh_expansions(redis: Redis, job_identifiers: Iterable[str]) -> None:
+    """
+    Rebuild the expansions of the queues listing any of *job_identifiers*,
+    after a job was created, changed or deleted.
+
+    Failures are logged and swallowed: the job write has already happened,
+    and a stale expansion is rebuilt by the next write to the queue.
+    """
+    job_identifiers = {identifier for identifier in job_identifiers if identifier}
+    if not job_identifiers:
+        return
+    try:
+        names = await redis.sunion(*(refs_key(identifier) for identifier in job_identifiers))
+        if not names:
+            return
+        names = sorted(names)
+        async with redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.hgetall(f"{QUEUE_PREFIX}:{name}:{JobQueueSchema._generate_uid(name)}")
+            queues = await pipe.execute()
+        for name, data in zip(names, queues):
+            if data:
+                await build_expansion(redis, JobQueueSchema(**data))
+            else:
+                # the queue is gone; drop it from the index of the changed jobs
+                async with redis.pipeline(transaction=False) as pipe:
+                    for identifier in job_identifiers:
+                        pipe.srem(refs_key(identifier), name)
+                    await pipe.execute()
+    except RedisError as e:
+        logger.error("Failed to refresh queue expansions of jobs %s: %s", ", ".join(sorted(job_identifiers)), e)
+
+
+async def load_expansion(redis: Redis, identifier: str) -> Optional[Dict[str, str]]:
+    """:return: the stored ``body`` and ``etag`` of a queue name or uid, if built."""
+    if not identifier:
+        return None
+    return await redis.hgetall(expansion_key(_queue_uid(identifier))) or None
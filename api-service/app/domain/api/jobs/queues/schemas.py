@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, computed_field
 from uuid import uuid5, NAMESPACE_DNS
 from domain.api.jobs.queues.constants import QUEUE_PREFIX
+from domain.api.jobs.schemas import JobSchema
 
 
 class JobQueueSchema(BaseModel):
@@ -30,4 +31,13 @@ class JobQueueSchema(BaseModel):
 
     @staticmethod
     def _generate_uid(name):
-        return uuid5(NAMESPACE_DNS, name).hex
\ No newline at end of file
+        return uuid5(NAMESPACE_DNS, name).hex
+
+
+class ExpandedQueue(BaseModel):
+    """A queue with its jobs resolved, in queue order."""
+
+    queue: JobQueueSchema
+    jobs: List[JobSchema] = []
+    # listed in the queue but not defined
+    missing_jobs: List[str] = []
@@ -1,12 +1,14 @@
-from typing import List
+from typing import List, Optional
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from fastapi_utils.cbv import cbv
 
 from config import get_app_settings
+from domain.api.agent.dependencies import etag_matches
 from domain.api.jobs.queues.core import QueueRepository
-from domain.api.jobs.queues.schemas import JobQueueSchema
+from domain.api.jobs.queues.schemas import ExpandedQueue, JobQueueSchema
+from services.redis.exceptions import RedisResponseError
 
 router = APIRouter()
 
@@ -63,6 +65,23 @@ class JobQueueAPI:
             raise HTTPException(status_code=404, detail=f"Queue '{identifier}' not found")
         return queue
 
+    @router.get("/queues/{identifier}/expanded", response_model=ExpandedQueue)
+    async def get_expanded_queue(self, identifier: str, if_none_match: Optional[str] = Header(None)):
+        """
+        Retrieve a job queue with its job definitions resolved, in queue order.
+        Send the previous ETag as If-None-Match to get 304 when nothing changed.
+        """
+        try:
+            expanded = await self.repo.get_expanded(identifier)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+        if not expanded:
+            raise HTTPException(status_code=404, detail=f"Queue '{identifier}' not found")
+        headers = {"ETag": expanded["etag"], "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, expanded["etag"]):
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+        return Response(content=expanded["body"], media_type="application/json", headers=headers)
+
     @router.patch("/queues/{identifier}", response_model=JobQueueSchema)
     async def update_queue(self, identifier: str, payload: JobQueueSchema) -> JobQueueSchema:
         """
@@ -6,6 +6,9 @@ from services.logging.logger import log as logger
 
 from domain.api.logs.constants import JOB_LOG_PREFIX
 from domain.api.logs.schemas import JobLogSchema
+from domain.api.executions.core import record_report
+from domain.api.queue_runs.core import track_step_log
+from domain.api.rollouts.core import track_job_log
 from services.redis.exceptions import RedisResponseError
 
 
@@ -41,10 +44,13 @@ class JobLogService:
         """
         key = job_log.key
         try:
-            await self._redis.hset(key, mapping=job_log.dict())
+            await self._redis.hset(key, mapping=job_log.dict(exclude_none=True))
         except (ResponseError, ReadOnlyError) as e:
             logger.error(f"Redis error in create for key {key}: {e}", exc_info=True)
             raise RedisResponseError(str(e))
+        await record_report(self._redis, job_log)
+        await track_job_log(self._redis, job_log)
+        await track_step_log(self._redis, job_log)
         # return fresh object from store
         return await self.get_by_key(key)
 
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 from domain.api.logs.constants import JOB_LOG_PREFIX
@@ -15,6 +17,10 @@ class JobLogSchema(BaseModel):
     std_out: str = ""
     status_code: str = ""
     timestamp: str = Field(..., description="ISO‑8601 UTC timestamp")
+    # sent for commands dispatched by the server, see domain.api.executions
+    execution_id: str = ""
+    started_at: str = ""
+    duration_ms: Optional[int] = None
 
     model_config = {
         "validate_assignment": True,
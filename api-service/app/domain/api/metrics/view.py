@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from fastapi_utils.cbv import cbv
+
+from services.metrics import render_metrics
+
+router = APIRouter()
+
+
+@cbv(router)
+class Metrics:
+    @router.get("/metrics", include_in_schema=False)
+    def get(self):
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
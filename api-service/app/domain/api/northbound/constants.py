@@ -12,6 +12,9 @@ DATE_TIME_FORMAT = "%a, %b %d, %Y %H:%M:%S %p %Z"
 
 CONTEXT_KEY_PREFIX = "udpu_context"
 LOCATION_PREFIX = "udpu_location"
+ROLE_INDEX_PREFIX = "udpu_role"
+# ZSET of subscriber uids scored by their last online heartbeat
+LAST_SEEN_KEY = "udpu_last_seen"
 
 
 OFFLINE_THRESHOLD = timedelta(seconds=10)
\ No newline at end of file
@@ -18,10 +18,21 @@ from domain.api.northbound.exceptions import PoolExhaustedError, RedisConnection
 from utils import validate_hostname
 from utils.utils import get_provisioned_date
 from config import get_app_settings
-from .constants import MAC_ADDRESS_KEY, PPPOE_ENTITY, UDPU_ENTITY, LOCATION_PREFIX, STATUS_PREFIX, OFFLINE_THRESHOLD
+from .constants import (
+    MAC_ADDRESS_KEY,
+    PPPOE_ENTITY,
+    UDPU_ENTITY,
+    LOCATION_PREFIX,
+    ROLE_INDEX_PREFIX,
+    LAST_SEEN_KEY,
+    STATUS_PREFIX,
+    OFFLINE_THRESHOLD,
+)
 from .exceptions import RedisResponseError
 from .schemas import Udpu, UdpuUpdate, UdpuStatus, UdpuStatusEnum
 from domain.api.roles.dependencies import get_udpu_role, get_primary_ghn_interfaces
+from domain.api.sync.core import record_change, record_changes
+from domain.api.sync.schemas import ChangeOp, SyncEntity
 
 
 settings = get_app_settings()
@@ -68,6 +79,38 @@ async def get_subscribers_by_location(redis: Redis, location_id: str) -> List[st
         raise RedisResponseError(message=str(e))
 
 
+async def get_subscribers_by_role(redis: Redis, role_name: str) -> List[str]:
+    try:
+        return list(await redis.smembers(f"{ROLE_INDEX_PREFIX}:{role_name}"))
+    except (ResponseError, ReadOnlyError) as e:
+        logging.error(str(e))
+        raise RedisResponseError(message=str(e))
+
+
+async def build_role_index(redis: Redis) -> int:
+    """
+    Fill the role index from the stored UDPU hashes. Runs once, when
+    ``UDPU:role_list`` is missing; afterwards writes keep the index current.
+
+    :return: number of indexed UDPUs.
+    """
+    if await redis.exists(f"{UDPU_ENTITY}:role_list"):
+        return 0
+    indexed = 0
+    pipe = redis.pipeline(transaction=False)
+    async for key in redis.scan_iter(match=f"{UDPU_ENTITY}:*", count=500):
+        if await redis.type(key) != "hash":
+            continue
+        subscriber_uid, role = await redis.hmget(key, "subscriber_uid", "role")
+        if not subscriber_uid or not role:
+            continue
+        pipe.sadd(f"{UDPU_ENTITY}:role_list", role)
+        pipe.sadd(f"{ROLE_INDEX_PREFIX}:{role}", subscriber_uid)
+        indexed += 1
+    await pipe.execute()
+    return indexed
+
+
 def is_valid_mac_address(mac_address: str) -> bool:
     return bool(re.match(r"[0-9a-fA-F]{2}([-:]?)[0-9a-fA-F]{2}(\1[0-9a-fA-F]{2}){4}$", mac_address))
 
@@ -99,10 +142,13 @@ async def update_udpu(redis: Redis, update_request: UdpuUpdate, udpu: dict) -> d
 
         pipe.srem(f"{UDPU_ENTITY}:mac_address_list", udpu["mac_address"])
         pipe.srem(f"{LOCATION_PREFIX}:{udpu['location']}", udpu["subscriber_uid"])
+        pipe.srem(f"{ROLE_INDEX_PREFIX}:{udpu['role']}", udpu["subscriber_uid"])
 
         pipe.sadd(f"{UDPU_ENTITY}:mac_address_list", update_data["mac_address"])
         pipe.sadd(f"{UDPU_ENTITY}:location_list", update_data["location"])
         pipe.sadd(f"{LOCATION_PREFIX}:{update_data['location']}", update_data["subscriber_uid"])
+        pipe.sadd(f"{UDPU_ENTITY}:role_list", update_data["role"])
+        pipe.sadd(f"{ROLE_INDEX_PREFIX}:{update_data['role']}", update_data["subscriber_uid"])
 
         pipe.set(update_data["mac_address_key"], update_data["subscriber_key"])
         pipe.hset(update_data["subscriber_key"], mapping=update_data)
@@ -111,6 +157,7 @@ async def update_udpu(redis: Redis, update_request: UdpuUpdate, udpu: dict) -> d
             pipe.delete(f"{MAC_ADDRESS_KEY}:{udpu['mac_address']}")
 
         await pipe.execute()
+        await record_change(redis, SyncEntity.UDPU, update_data["subscriber_uid"])
         return await get_udpu(redis, update_data["subscriber_uid"])
     except ResponseError as e:
         logging.error(str(e))
@@ -125,7 +172,11 @@ async def delete_udpu(redis: Redis, udpu: dict) -> None:
         pipe.delete(f"{PPPOE_ENTITY}:{udpu['subscriber_uid']}")
         pipe.srem(f"{UDPU_ENTITY}:mac_address_list", udpu["mac_address"])
         pipe.srem(f"{UDPU_ENTITY}:hostname_list", udpu["hostname"])
+        pipe.srem(f"{LOCATION_PREFIX}:{udpu.get('location')}", udpu["subscriber_uid"])
+        pipe.srem(f"{ROLE_INDEX_PREFIX}:{udpu.get('role')}", udpu["subscriber_uid"])
+        pipe.zrem(LAST_SEEN_KEY, udpu["subscriber_uid"])
         await pipe.execute()
+        await record_change(redis, SyncEntity.UDPU, udpu["subscriber_uid"], ChangeOp.DELETE)
     except ResponseError as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
@@ -138,6 +189,7 @@ async def create_udpu(redis: Redis, udpu: Udpu) -> None:
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
+    await record_change(redis, SyncEntity.UDPU, udpu.subscriber_uid)
 
 
 async def save_pppoe_credentials(redis: Redis, pppoe_creds) -> None:
@@ -153,6 +205,10 @@ async def bulk_update_udpu(redis: Redis, udpu_lst: List[dict], update_request) -
     updated_list = []
 
     for udpu in udpu_lst:
+        if update_request.role and udpu.get("role") != update_request.role:
+            await pipe.srem(f"{ROLE_INDEX_PREFIX}:{udpu.get('role')}", udpu["subscriber_uid"])
+            await pipe.sadd(f"{UDPU_ENTITY}:role_list", update_request.role)
+            await pipe.sadd(f"{ROLE_INDEX_PREFIX}:{update_request.role}", udpu["subscriber_uid"])
         udpu.update({
             "role": update_request.role,
             "upstream_qos": update_request.upstream_qos,
@@ -163,6 +219,7 @@ async def bulk_update_udpu(redis: Redis, udpu_lst: List[dict], update_request) -
         updated_list.append(udpu)
 
     await pipe.execute()
+    await record_changes(redis, [(SyncEntity.UDPU, u["subscriber_uid"], ChangeOp.UPSERT) for u in updated_list])
     for udpu in updated_list:
         if update_request.role:
             role = await get_udpu_role(redis, update_request.role)
@@ -352,18 +409,41 @@ async def create_udpu_status(redis: Redis, data: UdpuStatus) -> None:
     try:
         key = status_key(data.subscriber_uid)
         await redis.hset(key, mapping=_to_mapping(data))
+        await _track_last_seen(redis, data)
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
 
+async def _track_last_seen(redis: Redis, data: UdpuStatus) -> None:
+    if data.status == UdpuStatusEnum.ONLINE:
+        await redis.zadd(LAST_SEEN_KEY, {data.subscriber_uid: data.created_at.timestamp()})
+    else:
+        await redis.zrem(LAST_SEEN_KEY, data.subscriber_uid)
+
+
+async def get_online_subscribers(redis: Redis) -> List[str]:
+    """Subscribers whose last online heartbeat is within OFFLINE_THRESHOLD."""
+    since = datetime.now(timezone.utc) - OFFLINE_THRESHOLD
+    try:
+        return await redis.zrangebyscore(LAST_SEEN_KEY, since.timestamp(), "+inf")
+    except ResponseError as e:
+        logging.error(str(e))
+        raise RedisResponseError(message=str(e))
+
+
+def decode_udpu_status(subscriber_uid: str, h) -> Optional[UdpuStatus]:
+    if not h:
+        return None
+    data = _from_hash(subscriber_uid, h)
+    if data is None:
+        return None
+    return _apply_offline_if_stale(data)
+
 async def get_udpu_status(redis: Redis, subscriber_uid: str) -> Optional[UdpuStatus]:
     key = status_key(subscriber_uid)
     try:
         h = await redis.hgetall(key)
-        if not h:
-            return
-        data = _from_hash(subscriber_uid, h)
-        return _apply_offline_if_stale(data)
+        return decode_udpu_status(subscriber_uid, h)
     except Exception as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
@@ -372,6 +452,7 @@ async def update_udpu_status(redis: Redis, data: UdpuStatus) -> None:
     try:
         key = status_key(data.subscriber_uid)
         await redis.hset(key, mapping=_to_mapping(data))
+        await _track_last_seen(redis, data)
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
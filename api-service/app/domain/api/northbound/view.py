@@ -6,10 +6,14 @@ from services.logging.logger import log as logger
 from http import HTTPStatus as status
 
 from config import get_app_settings
+from services.metrics import HEARTBEATS
+from services.redis import get_batching_redis
 from domain.api.roles.dependencies import get_udpu_role, get_primary_ghn_interfaces
+from domain.api.sync.core import record_change
+from domain.api.sync.schemas import SyncEntity
 from domain.api.vbuser.dependencies import location_exist
 
-from .constants import UDPU_ENTITY, CONTEXT_KEY_PREFIX, LOCATION_PREFIX, STATUS_PREFIX
+from .constants import UDPU_ENTITY, CONTEXT_KEY_PREFIX, LOCATION_PREFIX, ROLE_INDEX_PREFIX, STATUS_PREFIX
 from .dependencies import (
     bulk_update_udpu,
     create_udpu,
@@ -126,6 +130,7 @@ class UdpuActivation:
                     await redis.hset(vbce_to_update["key"], mapping=vbce_to_update)
                     await redis.set(vbce_to_update["location_id"], vbce_to_update["name"])
                     await update_vbce_location_list(redis, vbce_to_update["location_id"])
+                    await record_change(redis, SyncEntity.VBCE, vbce_to_update["name"])
                     vbuser = VBUser(
                         udpu=udpu.subscriber_uid,
                         location_id=udpu.location,
@@ -146,8 +151,11 @@ class UdpuActivation:
             pipe.sadd(f"{UDPU_ENTITY}:hostname_list", udpu.hostname)
             pipe.sadd(f"{UDPU_ENTITY}:location_list", udpu.location)
             pipe.sadd(f"{LOCATION_PREFIX}:{udpu.location}", udpu.subscriber_uid)
+            pipe.sadd(f"{UDPU_ENTITY}:role_list", udpu.role)
+            pipe.sadd(f"{ROLE_INDEX_PREFIX}:{udpu.role}", udpu.subscriber_uid)
             pipe.set(udpu.mac_address_key, udpu.subscriber_key)
             await pipe.execute()
+            await record_change(redis, SyncEntity.UDPU, udpu.subscriber_uid)
 
             udpu_obj = await get_udpu(redis, udpu.subscriber_key)
             return JSONResponse(status_code=200, content=udpu_obj)
@@ -333,6 +341,7 @@ class UdpuActivation:
                 await redis.hset(vbce_to_update.key, mapping=vbce_to_update.dict())
                 await redis.set(vbce_to_update.location_id, vbce_to_update.name)
                 await update_vbce_location_list(redis, vbce_to_update.location_id)
+                await record_change(redis, SyncEntity.VBCE, vbce_to_update.name)
             else:
                 return JSONResponse(
                     status_code=400,
@@ -402,6 +411,7 @@ class UdpuActivation:
                 await redis.hset(vbce_to_update.key, mapping=vbce_to_update.dict())
                 await redis.set(vbce_to_update.location_id, vbce_to_update.name)
                 await update_vbce_location_list(redis, vbce_to_update.location_id)
+                await record_change(redis, SyncEntity.VBCE, vbce_to_update.name)
             else:
                 return JSONResponse(status_code=400, content={"message": f"No available vbce found for location {update_request.location}"})
         created_vbuser = None
@@ -500,7 +510,7 @@ class UdpuActivation:
 
     @router.get("/udpu/{subscriber_uid}/status")
     async def udpu_status(self, request: Request, subscriber_uid: str):
-        redis = request.app.state.redis
+        redis = get_batching_redis(request)
         try:
             obj = await get_udpu_status(redis, subscriber_uid)
         except RuntimeError as e:
@@ -511,8 +521,9 @@ class UdpuActivation:
 
     @router.post("/udpu/status", response_model=UdpuStatus)
     async def post_udpu_status(self, request: Request, payload: UdpuStatus):
-        redis = request.app.state.redis
+        redis = get_batching_redis(request)
 
+        HEARTBEATS.inc()
         logger.info(f"post_udpu_status | {payload}")
 
         data = UdpuStatus(**payload.model_dump())
@@ -525,10 +536,16 @@ class UdpuActivation:
             data.state = "not_registered"
 
         try:
+            previous = await get_udpu_status(redis, data.subscriber_uid)
             await create_udpu_status(redis, data)
         except RuntimeError as e:
             raise HTTPException(status_code=502, detail=f"Redis error: {e}")
 
+        # Heartbeats that keep the same state are not logged; stale devices
+        # going offline is derived by clients from created_at.
+        if previous is None or (previous.state, previous.status) != (data.state, data.status):
+            await record_change(redis, SyncEntity.STATUS, data.subscriber_uid)
+
         return data
 
     @router.get("/udpu/status", status_code=status.OK)
@@ -0,0 +1,7 @@
+PRESENCE_PREFIX = "PRESENCE"
+# connected subscribers scored by when their presence expires
+PRESENCE_ONLINE_KEY = f"{PRESENCE_PREFIX}:online"
+# the same per node: PRESENCE:node:<host>:<port>
+PRESENCE_NODE_PREFIX = f"{PRESENCE_PREFIX}:node"
+# nodes that ever held a connection
+PRESENCE_NODES_KEY = f"{PRESENCE_PREFIX}:nodes"
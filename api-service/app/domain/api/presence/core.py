@@ -0,0 +1,152 @@
+"""
+Presence registry: which node and worker hold each agent's `/pubsub`
+socket.
+
+A connection registers when it is accepted and refreshes a TTL every
+PRESENCE_REFRESH_INTERVAL while it stays open. uvicorn pings every socket
+and closes the ones that stop answering, so a dead link stops refreshing
+within ws_ping_timeout; a worker that dies without unregistering is
+forgotten when the TTL runs out. A reconnect replaces the previous
+registration, and the old connection's refresh and unregister become
+no-ops, so the newest socket always wins.
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, List, Sequence
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from services.logging.logger import log as logger
+
+from .constants import PRESENCE_NODE_PREFIX, PRESENCE_NODES_KEY, PRESENCE_ONLINE_KEY, PRESENCE_PREFIX
+from .schemas import Presence, PresenceCounts
+
+settings = get_app_settings()
+
+NODE = f"{settings.server_host}:{settings.server_port}"
+
+# Extends presence ARGV[1] if connection ARGV[2] still holds it.
+_REFRESH_LUA = """
+if redis.call('HGET', KEYS[1], 'connection_id') ~= ARGV[2] then
+    return 0
+end
+local expires = tonumber(ARGV[3]) + tonumber(ARGV[4])
+redis.call('HSET', KEYS[1], 'refreshed_at', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('ZADD', KEYS[2], expires, ARGV[1])
+redis.call('ZADD', KEYS[3], expires, ARGV[1])
+return 1
+"""
+
+# Drops presence ARGV[1] if connection ARGV[2] still holds it.
+_UNREGISTER_LUA = """
+if redis.call('HGET', KEYS[1], 'connection_id') ~= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+def presence_key(subscriber_uid: str) -> str:
+    return f"{PRESENCE_PREFIX}:{subscriber_uid}"
+
+
+def node_key(node: str) -> str:
+    return f"{PRESENCE_NODE_PREFIX}:{node}"
+
+
+class Connection:
+    """Presence of one agent socket held by this worker."""
+
+    def __init__(self, redis: Redis, subscriber_uid: str):
+        self.redis = redis
+        self.subscriber_uid = subscriber_uid
+        self.id = uuid.uuid4().hex
+        self.worker = str(os.getpid())
+
+    def _keys(self) -> List[str]:
+        return [presence_key(self.subscriber_uid), PRESENCE_ONLINE_KEY, node_key(NODE)]
+
+    async def register(self) -> None:
+        now = time.time()
+        key = presence_key(self.subscriber_uid)
+        try:
+            previous = await self.redis.hget(key, "node")
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if previous and previous != NODE:
+                    pipe.zrem(node_key(previous), self.subscriber_uid)
+                pipe.delete(key)
+                pipe.hset(key, mapping={
+                    "node": NODE,
+                    "worker": self.worker,
+                    "connection_id": self.id,
+                    "connected_at": now,
+                    "refreshed_at": now,
+                })
+                pipe.expire(key, settings.presence_ttl)
+                pipe.zadd(PRESENCE_ONLINE_KEY, {self.subscriber_uid: now + settings.presence_ttl})
+                pipe.zadd(node_key(NODE), {self.subscriber_uid: now + settings.presence_ttl})
+                pipe.sadd(PRESENCE_NODES_KEY, NODE)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error("Failed to register presence of %s: %s", self.subscriber_uid, e)
+
+    async def keep_alive(self) -> None:
+        """Refresh the registration until cancelled."""
+        script = self.redis.register_script(_REFRESH_LUA)
+        while True:
+            await asyncio.sleep(settings.presence_refresh_interval)
+            try:
+                await script(keys=self._keys(),
+                             args=[self.subscriber_uid, self.id, time.time(), settings.presence_ttl])
+            except RedisError as e:
+                logger.error("Failed to refresh presence of %s: %s", self.subscriber_uid, e)
+
+    async def unregister(self) -> None:
+        script = self.redis.register_script(_UNREGISTER_LUA)
+        try:
+            await script(keys=self._keys(), args=[self.subscriber_uid, self.id])
+        except RedisError as e:
+            logger.error("Failed to unregister presence of %s: %s", self.subscriber_uid, e)
+
+
+async def get_presence(redis: Redis, subscribers: Sequence[str]) -> List[Presence]:
+    """Presence of each of *subscribers*, in order, in one pipeline."""
+    async with redis.pipeline(transaction=False) as pipe:
+        for uid in subscribers:
+            pipe.hgetall(presence_key(uid))
+        replies = await pipe.execute()
+    return [
+        Presence(subscriber_uid=uid, connected=True, **data) if data else Presence(subscriber_uid=uid)
+        for uid, data in zip(subscribers, replies)
+    ]
+
+
+async def connected_subscribers(redis: Redis) -> List[str]:
+    return await redis.zrangebyscore(PRESENCE_ONLINE_KEY, time.time(), "+inf")
+
+
+async def is_connected(redis: Redis, subscriber_uid: str) -> bool:
+    return bool(await redis.exists(presence_key(subscriber_uid)))
+
+
+async def count_presence(redis: Redis) -> PresenceCounts:
+    """Connected devices overall and per node; registrations whose TTL ran out are pruned."""
+    now = time.time()
+    nodes = sorted(await redis.smembers(PRESENCE_NODES_KEY))
+    keys = [PRESENCE_ONLINE_KEY] + [node_key(node) for node in nodes]
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zcard(key)
+        replies = await pipe.execute()
+    counts = replies[1::2]
+    per_node: Dict[str, int] = {node: count for node, count in zip(nodes, counts[1:]) if count}
+    return PresenceCounts(connected=counts[0], nodes=per_node)
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Presence(BaseModel):
+    """Where a device's agent socket is open, if anywhere."""
+
+    subscriber_uid: str
+    connected: bool = False
+    # "<host>:<port>" of the API node and pid of the worker holding the socket
+    node: str = ""
+    worker: str = ""
+    connection_id: str = ""
+    connected_at: Optional[float] = None
+    refreshed_at: Optional[float] = None
+
+
+class PresenceQuery(BaseModel):
+    subscribers: List[str] = Field(..., min_length=1, max_length=10000)
+
+
+class PresenceCounts(BaseModel):
+    connected: int
+    nodes: Dict[str, int] = {}
@@ -0,0 +1,30 @@
+from typing import List
+
+from fastapi import APIRouter, Request
+from fastapi_utils.cbv import cbv
+
+from .core import count_presence, get_presence
+from .schemas import Presence, PresenceCounts, PresenceQuery
+
+router = APIRouter()
+
+
+@cbv(router)
+class PresenceAPI:
+    """
+    Which devices hold an agent socket, and on which node and worker.
+    """
+
+    @router.get("/presence/counts", response_model=PresenceCounts)
+    async def counts(self, request: Request) -> PresenceCounts:
+        return await count_presence(request.app.state.redis)
+
+    @router.post("/presence/query", response_model=List[Presence])
+    async def query(self, request: Request, body: PresenceQuery) -> List[Presence]:
+        """Presence of many devices at once, in request order."""
+        return await get_presence(request.app.state.redis, body.subscribers)
+
+    @router.get("/presence/{subscriber_uid}", response_model=Presence)
+    async def get(self, request: Request, subscriber_uid: str) -> Presence:
+        presence, = await get_presence(request.app.state.redis, [subscriber_uid])
+        return presence
@@ -0,0 +1 @@
+SLOW_REQUEST_LOG_KEY = "PROFILE:slow_requests"
@@ -0,0 +1,106 @@
+import json
+import time
+from typing import Dict, List, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from services.logging.logger import log as logger
+from services.metrics import PROFILE_ROUTE, PROFILE_ROUTE_MAX, sample_values
+from services.redis.exceptions import RedisResponseError
+from services.redis.profiling import RequestProfile
+
+from .constants import SLOW_REQUEST_LOG_KEY
+
+settings = get_app_settings()
+
+# This worker's maxima, so the shared gauge is only raised; the gauge
+# reports the largest over all workers.
+_route_max: Dict[Tuple[str, str], float] = {}
+
+
+def _raise_max(route: str, stat: str, value: float) -> None:
+    if value > _route_max.get((route, stat), 0.0):
+        _route_max[route, stat] = value
+        PROFILE_ROUTE_MAX.labels(route, stat).set(value)
+
+
+def get_route_summary() -> List[dict]:
+    """
+    Totals per "METHOD route template" over all workers of this node, read
+    from the shared Prometheus samples.
+    """
+    sums = sample_values("profile_route_total", "route", "stat")
+    maxima = sample_values("profile_route_max", "route", "stat")
+    summary = []
+    for route in sorted({route for route, _ in sums}):
+        stats = {stat: value for (name, stat), value in sums.items() if name == route}
+        requests = stats.get("requests", 0) or 1
+        redis_ms = stats.get("redis_seconds", 0.0) * 1000
+        duration_ms = stats.get("duration_seconds", 0.0) * 1000
+        summary.append({
+            "route": route,
+            "requests": int(stats.get("requests", 0)),
+            "commands": int(stats.get("commands", 0)),
+            "redis_ms": round(redis_ms, 3),
+            "duration_ms": round(duration_ms, 3),
+            "pipelines": int(stats.get("pipelines", 0)),
+            "max_commands": int(maxima.get((route, "commands"), 0)),
+            "max_redis_ms": round(maxima.get((route, "redis_seconds"), 0.0) * 1000, 3),
+            "slow_requests": int(stats.get("slow_requests", 0)),
+            "avg_commands": round(stats.get("commands", 0) / requests, 2),
+            "avg_redis_ms": round(redis_ms / requests, 3),
+            "avg_duration_ms": round(duration_ms / requests, 3),
+        })
+    return sorted(summary, key=lambda item: item["redis_ms"], reverse=True)
+
+
+async def record_request(
+    redis: Redis, route: str, args: dict, status_code: int, duration: float, profile: RequestProfile
+) -> bool:
+    """
+    Fold a finished request into the route summary and append it to the slow
+    request log when it exceeds the threshold. Must be called after the
+    request profile is stopped so the log write is not charged to it.
+
+    :return: True if the request was logged as slow.
+    """
+    duration_ms = duration * 1000
+    PROFILE_ROUTE.labels(route, "requests").inc()
+    PROFILE_ROUTE.labels(route, "commands").inc(profile.commands)
+    PROFILE_ROUTE.labels(route, "pipelines").inc(profile.pipelines)
+    PROFILE_ROUTE.labels(route, "redis_seconds").inc(profile.redis_time)
+    PROFILE_ROUTE.labels(route, "duration_seconds").inc(duration)
+    _raise_max(route, "commands", profile.commands)
+    _raise_max(route, "redis_seconds", profile.redis_time)
+
+    if duration_ms < settings.slow_request_threshold_ms:
+        return False
+
+    PROFILE_ROUTE.labels(route, "slow_requests").inc()
+    entry = {
+        "route": route,
+        "args": args,
+        "status_code": status_code,
+        "duration_ms": round(duration_ms, 3),
+        "timestamp": time.time(),
+        **profile.as_dict(),
+    }
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.lpush(SLOW_REQUEST_LOG_KEY, json.dumps(entry, default=str))
+        pipe.ltrim(SLOW_REQUEST_LOG_KEY, 0, settings.slow_request_log_maxlen - 1)
+        await pipe.execute()
+    except RedisError as e:
+        logger.warning("Failed to store slow request %s: %s", route, e)
+    return True
+
+
+async def get_slow_requests(redis: Redis, limit: int) -> List[dict]:
+    try:
+        entries = await redis.lrange(SLOW_REQUEST_LOG_KEY, 0, limit - 1)
+    except RedisError as e:
+        logger.error(e)
+        raise RedisResponseError(message=str(e))
+    return [json.loads(entry) for entry in entries]
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse
+from fastapi_utils.cbv import cbv
+
+from config import get_app_settings
+from services.redis.exceptions import RedisResponseError
+
+from .dependencies import get_route_summary, get_slow_requests
+
+router = APIRouter()
+
+
+@cbv(router)
+class RedisProfileResource:
+    settings = get_app_settings()
+
+    @router.get("/profile/routes")
+    async def get_routes(self):
+        """
+        Redis command and latency totals per route, summed over the
+        workers of the node that served this request.
+        """
+        return get_route_summary()
+
+    @router.get("/profile/slow_requests")
+    async def get_slow(self, request: Request, limit: int = Query(50, ge=1, le=1000)):
+        """
+        Most recent requests slower than SLOW_REQUEST_THRESHOLD_MS, across
+        all workers, with their Redis command breakdown.
+        """
+        redis = request.app.state.redis
+        try:
+            return await get_slow_requests(redis, limit)
+        except RedisResponseError as e:
+            return JSONResponse(status_code=500, content={"message": e.message})
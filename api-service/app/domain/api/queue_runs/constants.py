@@ -0,0 +1,10 @@
+QUEUE_RUN_PREFIX = "QRUN"
+# run ids by creation time
+QUEUE_RUN_INDEX_KEY = f"{QUEUE_RUN_PREFIX}:index"
+# "<run>|<step>|<attempt>|timeout|retry" -> when the step times out or retries
+QUEUE_RUN_TIMERS_KEY = f"{QUEUE_RUN_PREFIX}:timers"
+# per execution id: the run, step and attempt it belongs to
+QUEUE_RUN_EXECUTION_PREFIX = f"{QUEUE_RUN_PREFIX}:execution"
+
+TIMER_TIMEOUT = "timeout"
+TIMER_RETRY = "retry"
@@ -0,0 +1,529 @@
+"""
+Queue runs: the jobs of a queue executed on one device as a graph of
+steps driven by the server.
+
+Unlike an `action_type: queue` entry, which the agent runs as one opaque
+sequence, each step is sent as its own job entry once the steps it needs
+are done, and settled by the job log its execution id comes back with.
+Independent steps run in parallel, so a run takes as long as its critical
+path. A step's exit code decides between success and failure; failed
+attempts are retried with exponential backoff, and an attempt that cannot
+be sent, or without a log within its timeout, counts as failed. Dependents then run or are
+skipped according to their run_if condition.
+
+Logs advance a run as they arrive; the periodic task only handles timeouts
+and retries, taking each due timer under the leader's fencing token. Every status change of a step is a compare-and-set on its
+status and attempt, so a late log of an earlier attempt, or two workers
+settling the same step, cannot move it twice.
+"""
+import json
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from domain.api.executions.core import track_execution
+from domain.api.jobs.core import JobRepository
+from domain.api.jobs.queues.core import QueueRepository, _split_queue_jobs
+from domain.api.jobs.schemas import JobFrequency
+from domain.api.logs.schemas import JobLogSchema
+from domain.api.northbound.constants import UDPU_ENTITY
+from domain.api.websocket.constants import CommandLane
+from domain.api.websocket.messages import job_message, lane_stream, queue_command
+from services.leader import Fence
+from services.logging.logger import log as logger
+from services.metrics import QUEUE_RUN_STEPS
+from services.redis.exceptions import RedisResponseError
+
+from .constants import (
+    QUEUE_RUN_EXECUTION_PREFIX,
+    QUEUE_RUN_INDEX_KEY,
+    QUEUE_RUN_PREFIX,
+    QUEUE_RUN_TIMERS_KEY,
+    TIMER_RETRY,
+    TIMER_TIMEOUT,
+)
+from .schemas import (
+    FINAL_STEP_STATUSES,
+    QueueRun,
+    QueueRunCreate,
+    QueueStep,
+    RunStatus,
+    StepCondition,
+    StepState,
+    StepStatus,
+)
+
+settings = get_app_settings()
+
+# Moves step ARGV[1] to status ARGV[2] if its status is one of ARGV[5:] and,
+# when ARGV[3] is set, it is on attempt ARGV[3]. ARGV[4], when set, becomes
+# the step's attempt.
+_STEP_TRANSITION_LUA = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if ARGV[3] ~= '' and redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[3] then
+    return 0
+end
+for i = 5, #ARGV do
+    if ARGV[i] == current then
+        redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+        if ARGV[4] ~= '' then
+            redis.call('HSET', KEYS[2], ARGV[1], ARGV[4])
+        end
+        return 1
+    end
+end
+return 0
+"""
+
+# Takes a due timer; run fenced, so only the current leader handles it.
+_CLAIM_TIMER_LUA = """
+return redis.call('ZREM', KEYS[1], ARGV[1])
+"""
+
+
+class QueueRunError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
+
+
+class QueueRunConflict(QueueRunError):
+    """The run's status does not allow the requested change."""
+
+
+def run_key(run_id: str) -> str:
+    return f"{QUEUE_RUN_PREFIX}:{run_id}"
+
+
+def steps_key(run_id: str) -> str:
+    """Step id -> definition and stream entry, fixed at creation."""
+    return f"{run_key(run_id)}:steps"
+
+
+def status_key(run_id: str) -> str:
+    return f"{run_key(run_id)}:status"
+
+
+def attempts_key(run_id: str) -> str:
+    return f"{run_key(run_id)}:attempts"
+
+
+def results_key(run_id: str) -> str:
+    """Step id -> JSON result of its latest attempt."""
+    return f"{run_key(run_id)}:results"
+
+
+def entries_key(run_id: str) -> str:
+    """Step id -> stream entry of its latest attempt."""
+    return f"{run_key(run_id)}:entries"
+
+
+def execution_key(execution_id: str) -> str:
+    return f"{QUEUE_RUN_EXECUTION_PREFIX}:{execution_id}"
+
+
+def _timer(run_id: str, step_id: str, attempt: int, kind: str) -> str:
+    return f"{run_id}|{step_id}|{attempt}|{kind}"
+
+
+def _parse_timer(member: str) -> Tuple[str, str, int, str]:
+    run_id, rest = member.split("|", 1)
+    step_id, attempt, kind = rest.rsplit("|", 2)
+    return run_id, step_id, int(attempt), kind
+
+
+def _chain(job_names: List[str]) -> List[QueueStep]:
+    """Steps running the queue's jobs one after the other."""
+    steps, seen = [], {}
+    for name in job_names:
+        seen[name] = seen.get(name, 0) + 1
+        step_id = name if seen[name] == 1 else f"{name}#{seen[name]}"
+        steps.append(QueueStep(id=step_id, job=name, needs=[steps[-1].id] if steps else []))
+    return steps
+
+
+def _check_graph(steps: List[QueueStep]) -> None:
+    """:raises QueueRunError: duplicate ids, unknown dependencies or a cycle."""
+    ids = [step.id for step in steps]
+    if len(set(ids)) != len(ids):
+        raise QueueRunError("Step ids must be unique")
+    for step in steps:
+        unknown = [need for need in step.needs if need not in ids]
+        if unknown:
+            raise QueueRunError(f"Step '{step.id}' needs unknown step(s) {', '.join(unknown)}")
+    # Kahn's algorithm: whatever cannot be ordered is on a cycle
+    needs = {step.id: set(step.needs) for step in steps}
+    ready = [step_id for step_id, deps in needs.items() if not deps]
+    ordered = 0
+    while ready:
+        done = ready.pop()
+        ordered += 1
+        for step_id, deps in needs.items():
+            if done in deps:
+                deps.discard(done)
+                if not deps:
+                    ready.append(step_id)
+    if ordered != len(steps):
+        raise QueueRunError("Step dependencies form a cycle")
+
+
+async def create_run(redis: Redis, request: QueueRunCreate) -> QueueRun:
+    """
+    Validate the steps, fetch their jobs in one batch, store the run and
+    send the steps that need nothing.
+
+    :raises QueueRunError: unknown device, queue or job, a locked job, or
+        an invalid step graph.
+    :raises RedisResponseError: the run could not be stored.
+    """
+    queue_name = ""
+    steps = request.steps
+    try:
+        if request.queue:
+            queue = await QueueRepository(redis).get(request.queue)
+            if not queue:
+                raise QueueRunError(f"Queue '{request.queue}' not found")
+            queue_name = queue.name
+            steps = steps or _chain(_split_queue_jobs(queue.queue))
+        if not steps:
+            raise QueueRunError(f"Queue '{queue_name}' has no jobs")
+        _check_graph(steps)
+        if not await redis.exists(f"{UDPU_ENTITY}:{request.subscriber_uid}"):
+            raise QueueRunError(f"UDPU '{request.subscriber_uid}' not found")
+
+        jobs = await JobRepository(redis).get_many([step.job for step in steps])
+    except RedisError as e:
+        logger.error(f"Failed to prepare queue run: {e}")
+        raise RedisResponseError(message=str(e))
+    definitions = {}
+    for step in steps:
+        job = jobs[step.job]
+        if not job:
+            raise QueueRunError(f"Job '{step.job}' not found")
+        if job.locked != "false":
+            raise QueueRunError(f"Job '{job.name}' is locked, agents would skip it")
+        # a periodic frequency would also start the agent's own cron
+        message = {**job_message(job), "frequency": JobFrequency.ONCE.value}
+        definitions[step.id] = json.dumps({**step.model_dump(mode="json"), "job": job.name, "message": message})
+
+    now = time.time()
+    run = QueueRun(
+        id=uuid.uuid4().hex,
+        queue=queue_name,
+        subscriber_uid=request.subscriber_uid,
+        lane=request.lane,
+        status=RunStatus.RUNNING,
+        created_at=now,
+        updated_at=now,
+    )
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(run_key(run.id), mapping={
+                **run.model_dump(mode="json", exclude={"steps", "progress", "finished_at"}),
+                "order": json.dumps([step.id for step in steps]),
+            })
+            pipe.hset(steps_key(run.id), mapping=definitions)
+            pipe.hset(status_key(run.id), mapping={step.id: StepStatus.PENDING.value for step in steps})
+            pipe.zadd(QUEUE_RUN_INDEX_KEY, {run.id: now})
+            await pipe.execute()
+        logger.info(f"Queue run {run.id}: {len(steps)} steps on {run.subscriber_uid}")
+        await advance_run(redis, run.id)
+        return await get_run(redis, run.id)
+    except RedisError as e:
+        logger.error(f"Failed to create queue run {run.id}: {e}")
+        raise RedisResponseError(message=str(e))
+
+
+async def _move(redis: Redis, run_id: str, step_id: str, status: StepStatus, allowed: Iterable[StepStatus],
+                attempt: Optional[int] = None, new_attempt: Optional[int] = None) -> bool:
+    script = redis.register_script(_STEP_TRANSITION_LUA)
+    moved = await script(
+        keys=[status_key(run_id), attempts_key(run_id)],
+        args=[
+            step_id, status.value,
+            "" if attempt is None else attempt,
+            "" if new_attempt is None else new_attempt,
+            *(s.value for s in allowed),
+        ],
+    )
+    return bool(moved)
+
+
+async def _load(redis: Redis, run_id: str) -> Tuple[dict, Dict[str, dict], Dict[str, StepStatus]]:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(run_key(run_id))
+        pipe.hgetall(steps_key(run_id))
+        pipe.hgetall(status_key(run_id))
+        data, definitions, statuses = await pipe.execute()
+    return (
+        data,
+        {step_id: json.loads(raw) for step_id, raw in definitions.items()},
+        {step_id: StepStatus(status) for step_id, status in statuses.items()},
+    )
+
+
+async def _dispatch(redis: Redis, run: dict, step_id: str, definition: dict, attempt: int,
+                    allowed: StepStatus) -> Optional[StepStatus]:
+    """
+    Send attempt *attempt* of a step, if the step is still *allowed*. An
+    attempt that cannot be sent is settled as failed right away.
+
+    :return: the step's status afterwards, None if it was not *allowed*.
+    """
+    now = time.time()
+    timeout = definition["timeout"] or settings.queue_step_timeout
+    # set before the step turns running: an attempt whose sending fails halfway still times out
+    await redis.zadd(QUEUE_RUN_TIMERS_KEY, {_timer(run["id"], step_id, attempt, TIMER_TIMEOUT): now + timeout})
+    if not await _move(redis, run["id"], step_id, StepStatus.RUNNING, [allowed],
+                       attempt=attempt - 1 if attempt > 1 else None, new_attempt=attempt):
+        return None
+    lane = CommandLane(run["lane"])
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            entry = track_execution(pipe, run["subscriber_uid"], definition["message"])
+            # registered ahead of the entry, so even an instant log finds its step
+            pipe.set(execution_key(entry["execution_id"]), f"{run['id']}|{step_id}|{attempt}",
+                     ex=settings.execution_retention)
+            pipe.hset(results_key(run["id"]), step_id, json.dumps({
+                "execution_id": entry["execution_id"],
+                "dispatched_at": now,
+            }))
+            position = queue_command(pipe, run["subscriber_uid"], entry, lane)
+            replies = await pipe.execute()
+        await redis.hset(entries_key(run["id"]), step_id, replies[position])
+    except RedisError as e:
+        logger.error(f"Failed to send step {step_id} of queue run {run['id']}: {e}")
+        status = await _settle(redis, run["id"], step_id, definition, attempt, succeeded=False,
+                               result={"error": f"not sent: {e}"})
+        return status or StepStatus.RUNNING
+    return StepStatus.RUNNING
+
+
+async def _settle(redis: Redis, run_id: str, step_id: str, definition: dict, attempt: int,
+                  succeeded: bool, result: dict) -> Optional[StepStatus]:
+    """
+    Close a running attempt: success, a retry after backoff while retries
+    are left, or failure.
+
+    :return: the step's new status, None if the attempt was not running.
+    """
+    if succeeded:
+        status = StepStatus.SUCCEEDED
+    elif attempt <= definition["retries"]:
+        status = StepStatus.WAITING
+    else:
+        status = StepStatus.FAILED
+    if not await _move(redis, run_id, step_id, status, [StepStatus.RUNNING], attempt=attempt):
+        return None
+
+    now = time.time()
+    previous = await redis.hget(results_key(run_id), step_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(results_key(run_id), step_id, json.dumps({
+            **(json.loads(previous) if previous else {}), **result, "finished_at": now,
+        }))
+        pipe.zrem(QUEUE_RUN_TIMERS_KEY, _timer(run_id, step_id, attempt, TIMER_TIMEOUT))
+        if status == StepStatus.WAITING:
+            backoff = definition["backoff"] if definition["backoff"] is not None else settings.queue_step_backoff
+            pipe.zadd(QUEUE_RUN_TIMERS_KEY, {
+                _timer(run_id, step_id, attempt, TIMER_RETRY): now + backoff * 2 ** (attempt - 1),
+            })
+        await pipe.execute()
+    QUEUE_RUN_STEPS.labels("retried" if status == StepStatus.WAITING else status.value).inc()
+    return status
+
+
+def _condition_met(run_if: str, needs: List[StepStatus]) -> bool:
+    """:return: whether a step whose dependencies ended in *needs* runs."""
+    if run_if == StepCondition.SUCCESS:
+        return all(status == StepStatus.SUCCEEDED for status in needs)
+    if run_if == StepCondition.FAILURE:
+        return any(status == StepStatus.FAILED for status in needs)
+    return True
+
+
+async def advance_run(redis: Redis, run_id: str) -> None:
+    """Send every step whose dependencies are done, skip the ones whose condition failed."""
+    run, definitions, statuses = await _load(redis, run_id)
+    if not run or run["status"] != RunStatus.RUNNING:
+        return
+    changed = True
+    while changed:
+        changed = False
+        for step_id, definition in definitions.items():
+            if statuses[step_id] != StepStatus.PENDING:
+                continue
+            needs = [statuses[need] for need in definition["needs"]]
+            if any(status not in FINAL_STEP_STATUSES for status in needs):
+                continue
+            if _condition_met(definition["run_if"], needs):
+                status = await _dispatch(redis, run, step_id, definition, 1, StepStatus.PENDING)
+                statuses[step_id] = status or StepStatus.RUNNING
+                # a step failed while sending settles its dependents too
+                changed = changed or status in FINAL_STEP_STATUSES
+            elif await _move(redis, run_id, step_id, StepStatus.SKIPPED, [StepStatus.PENDING]):
+                statuses[step_id] = StepStatus.SKIPPED
+                QUEUE_RUN_STEPS.labels(StepStatus.SKIPPED.value).inc()
+                # a skipped step settles its own dependents
+                changed = True
+
+    if all(status in FINAL_STEP_STATUSES for status in statuses.values()):
+        failed = [step_id for step_id, status in statuses.items() if status == StepStatus.FAILED]
+        if failed:
+            await _finish(redis, run_id, RunStatus.FAILED, f"step(s) {', '.join(failed)} failed")
+        else:
+            await _finish(redis, run_id, RunStatus.SUCCEEDED)
+
+
+async def _finish(redis: Redis, run_id: str, status: RunStatus, reason: str = "") -> None:
+    now = time.time()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(run_key(run_id), mapping={"status": status.value, "reason": reason,
+                                            "updated_at": now, "finished_at": now})
+        for key in (run_key(run_id), steps_key(run_id), status_key(run_id), attempts_key(run_id),
+                    results_key(run_id), entries_key(run_id)):
+            pipe.expire(key, settings.queue_run_retention)
+        await pipe.execute()
+    logger.info(f"Queue run {run_id} {status.value}{': ' + reason if reason else ''}")
+
+
+async def track_step_log(redis: Redis, job_log: JobLogSchema) -> None:
+    """Settle the step a job log reports on and send what it unblocks."""
+    if not job_log.execution_id:
+        return
+    try:
+        ref = await redis.get(execution_key(job_log.execution_id))
+        if not ref:
+            return
+        run_id, step_id, attempt = ref.rsplit("|", 2)
+        raw = await redis.hget(steps_key(run_id), step_id)
+        if raw is None:
+            return
+        definition = json.loads(raw)
+        limit = settings.queue_step_output_limit
+        settled = await _settle(
+            redis, run_id, step_id, definition, int(attempt),
+            succeeded=job_log.status_code in definition["success_codes"],
+            result={
+                "exit_code": job_log.status_code,
+                "std_out": job_log.std_out[-limit:],
+                "std_err": job_log.std_err[-limit:],
+                "error": "",
+            },
+        )
+        if settled:
+            await advance_run(redis, run_id)
+    except RedisError as e:
+        logger.error("Failed to track queue step log %s of %s: %s", job_log.name, job_log.client, e)
+
+
+async def _time_out(redis: Redis, run_id: str, step_id: str, attempt: int) -> None:
+    run, definitions, _ = await _load(redis, run_id)
+    if not run:
+        return
+    definition = definitions[step_id]
+    timeout = definition["timeout"] or settings.queue_step_timeout
+    if await _settle(redis, run_id, step_id, definition, attempt, succeeded=False,
+                     result={"error": f"no result within {timeout}s"}):
+        entry_id = await redis.hget(entries_key(run_id), step_id)
+        if entry_id:
+            # the agent deletes what it received, so this only withdraws an undelivered entry
+            await redis.xdel(lane_stream(run["subscriber_uid"], CommandLane(run["lane"])), entry_id)
+
+
+async def _retry(redis: Redis, run_id: str, step_id: str, attempt: int) -> None:
+    run, definitions, _ = await _load(redis, run_id)
+    if run and run["status"] == RunStatus.RUNNING:
+        await _dispatch(redis, run, step_id, definitions[step_id], attempt + 1, StepStatus.WAITING)
+
+
+async def advance_queue_runs(redis: Redis, fence: Fence) -> None:
+    """Periodic task: time out silent attempts and start due retries."""
+    for member in await redis.zrangebyscore(QUEUE_RUN_TIMERS_KEY, "-inf", time.time()):
+        if not await fence.claim(redis, _CLAIM_TIMER_LUA, keys=[QUEUE_RUN_TIMERS_KEY], args=[member]):
+            continue
+        run_id, step_id, attempt, kind = _parse_timer(member)
+        try:
+            if kind == TIMER_TIMEOUT:
+                await _time_out(redis, run_id, step_id, attempt)
+            else:
+                await _retry(redis, run_id, step_id, attempt)
+            await advance_run(redis, run_id)
+        except (RedisError, KeyError) as e:
+            logger.error("Failed to advance queue run %s at step %s: %s", run_id, step_id, e)
+
+
+async def cancel_run(redis: Redis, run_id: str) -> None:
+    """
+    Stop a running queue run: steps not finished are cancelled and
+    commands not yet read by the agent withdrawn.
+
+    :raises QueueRunError: no such run.
+    :raises QueueRunConflict: the run has already finished.
+    """
+    run, definitions, statuses = await _load(redis, run_id)
+    if not run:
+        raise QueueRunError(f"Queue run '{run_id}' not found")
+    if run["status"] != RunStatus.RUNNING:
+        raise QueueRunConflict(f"Queue run '{run_id}' is {run['status']}, cannot be cancelled")
+
+    await redis.hset(run_key(run_id), "status", RunStatus.CANCELLED.value)
+    entries = await redis.hgetall(entries_key(run_id))
+    attempts = await redis.hgetall(attempts_key(run_id))
+    open_statuses = [StepStatus.PENDING, StepStatus.WAITING, StepStatus.RUNNING]
+    for step_id, status in statuses.items():
+        if status in FINAL_STEP_STATUSES:
+            continue
+        if not await _move(redis, run_id, step_id, StepStatus.CANCELLED, open_statuses):
+            continue
+        attempt = int(attempts.get(step_id, 0))
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(QUEUE_RUN_TIMERS_KEY, _timer(run_id, step_id, attempt, TIMER_TIMEOUT),
+                      _timer(run_id, step_id, attempt, TIMER_RETRY))
+            if status == StepStatus.RUNNING and step_id in entries:
+                pipe.xdel(lane_stream(run["subscriber_uid"], CommandLane(run["lane"])), entries[step_id])
+            await pipe.execute()
+        QUEUE_RUN_STEPS.labels(StepStatus.CANCELLED.value).inc()
+    await _finish(redis, run_id, RunStatus.CANCELLED)
+
+
+async def get_run(redis: Redis, run_id: str) -> Optional[QueueRun]:
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in (run_key(run_id), steps_key(run_id), status_key(run_id), attempts_key(run_id),
+                    results_key(run_id), entries_key(run_id)):
+            pipe.hgetall(key)
+        data, definitions, statuses, attempts, results, entries = await pipe.execute()
+    if not data:
+        return None
+    steps = []
+    for step_id in json.loads(data["order"]):
+        definition = json.loads(definitions[step_id])
+        steps.append(StepState(
+            **{key: definition[key] for key in ("id", "job", "needs", "run_if")},
+            **json.loads(results.get(step_id, "{}")),
+            status=statuses[step_id],
+            attempt=int(attempts.get(step_id, 0)),
+            entry_id=entries.get(step_id, ""),
+        ))
+    return QueueRun(**{key: value for key, value in data.items() if key != "order"}, steps=steps)
+
+
+async def list_runs(redis: Redis, limit: int) -> List[QueueRun]:
+    """Newest first. Ids whose run has expired are dropped from the index."""
+    runs, expired = [], []
+    for run_id in await redis.zrevrange(QUEUE_RUN_INDEX_KEY, 0, limit - 1):
+        run = await get_run(redis, run_id)
+        if run is None:
+            expired.append(run_id)
+        else:
+            runs.append(run)
+    if expired:
+        await redis.zrem(QUEUE_RUN_INDEX_KEY, *expired)
+    return runs
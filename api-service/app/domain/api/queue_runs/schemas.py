@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field, computed_field, model_validator
+
+from domain.api.websocket.constants import CommandLane
+
+
+class RunStatus(str, Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class StepStatus(str, Enum):
+    PENDING = "pending"
+    # failed an attempt, waiting out the backoff before the next
+    WAITING = "waiting"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    # its run_if condition did not hold
+    SKIPPED = "skipped"
+    CANCELLED = "cancelled"
+
+
+FINAL_STEP_STATUSES = {StepStatus.SUCCEEDED, StepStatus.FAILED, StepStatus.SKIPPED, StepStatus.CANCELLED}
+
+
+class StepCondition(str, Enum):
+    # every step it needs succeeded
+    SUCCESS = "success"
+    # at least one step it needs failed
+    FAILURE = "failure"
+    # the steps it needs are done, whatever their result
+    ALWAYS = "always"
+
+
+class QueueStep(BaseModel):
+    """
+    One job of a queue run. Steps without a dependency between them run in
+    parallel. Unset timeout and backoff fall back to the QUEUE_STEP_* settings.
+    """
+
+    id: str = Field("", description="Step id, the job name by default")
+    job: str = Field(..., description="Job name or uid")
+    needs: List[str] = Field([], description="Ids of the steps that must finish first")
+    run_if: StepCondition = StepCondition.SUCCESS
+    success_codes: List[str] = Field(["0"], description="Exit codes that count as success")
+    timeout: Optional[int] = Field(None, ge=1, description="Seconds an attempt may take, delivery included")
+    retries: int = Field(0, ge=0, le=10)
+    backoff: Optional[float] = Field(None, ge=0, description="Seconds before the first retry, doubled after each")
+
+    @model_validator(mode="after")
+    def _default_id(self) -> "QueueStep":
+        if not self.id:
+            self.id = self.job
+        return self
+
+
+class QueueRunCreate(BaseModel):
+    """
+    Run a queue on one device, step by step from the server. Without
+    ``steps`` the queue's jobs run one after the other; with them the queue
+    name is only a label.
+    """
+
+    subscriber_uid: str
+    queue: Optional[str] = Field(None, description="Queue name or uid")
+    steps: List[QueueStep] = []
+    lane: CommandLane = CommandLane.NORMAL
+
+    @model_validator(mode="after")
+    def _has_steps(self) -> "QueueRunCreate":
+        if not self.queue and not self.steps:
+            raise ValueError("set a queue or steps")
+        return self
+
+
+class StepState(BaseModel):
+    id: str
+    job: str
+    needs: List[str] = []
+    run_if: StepCondition = StepCondition.SUCCESS
+    status: StepStatus
+    attempt: int = 0
+    execution_id: str = ""
+    # stream entry of the current attempt, to withdraw it on cancel
+    entry_id: str = ""
+    exit_code: str = ""
+    std_out: str = ""
+    std_err: str = ""
+    error: str = ""
+    dispatched_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class QueueRun(BaseModel):
+    id: str
+    queue: str = ""
+    subscriber_uid: str
+    lane: CommandLane
+    status: RunStatus
+    reason: str = ""
+    created_at: float
+    updated_at: float
+    finished_at: Optional[float] = None
+    steps: List[StepState] = []
+
+    @computed_field
+    @property
+    def progress(self) -> Dict[str, int]:
+        """Number of steps per status."""
+        counts = {status.value: 0 for status in StepStatus}
+        for step in self.steps:
+            counts[step.status.value] += 1
+        return counts
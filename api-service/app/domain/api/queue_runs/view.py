@@ -0,0 +1,51 @@
+from http import HTTPStatus
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi_utils.cbv import cbv
+
+from services.redis.exceptions import RedisResponseError
+
+from .core import QueueRunConflict, QueueRunError, cancel_run, create_run, get_run, list_runs
+from .schemas import QueueRun, QueueRunCreate
+
+router = APIRouter()
+
+
+@cbv(router)
+class QueueRunsAPI:
+    """
+    Queues executed step by step from the server.
+    """
+
+    @router.post("/queue-runs", response_model=QueueRun, status_code=HTTPStatus.CREATED)
+    async def create(self, request: Request, body: QueueRunCreate) -> QueueRun:
+        try:
+            return await create_run(request.app.state.redis, body)
+        except QueueRunError as e:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.message)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+
+    @router.get("/queue-runs", response_model=List[QueueRun])
+    async def list_all(self, request: Request, limit: int = Query(50, ge=1, le=500)) -> List[QueueRun]:
+        return await list_runs(request.app.state.redis, limit)
+
+    @router.get("/queue-runs/{run_id}", response_model=QueueRun)
+    async def get(self, request: Request, run_id: str) -> QueueRun:
+        run = await get_run(request.app.state.redis, run_id)
+        if run is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Queue run '{run_id}' not found")
+        return run
+
+    @router.post("/queue-runs/{run_id}/cancel", response_model=QueueRun)
+    async def cancel(self, request: Request, run_id: str) -> QueueRun:
+        """Cancel the unfinished steps and withdraw commands the agent has not read yet."""
+        redis = request.app.state.redis
+        try:
+            await cancel_run(redis, run_id)
+        except QueueRunConflict as e:
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=e.message)
+        except QueueRunError as e:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.message)
+        return await get_run(redis, run_id)
@@ -6,12 +6,17 @@ from redis.asyncio import Redis
 from redis.exceptions import RedisError
 from services.logging.logger import log as logger
 from services.redis.exceptions import RedisResponseError
+from services.singleflight import coalesce
 from domain.api.exceptions import RecordNotFound
 from domain.api.roles.constants import ROLE_PREFIX
 from domain.api.roles.schemas import UdpuRole, UdpuRoleClone, UdpuRoleUpdate
-from domain.api.jobs.constants import JOB_PREFIX
+from domain.api.jobs.core import JobRepository, _index_role, _refresh_queues, job_role_key
 from domain.api.jobs.queues.constants import QUEUE_PREFIX
-from domain.api.northbound.constants import UDPU_ENTITY
+from domain.api.jobs.queues.expansion import build_expansion, queue_role_key
+from domain.api.jobs.queues.schemas import JobQueueSchema
+from domain.api.northbound.constants import ROLE_INDEX_PREFIX, UDPU_ENTITY
+from domain.api.sync.core import record_change, record_changes
+from domain.api.sync.schemas import ChangeOp, SyncEntity
 
 
 def _normalize_interfaces(interfaces: dict) -> dict:
@@ -45,18 +50,50 @@ def get_primary_ghn_interfaces(role: dict) -> tuple[str, str]:
     return port.get("ghn_interface", ""), port.get("lcmp_interface", "")
 
 
-async def _update_role_in_jobs(redis: Redis, old_name: str, new_name: str) -> None:
-    async for key in redis.scan_iter(f"{JOB_PREFIX}:*"):
-        data = await redis.hgetall(key)
-        if data and data.get("role") == old_name:
-            await redis.hset(key, mapping={"role": new_name})
-
-
-async def _update_role_in_queues(redis: Redis, old_name: str, new_name: str) -> None:
-    async for key in redis.scan_iter(f"{QUEUE_PREFIX}:*"):
-        data = await redis.hgetall(key)
-        if data and data.get("role") == old_name:
-            await redis.hset(key, mapping={"role": new_name})
+async def _update_role_in_jobs(redis: Redis, old_name: str, new_name: str) -> list[str]:
+    names = sorted(await redis.smembers(job_role_key(old_name)))
+    if not names:
+        return []
+    found = await JobRepository(redis).get_many(names)
+    moved = []
+    async with redis.pipeline(transaction=False) as pipe:
+        for name in names:
+            job = found[name]
+            if job is None or job.role != old_name:
+                pipe.srem(job_role_key(old_name), name)
+                continue
+            previous = job.model_copy()
+            job.role = new_name
+            pipe.hset(job.key, mapping={"role": new_name})
+            _index_role(pipe, previous, job)
+            moved.append(job)
+        await pipe.execute()
+    # expansions embed the jobs they list, role included
+    await _refresh_queues(redis, *moved)
+    return [job.name for job in moved]
+
+
+async def _update_role_in_queues(redis: Redis, old_name: str, new_name: str) -> list[str]:
+    names = sorted(await redis.smembers(queue_role_key(old_name)))
+    if not names:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for name in names:
+            pipe.hgetall(f"{QUEUE_PREFIX}:{name}:{JobQueueSchema._generate_uid(name)}")
+        stored = await pipe.execute()
+    updated = []
+    for name, data in zip(names, stored):
+        if not data or data.get("role") != old_name:
+            await redis.srem(queue_role_key(old_name), name)
+            continue
+        queue = JobQueueSchema(**data)
+        previous = queue.model_copy()
+        queue.role = new_name
+        await redis.hset(queue.key, mapping={"role": new_name})
+        # moves the queue between role indexes and rebuilds the body it serves
+        await build_expansion(redis, queue, previous)
+        updated.append(name)
+    return updated
 
 
 def _build_mapping(data: dict) -> dict[str, str]:
@@ -76,32 +113,40 @@ async def create_new_role(redis: Redis, role: UdpuRole) -> dict:
         payload = role.model_dump()
         mapping = _build_mapping(payload)
         await redis.hset(role.key, mapping=mapping)
+        await record_change(redis, SyncEntity.ROLE, role.name)
         return payload
     except RedisError as e:
         logger.error(e)
         raise RedisResponseError(message=str(e))
 
 
+def decode_role(data: dict) -> dict | None:
+    # inverse of _build_mapping for a raw redis hash
+    if not data:
+        return None
+    result: dict = {}
+    for field, val in data.items():
+        if field in ("wireguard_tunnel", "job_control", "interfaces"):
+            result[field] = json.loads(val)
+        else:
+            result[field] = val
+    if "interfaces" in result:
+        result["interfaces"] = _normalize_interfaces(result.get("interfaces") or {})
+    return result
+
+
+@coalesce("role")
 async def get_udpu_role(redis: Redis, name: str) -> dict | None:
     key = f"{ROLE_PREFIX}:{name}"
     try:
         data = await redis.hgetall(key)
-        if not data:
-            return None
-        result: dict = {}
-        for field, val in data.items():
-            if field in ("wireguard_tunnel", "job_control", "interfaces"):
-                result[field] = json.loads(val)
-            else:
-                result[field] = val
-        if "interfaces" in result:
-            result["interfaces"] = _normalize_interfaces(result.get("interfaces") or {})
-        return result
+        return decode_role(data)
     except RedisError as e:
         logger.error(e)
         raise RedisResponseError(message=str(e))
 
 
+@coalesce("role")
 async def list_udpu_roles(redis: Redis) -> list[dict]:
     try:
         roles: list[dict] = []
@@ -134,6 +179,11 @@ async def update_role(redis: Redis, name: str, role_update: UdpuRoleUpdate) -> d
             new_key = f"{ROLE_PREFIX}:{update_data['name']}"
             await redis.hset(new_key, mapping=mapping)
 
+            changes = [
+                (SyncEntity.ROLE, name, ChangeOp.DELETE),
+                (SyncEntity.ROLE, update_data["name"], ChangeOp.UPSERT),
+            ]
+
             # update related entities
             pattern = re.compile(r"[a-f0-9]{16}")
             async for udpu_key in redis.scan_iter(f"{UDPU_ENTITY}:*"):
@@ -142,11 +192,22 @@ async def update_role(redis: Redis, name: str, role_update: UdpuRoleUpdate) -> d
                     udpu_data = await redis.hgetall(udpu_key)
                     if udpu_data.get("role") == name:
                         udpu_data["role"] = update_data["name"]
-                        await redis.hset(udpu_key, mapping=udpu_data)
-            await _update_role_in_jobs(redis, name, update_data["name"])
-            await _update_role_in_queues(redis, name, update_data["name"])
+                        async with redis.pipeline(transaction=False) as pipe:
+                            pipe.hset(udpu_key, mapping=udpu_data)
+                            pipe.srem(f"{ROLE_INDEX_PREFIX}:{name}", uuid)
+                            pipe.sadd(f"{ROLE_INDEX_PREFIX}:{update_data['name']}", uuid)
+                            pipe.sadd(f"{UDPU_ENTITY}:role_list", update_data["name"])
+                            await pipe.execute()
+                        changes.append((SyncEntity.UDPU, uuid, ChangeOp.UPSERT))
+            # queues first, so the expansions the job moves rebuild carry the new queue role too
+            for queue_name in await _update_role_in_queues(redis, name, update_data["name"]):
+                changes.append((SyncEntity.QUEUE, queue_name, ChangeOp.UPSERT))
+            for job_name in await _update_role_in_jobs(redis, name, update_data["name"]):
+                changes.append((SyncEntity.JOB, job_name, ChangeOp.UPSERT))
+            await record_changes(redis, changes)
         else:
             await redis.hset(old_key, mapping=mapping)
+            await record_change(redis, SyncEntity.ROLE, name)
 
         return existing
     except RedisError as e:
@@ -164,6 +225,7 @@ async def clone_role(redis: Redis, role_clone: UdpuRoleClone) -> None:
         mapping = dict(data)
         mapping["name"] = role_clone.new_role_name
         await redis.hset(new_key, mapping=mapping)
+        await record_change(redis, SyncEntity.ROLE, role_clone.new_role_name)
     except RedisError as e:
         logger.error(e)
         raise RedisResponseError(message=str(e))
@@ -173,6 +235,7 @@ async def delete_role(redis: Redis, name: str) -> None:
     key = f"{ROLE_PREFIX}:{name}"
     try:
         await redis.delete(key)
+        await record_change(redis, SyncEntity.ROLE, name, ChangeOp.DELETE)
     except RedisError as e:
         logger.error(e)
         raise RedisResponseError(message=str(e))
@@ -0,0 +1,10 @@
+ROLLOUT_PREFIX = "ROLLOUT"
+# rollout ids by creation time
+ROLLOUT_INDEX_KEY = f"{ROLLOUT_PREFIX}:index"
+# rollouts the engine still has to advance
+ROLLOUT_ACTIVE_KEY = f"{ROLLOUT_PREFIX}:active"
+# per execution id: the rollout and device it was dispatched for, and the jobs awaited
+ROLLOUT_EXECUTION_PREFIX = f"{ROLLOUT_PREFIX}:execution"
+
+# exit code the agent reports for a successful command
+SUCCESS_STATUS_CODE = "0"
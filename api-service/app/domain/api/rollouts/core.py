@@ -0,0 +1,570 @@
+"""
+Staged rollouts of a job or queue to many devices.
+
+A rollout resolves its devices once, at creation, into a pending list and
+hands them out in waves. Within a wave no more than max_concurrency devices
+wait for a result at a time; each one gets the command on its personal
+stream, the same entry `/pub` writes for `run job` and `run queue`. A
+device's result comes from the job logs its agent posts with the entry's
+execution id: success once every awaited job logged exit code 0, failure
+on the first other code, timeout after device_timeout seconds without a
+verdict. Logs of other runs of the same jobs do not count. When a wave is done the
+success rate so far is checked against success_threshold and the rollout
+halts below it.
+
+The engine (`advance_rollouts`) runs as a cluster-wide periodic task, so
+one worker dispatches at a time; its claims are fenced by the lease
+token, so a deposed leader still mid-tick cannot claim devices as well.
+API calls only flip the status; the engine does the follow-up work on its
+next tick. Devices leave the pending list and enter the in-flight set in
+one step; those a failed dispatch did not reach go back to pending.
+"""
+import json
+import time
+import uuid
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from domain.api.executions.core import track_execution
+from domain.api.jobs.core import JobRepository
+from domain.api.jobs.queues.core import QueueRepository
+from domain.api.jobs.queues.schemas import ExpandedQueue
+from domain.api.logs.schemas import JobLogSchema
+from domain.api.northbound.constants import LOCATION_PREFIX, ROLE_INDEX_PREFIX, UDPU_ENTITY
+from domain.api.northbound.dependencies import get_online_subscribers
+from domain.api.presence.core import connected_subscribers
+from domain.api.websocket.messages import job_message, lane_stream, queue_command, queue_message
+from services.leader import Fence
+from services.logging.logger import log as logger
+from services.metrics import ROLLOUT_DEVICES
+from services.redis.exceptions import RedisResponseError
+
+from .constants import (
+    ROLLOUT_ACTIVE_KEY,
+    ROLLOUT_EXECUTION_PREFIX,
+    ROLLOUT_INDEX_KEY,
+    ROLLOUT_PREFIX,
+    SUCCESS_STATUS_CODE,
+)
+from .schemas import DeviceResult, Rollout, RolloutCreate, RolloutDevice, RolloutStatus, RolloutTarget
+
+settings = get_app_settings()
+
+_COUNTERS = {
+    DeviceResult.SUCCESS: "succeeded",
+    DeviceResult.FAILED: "failed",
+    DeviceResult.TIMEOUT: "timed_out",
+    DeviceResult.CANCELLED: "cancelled",
+}
+
+# Moves a rollout to ARGV[1] if its status is one of ARGV[4:]. Resuming a
+# halted rollout accepts the wave that failed its gate and starts the next;
+# aborting drops the devices not dispatched yet.
+_TRANSITION_LUA = """
+local current = redis.call('HGET', KEYS[1], 'status')
+if not current then
+    return {0, ''}
+end
+for i = 4, #ARGV do
+    if ARGV[i] == current then
+        redis.call('HSET', KEYS[1], 'status', ARGV[1], 'updated_at', ARGV[2], 'reason', ARGV[3])
+        if current == 'halted' and ARGV[1] == 'running' then
+            redis.call('HINCRBY', KEYS[1], 'wave', 1)
+            redis.call('HSET', KEYS[1], 'wave_dispatched', 0)
+        end
+        if ARGV[1] == 'aborted' then
+            redis.call('DEL', KEYS[2])
+        end
+        return {1, current}
+    end
+end
+return {0, current}
+"""
+
+
+# Takes up to ARGV[1] devices off the pending list and puts them in flight
+# with deadline ARGV[2], in one step: a dispatch that stops midway leaves
+# each of them in flight, to be settled or timed out, never lost.
+_CLAIM_LUA = """
+local uids = redis.call('LPOP', KEYS[1], ARGV[1])
+if not uids then
+    return {}
+end
+for _, uid in ipairs(uids) do
+    redis.call('ZADD', KEYS[2], ARGV[2], uid)
+end
+return uids
+"""
+
+
+class RolloutError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
+
+
+class RolloutConflict(RolloutError):
+    """The rollout's status does not allow the requested change."""
+
+
+def rollout_key(rollout_id: str) -> str:
+    return f"{ROLLOUT_PREFIX}:{rollout_id}"
+
+
+def pending_key(rollout_id: str) -> str:
+    return f"{ROLLOUT_PREFIX}:{rollout_id}:pending"
+
+
+def inflight_key(rollout_id: str) -> str:
+    """ZSET of dispatched devices scored by their result deadline."""
+    return f"{ROLLOUT_PREFIX}:{rollout_id}:inflight"
+
+
+def remaining_key(rollout_id: str) -> str:
+    """Per dispatched device, the number of awaited jobs not logged yet."""
+    return f"{ROLLOUT_PREFIX}:{rollout_id}:remaining"
+
+
+def entries_key(rollout_id: str) -> str:
+    """Per dispatched device, the id of its command stream entry."""
+    return f"{ROLLOUT_PREFIX}:{rollout_id}:entries"
+
+
+def executions_key(rollout_id: str) -> str:
+    """Per dispatched device, the execution id of its command."""
+    return f"{ROLLOUT_PREFIX}:{rollout_id}:executions"
+
+
+def results_key(rollout_id: str) -> str:
+    return f"{ROLLOUT_PREFIX}:{rollout_id}:results"
+
+
+def execution_key(execution_id: str) -> str:
+    """Hash of the rollout and device an execution belongs to, with a ``job:<name>`` field per awaited job."""
+    return f"{ROLLOUT_EXECUTION_PREFIX}:{execution_id}"
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def resolve_targets(redis: Redis, target: RolloutTarget) -> List[str]:
+    """Subscriber uids selected by *target*, from the role and location indexes."""
+    index_keys = []
+    if target.role:
+        index_keys.append(f"{ROLE_INDEX_PREFIX}:{target.role}")
+    if target.location:
+        index_keys.append(f"{LOCATION_PREFIX}:{target.location}")
+    selected = set(await redis.sinter(index_keys)) if index_keys else None
+    if target.status:
+        if target.status == "online":
+            online = set(await get_online_subscribers(redis))
+        else:
+            online = set(await connected_subscribers(redis))
+        selected = online if selected is None else selected & online
+
+    if not target.subscribers:
+        return sorted(selected)
+    explicit = [uid for uid in dict.fromkeys(target.subscribers) if selected is None or uid in selected]
+    # unknown uids would only ever time out
+    known = []
+    for chunk in _chunks(explicit, settings.rollout_pipeline_chunk):
+        async with redis.pipeline(transaction=False) as pipe:
+            for uid in chunk:
+                pipe.exists(f"{UDPU_ENTITY}:{uid}")
+            known.extend(uid for uid, exists in zip(chunk, await pipe.execute()) if exists)
+    return known
+
+
+async def resolve_payload(redis: Redis, request) -> Tuple[str, str, dict, List[str]]:
+    """
+    Job or queue named by *request* (anything with ``job`` and ``queue``).
+
+    :return: action type, job or queue name, stream entry and the jobs to await.
+    :raises RolloutError: unknown or locked job or queue.
+    """
+    jobs = JobRepository(redis)
+    if request.job:
+        job = await jobs.get(request.job)
+        if not job:
+            raise RolloutError(f"Job '{request.job}' not found")
+        if job.locked != "false":
+            raise RolloutError(f"Job '{job.name}' is locked, agents would skip it")
+        return "job", job.name, job_message(job), [job.name]
+
+    stored = await QueueRepository(redis).get_expanded(request.queue)
+    if not stored:
+        raise RolloutError(f"Queue '{request.queue}' not found")
+    expanded = ExpandedQueue.model_validate_json(stored["body"])
+    queue = expanded.queue
+    if queue.locked != "false":
+        raise RolloutError(f"Queue '{queue.name}' is locked, agents would skip it")
+    # agents run only the queue's jobs that require output
+    awaited = list(dict.fromkeys(job.name for job in expanded.jobs if job.require_output == "true"))
+    if not awaited:
+        raise RolloutError(f"Queue '{queue.name}' has no job an agent would run")
+    return "queue", queue.name, queue_message(queue), awaited
+
+
+async def create_rollout(redis: Redis, request: RolloutCreate) -> Rollout:
+    """
+    :raises RolloutError: unknown or locked payload, or no device matches.
+    """
+    action_type, payload_name, message, awaited = await resolve_payload(redis, request)
+    subscribers = await resolve_targets(redis, request.target)
+    if not subscribers:
+        raise RolloutError("No devices match the target")
+
+    now = time.time()
+    rollout = Rollout(
+        id=uuid.uuid4().hex,
+        name=request.name,
+        action_type=action_type,
+        payload_name=payload_name,
+        lane=request.lane,
+        jobs=awaited,
+        status=RolloutStatus.RUNNING,
+        wave_size=request.wave_size or settings.rollout_wave_size,
+        max_concurrency=request.max_concurrency or settings.rollout_max_concurrency,
+        success_threshold=(
+            request.success_threshold if request.success_threshold is not None
+            else settings.rollout_success_threshold
+        ),
+        device_timeout=request.device_timeout or settings.rollout_device_timeout,
+        total=len(subscribers),
+        created_at=now,
+        updated_at=now,
+    )
+    await store_rollout(redis, rollout, message, pending=subscribers)
+    logger.info(f"Rollout {rollout.id}: {action_type} {payload_name} to {len(subscribers)} devices")
+    return rollout
+
+
+async def store_rollout(redis: Redis, rollout: Rollout, message: dict, pending: Sequence[str] = (),
+                        active: bool = True) -> None:
+    """
+    Save a new rollout with its devices still to dispatch. With *active*
+    unset the engine ignores it until `activate_rollout` is called.
+    """
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            # every device gets the definition as it was when the rollout started
+            pipe.hset(rollout_key(rollout.id), mapping={**rollout.to_hash(), "message": json.dumps(message)})
+            for chunk in _chunks(pending, settings.rollout_pipeline_chunk):
+                pipe.rpush(pending_key(rollout.id), *chunk)
+            pipe.zadd(ROLLOUT_INDEX_KEY, {rollout.id: rollout.created_at})
+            if active:
+                pipe.sadd(ROLLOUT_ACTIVE_KEY, rollout.id)
+            await pipe.execute()
+    except RedisError as e:
+        logger.error("Failed to create rollout %s: %s", rollout.id, e)
+        raise RedisResponseError(message=str(e))
+
+
+async def activate_rollout(redis: Redis, rollout_id: str) -> None:
+    await redis.sadd(ROLLOUT_ACTIVE_KEY, rollout_id)
+
+
+async def get_rollout(redis: Redis, rollout_id: str) -> Optional[Rollout]:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(rollout_key(rollout_id))
+        pipe.zcard(inflight_key(rollout_id))
+        data, in_flight = await pipe.execute()
+    if not data:
+        return None
+    return Rollout.from_hash({**data, "in_flight": in_flight})
+
+
+async def list_rollouts(redis: Redis, limit: int) -> List[Rollout]:
+    """Newest first. Ids whose rollout has expired are dropped from the index."""
+    ids = await redis.zrevrange(ROLLOUT_INDEX_KEY, 0, limit - 1)
+    if not ids:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for rollout_id in ids:
+            pipe.hgetall(rollout_key(rollout_id))
+            pipe.zcard(inflight_key(rollout_id))
+        replies = await pipe.execute()
+    rollouts, expired = [], []
+    for rollout_id, data, in_flight in zip(ids, replies[::2], replies[1::2]):
+        if data:
+            rollouts.append(Rollout.from_hash({**data, "in_flight": in_flight}))
+        else:
+            expired.append(rollout_id)
+    if expired:
+        await redis.zrem(ROLLOUT_INDEX_KEY, *expired)
+    return rollouts
+
+
+async def list_devices(redis: Redis, rollout_id: str, cursor: int, limit: int,
+                       result: Optional[DeviceResult] = None) -> Tuple[int, List[RolloutDevice]]:
+    """One HSCAN page of device results, optionally of a single kind."""
+    cursor, rows = await redis.hscan(results_key(rollout_id), cursor=cursor, count=limit)
+    devices = []
+    for subscriber_uid, raw in rows.items():
+        device = RolloutDevice(subscriber_uid=subscriber_uid, **json.loads(raw))
+        if result is None or device.result == result:
+            devices.append(device)
+    return cursor, devices
+
+
+async def transition(redis: Redis, rollout_id: str, status: RolloutStatus,
+                     allowed: Iterable[RolloutStatus], reason: str = "") -> RolloutStatus:
+    """
+    Change the rollout's status, atomically checked against *allowed*.
+
+    :return: the previous status.
+    :raises RolloutError: no such rollout.
+    :raises RolloutConflict: the current status is not in *allowed*.
+    """
+    script = redis.register_script(_TRANSITION_LUA)
+    changed, current = await script(
+        keys=[rollout_key(rollout_id), pending_key(rollout_id)],
+        args=[status.value, time.time(), reason, *(s.value for s in allowed)],
+    )
+    if not current:
+        raise RolloutError(f"Rollout '{rollout_id}' not found")
+    if not changed:
+        raise RolloutConflict(f"Rollout '{rollout_id}' is {current}, cannot become {status.value}")
+    return RolloutStatus(current)
+
+
+async def pause_rollout(redis: Redis, rollout_id: str) -> RolloutStatus:
+    return await transition(redis, rollout_id, RolloutStatus.PAUSED, [RolloutStatus.RUNNING])
+
+
+async def resume_rollout(redis: Redis, rollout_id: str) -> RolloutStatus:
+    return await transition(redis, rollout_id, RolloutStatus.RUNNING, [RolloutStatus.PAUSED, RolloutStatus.HALTED])
+
+
+async def abort_rollout(redis: Redis, rollout_id: str) -> RolloutStatus:
+    return await transition(
+        redis, rollout_id, RolloutStatus.ABORTED,
+        [RolloutStatus.RUNNING, RolloutStatus.PAUSED, RolloutStatus.HALTED],
+    )
+
+
+async def record_result(redis: Redis, rollout: Rollout, subscriber_uid: str, result: DeviceResult,
+                        status_code: str = "") -> bool:
+    """
+    Settle a dispatched device. Only the first verdict counts: it is the one
+    that removes the device from the in-flight set.
+    """
+    if not await redis.zrem(inflight_key(rollout.id), subscriber_uid):
+        return False
+    execution_id = await redis.hget(executions_key(rollout.id), subscriber_uid)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(results_key(rollout.id), subscriber_uid, json.dumps({
+            "result": result.value,
+            "status_code": status_code,
+            "at": time.time(),
+        }))
+        pipe.hincrby(rollout_key(rollout.id), _COUNTERS[result], 1)
+        pipe.hdel(remaining_key(rollout.id), subscriber_uid)
+        pipe.hdel(entries_key(rollout.id), subscriber_uid)
+        pipe.hdel(executions_key(rollout.id), subscriber_uid)
+        if execution_id:
+            pipe.delete(execution_key(execution_id))
+        await pipe.execute()
+    ROLLOUT_DEVICES.labels(result.value).inc()
+    return True
+
+
+async def fail_undispatched(redis: Redis, rollout: Rollout, subscribers: Sequence[str]) -> int:
+    """
+    Record the devices among *subscribers* that a dispatch stopped by an
+    error never reached as failed, so the rollout can still complete.
+
+    :return: the number of devices recorded.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrange(inflight_key(rollout.id), 0, -1)
+        pipe.hkeys(results_key(rollout.id))
+        in_flight, settled = await pipe.execute()
+    reached = set(in_flight) | set(settled)
+    missed = [uid for uid in subscribers if uid not in reached]
+    if not missed:
+        return 0
+    result = json.dumps({"result": DeviceResult.FAILED.value, "status_code": "", "at": time.time()})
+    async with redis.pipeline(transaction=False) as pipe:
+        for chunk in _chunks(missed, settings.rollout_pipeline_chunk):
+            pipe.hset(results_key(rollout.id), mapping={uid: result for uid in chunk})
+        pipe.hincrby(rollout_key(rollout.id), _COUNTERS[DeviceResult.FAILED], len(missed))
+        await pipe.execute()
+    ROLLOUT_DEVICES.labels(DeviceResult.FAILED.value).inc(len(missed))
+    return len(missed)
+
+
+async def track_job_log(redis: Redis, job_log: JobLogSchema) -> None:
+    """
+    Feed a job log posted by an agent into the rollout whose command it
+    reports on, matched by execution id. Each awaited job counts once.
+
+    Never raises: the log itself is already stored, and a lost verdict only
+    lets the device time out.
+    """
+    if not job_log.execution_id:
+        return
+    key = execution_key(job_log.execution_id)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(key, "rollout", "subscriber_uid")
+            pipe.hdel(key, f"job:{job_log.name}")
+            (rollout_id, subscriber_uid), awaited = await pipe.execute()
+        if not rollout_id or not awaited:
+            return
+        rollout = await get_rollout(redis, rollout_id)
+        if rollout is None:
+            return
+        if job_log.status_code != SUCCESS_STATUS_CODE:
+            await record_result(redis, rollout, subscriber_uid, DeviceResult.FAILED, job_log.status_code)
+            return
+        left = await redis.hincrby(remaining_key(rollout_id), subscriber_uid, -1)
+        if left <= 0:
+            await record_result(redis, rollout, subscriber_uid, DeviceResult.SUCCESS, job_log.status_code)
+    except RedisError as e:
+        logger.error("Failed to track job log %s of %s: %s", job_log.name, job_log.client, e)
+
+
+async def dispatch(redis: Redis, rollout: Rollout, message: dict, subscribers: List[str]) -> None:
+    """
+    Push the command to each device's stream, a pipeline per chunk. The
+    execution, its awaited jobs and the deadline are registered in the same
+    pipeline ahead of the entry, so even an instant log finds its rollout.
+    """
+    deadline = time.time() + rollout.device_timeout
+    awaited = {f"job:{job}": 1 for job in rollout.jobs}
+    for chunk in _chunks(subscribers, settings.rollout_pipeline_chunk):
+        async with redis.pipeline(transaction=False) as pipe:
+            positions = []
+            for uid in chunk:
+                entry = track_execution(pipe, uid, message)
+                key = execution_key(entry["execution_id"])
+                pipe.hset(key, mapping={"rollout": rollout.id, "subscriber_uid": uid, **awaited})
+                pipe.expire(key, settings.execution_retention)
+                pipe.hset(executions_key(rollout.id), uid, entry["execution_id"])
+                pipe.hset(remaining_key(rollout.id), uid, len(rollout.jobs))
+                pipe.zadd(inflight_key(rollout.id), {uid: deadline})
+                positions.append(queue_command(pipe, uid, entry, rollout.lane))
+            pipe.hincrby(rollout_key(rollout.id), "dispatched", len(chunk))
+            pipe.hincrby(rollout_key(rollout.id), "wave_dispatched", len(chunk))
+            replies = await pipe.execute()
+        entry_ids = [replies[position] for position in positions]
+        await redis.hset(entries_key(rollout.id), mapping=dict(zip(chunk, entry_ids)))
+
+
+async def _expire_timed_out(redis: Redis, rollout: Rollout) -> int:
+    expired = await redis.zrangebyscore(inflight_key(rollout.id), "-inf", time.time())
+    settled = 0
+    for uid in expired:
+        settled += await record_result(redis, rollout, uid, DeviceResult.TIMEOUT)
+    return settled
+
+
+async def _cancel(redis: Redis, rollout: Rollout) -> None:
+    """Withdraw the commands of an aborted rollout that agents have not read yet."""
+    entries = await redis.hgetall(entries_key(rollout.id))
+    for uid in await redis.zrange(inflight_key(rollout.id), 0, -1):
+        if uid in entries:
+            # agents delete the entries they received, so this only hits undelivered ones
+            await redis.xdel(lane_stream(uid, rollout.lane), entries[uid])
+        await record_result(redis, rollout, uid, DeviceResult.CANCELLED)
+    await _finish(redis, rollout)
+
+
+async def _finish(redis: Redis, rollout: Rollout) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.srem(ROLLOUT_ACTIVE_KEY, rollout.id)
+        for key in (rollout_key(rollout.id), results_key(rollout.id)):
+            pipe.expire(key, settings.rollout_retention)
+        pipe.delete(pending_key(rollout.id), inflight_key(rollout.id), remaining_key(rollout.id),
+                    entries_key(rollout.id), executions_key(rollout.id))
+        await pipe.execute()
+
+
+async def _claim(redis: Redis, rollout: Rollout, count: int, fence: Fence) -> List[str]:
+    return await fence.claim(
+        redis, _CLAIM_LUA,
+        keys=[pending_key(rollout.id), inflight_key(rollout.id)],
+        args=[count, time.time() + rollout.device_timeout],
+    )
+
+
+async def _requeue_undispatched(redis: Redis, rollout: Rollout, subscribers: List[str]) -> None:
+    """
+    Put the claimed devices a failed dispatch never registered back at the
+    head of the pending list. Should that fail too, they time out.
+    """
+    try:
+        registered = await redis.hmget(executions_key(rollout.id), subscribers)
+        missed = [uid for uid, execution_id in zip(subscribers, registered) if not execution_id]
+        if not missed:
+            return
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(inflight_key(rollout.id), *missed)
+            pipe.lpush(pending_key(rollout.id), *reversed(missed))
+            await pipe.execute()
+        logger.warning(f"Rollout {rollout.id}: {len(missed)} devices returned to pending after a failed dispatch")
+    except RedisError as e:
+        logger.error(f"Cannot return undispatched devices of rollout {rollout.id} to pending: {e}")
+
+
+async def advance_rollout(redis: Redis, rollout_id: str, fence: Fence) -> None:
+    rollout = await get_rollout(redis, rollout_id)
+    if rollout is None:
+        await redis.srem(ROLLOUT_ACTIVE_KEY, rollout_id)
+        return
+    if rollout.status == RolloutStatus.ABORTED:
+        await _cancel(redis, rollout)
+        logger.info(f"Rollout {rollout.id} aborted")
+        return
+
+    if await _expire_timed_out(redis, rollout):
+        rollout = await get_rollout(redis, rollout_id)
+    if rollout.status != RolloutStatus.RUNNING:
+        return
+
+    wave_left = rollout.wave_size - rollout.wave_dispatched
+    if wave_left <= 0:
+        if rollout.in_flight:
+            return
+        # the wave is done: gate the next one on the success rate so far
+        if await redis.llen(pending_key(rollout.id)):
+            rate = rollout.success_rate
+            if rate is not None and rate < rollout.success_threshold:
+                reason = f"success rate {rate:.1%} after wave {rollout.wave + 1} is below {rollout.success_threshold:.1%}"
+                await transition(redis, rollout.id, RolloutStatus.HALTED, [RolloutStatus.RUNNING], reason)
+                logger.warning(f"Rollout {rollout.id} halted: {reason}")
+                return
+            await redis.hset(rollout_key(rollout.id), mapping={"wave": rollout.wave + 1, "wave_dispatched": 0})
+            wave_left = rollout.wave_size
+
+    slots = min(rollout.max_concurrency - rollout.in_flight, wave_left)
+    subscribers = await _claim(redis, rollout, slots, fence) if slots > 0 else None
+    if subscribers:
+        try:
+            message = json.loads(await redis.hget(rollout_key(rollout.id), "message"))
+            await dispatch(redis, rollout, message, subscribers)
+        except RedisError:
+            await _requeue_undispatched(redis, rollout, subscribers)
+            raise
+    elif not rollout.in_flight and not await redis.llen(pending_key(rollout.id)):
+        await transition(redis, rollout.id, RolloutStatus.COMPLETED, [RolloutStatus.RUNNING])
+        await _finish(redis, rollout)
+        logger.info(f"Rollout {rollout.id} completed: {rollout.succeeded}/{rollout.total} succeeded")
+
+
+async def advance_rollouts(redis: Redis, fence: Fence) -> None:
+    """Periodic task: move every active rollout one step forward."""
+    for rollout_id in await redis.smembers(ROLLOUT_ACTIVE_KEY):
+        try:
+            await advance_rollout(redis, rollout_id, fence)
+        except (RedisError, RolloutError) as e:
+            logger.error("Failed to advance rollout %s: %s", rollout_id, e)
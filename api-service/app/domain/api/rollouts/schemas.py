@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from domain.api.websocket.constants import CommandLane
+
+
+class RolloutStatus(str, Enum):
+    RUNNING = "running"
+    PAUSED = "paused"
+    # stopped by a failed success-rate gate, resume to accept the wave
+    HALTED = "halted"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+
+class DeviceResult(str, Enum):
+    SUCCESS = "success"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    CANCELLED = "cancelled"
+
+
+class RolloutKind(str, Enum):
+    ROLLOUT = "rollout"
+    # single wave sent in the request, see domain.api.dispatch
+    DISPATCH = "dispatch"
+
+
+class RolloutTarget(BaseModel):
+    """
+    Devices to update. Role, location and status select from the UDPU
+    indexes and narrow each other when combined; an explicit subscriber
+    list is used as is, or narrows the selection. Status "online" selects
+    devices with a recent status report, "connected" the ones holding an
+    agent socket right now.
+    """
+    role: Optional[str] = None
+    location: Optional[str] = None
+    status: Optional[Literal["online", "connected"]] = None
+    subscribers: List[str] = []
+
+    @model_validator(mode="after")
+    def _not_empty(self) -> "RolloutTarget":
+        if not (self.role or self.location or self.status or self.subscribers):
+            raise ValueError("target needs a role, a location, a status or a list of subscribers")
+        return self
+
+
+class RolloutCreate(BaseModel):
+    """Rollout request. Unset limits fall back to the ROLLOUT_* settings."""
+
+    name: str = ""
+    job: Optional[str] = Field(None, description="Job name or uid")
+    queue: Optional[str] = Field(None, description="Queue name or uid")
+    target: RolloutTarget
+    wave_size: Optional[int] = Field(None, ge=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    success_threshold: Optional[float] = Field(None, ge=0, le=1)
+    device_timeout: Optional[int] = Field(None, ge=1, description="Seconds to wait for a device's job log")
+    lane: CommandLane = CommandLane.BULK
+
+    @model_validator(mode="after")
+    def _one_payload(self) -> "RolloutCreate":
+        if bool(self.job) == bool(self.queue):
+            raise ValueError("set exactly one of job and queue")
+        return self
+
+
+class Rollout(BaseModel):
+    id: str
+    kind: RolloutKind = RolloutKind.ROLLOUT
+    name: str = ""
+    action_type: str
+    payload_name: str
+    # rollouts stored before lanes existed wrote to the normal stream
+    lane: CommandLane = CommandLane.NORMAL
+    # jobs whose logs decide a device's result
+    jobs: List[str]
+    status: RolloutStatus
+    reason: str = ""
+    wave: int = 0
+    wave_size: int
+    wave_dispatched: int = 0
+    max_concurrency: int
+    success_threshold: float
+    device_timeout: int
+    total: int = 0
+    dispatched: int = 0
+    in_flight: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    cancelled: int = 0
+    created_at: float
+    updated_at: float
+
+    model_config = {
+        "extra": "ignore",
+    }
+
+    @property
+    def resolved(self) -> int:
+        return self.succeeded + self.failed + self.timed_out
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        return self.succeeded / self.resolved if self.resolved else None
+
+    @classmethod
+    def from_hash(cls, data: dict) -> "Rollout":
+        return cls(**{**data, "jobs": data["jobs"].split(",")})
+
+    def to_hash(self) -> dict:
+        data = self.model_dump(exclude={"in_flight"})
+        data["jobs"] = ",".join(self.jobs)
+        data["status"] = self.status.value
+        data["kind"] = self.kind.value
+        data["lane"] = self.lane.value
+        return data
+
+
+class RolloutDevice(BaseModel):
+    subscriber_uid: str
+    result: DeviceResult
+    status_code: str = ""
+    at: float
+
+
+class RolloutDevicePage(BaseModel):
+    cursor: int
+    devices: List[RolloutDevice]
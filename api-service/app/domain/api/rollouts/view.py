@@ -0,0 +1,92 @@
+from http import HTTPStatus
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi_utils.cbv import cbv
+
+from services.redis.exceptions import RedisResponseError
+
+from .core import (
+    RolloutConflict,
+    RolloutError,
+    abort_rollout,
+    create_rollout,
+    get_rollout,
+    list_devices,
+    list_rollouts,
+    pause_rollout,
+    resume_rollout,
+)
+from .schemas import DeviceResult, Rollout, RolloutCreate, RolloutDevicePage
+
+router = APIRouter()
+
+
+@cbv(router)
+class RolloutsAPI:
+    """
+    Staged rollouts of a job or queue to many devices.
+    """
+
+    @router.post("/rollouts", response_model=Rollout, status_code=HTTPStatus.CREATED)
+    async def create(self, request: Request, rollout: RolloutCreate) -> Rollout:
+        redis = request.app.state.redis
+        try:
+            return await create_rollout(redis, rollout)
+        except RolloutError as e:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.message)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+
+    @router.get("/rollouts", response_model=List[Rollout])
+    async def list_all(self, request: Request, limit: int = Query(50, ge=1, le=500)) -> List[Rollout]:
+        return await list_rollouts(request.app.state.redis, limit)
+
+    @router.get("/rollouts/{rollout_id}", response_model=Rollout)
+    async def get(self, request: Request, rollout_id: str) -> Rollout:
+        rollout = await get_rollout(request.app.state.redis, rollout_id)
+        if rollout is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Rollout '{rollout_id}' not found")
+        return rollout
+
+    @router.get("/rollouts/{rollout_id}/devices", response_model=RolloutDevicePage)
+    async def devices(
+        self,
+        request: Request,
+        rollout_id: str,
+        result: Optional[DeviceResult] = None,
+        cursor: int = Query(0, ge=0, description="Cursor returned by the previous page, 0 to start"),
+        limit: int = Query(500, ge=1, le=5000),
+    ) -> RolloutDevicePage:
+        """
+        Per-device results, a page at a time. A returned cursor of 0 means
+        the scan is complete; pages may be short when filtering by result.
+        """
+        cursor, devices = await list_devices(request.app.state.redis, rollout_id, cursor, limit, result)
+        return RolloutDevicePage(cursor=cursor, devices=devices)
+
+    @router.post("/rollouts/{rollout_id}/pause", response_model=Rollout)
+    async def pause(self, request: Request, rollout_id: str) -> Rollout:
+        """Stop dispatching; devices already dispatched still report."""
+        return await self._transition(request, rollout_id, pause_rollout)
+
+    @router.post("/rollouts/{rollout_id}/resume", response_model=Rollout)
+    async def resume(self, request: Request, rollout_id: str) -> Rollout:
+        """Continue a paused rollout, or accept the wave of a halted one."""
+        return await self._transition(request, rollout_id, resume_rollout)
+
+    @router.post("/rollouts/{rollout_id}/abort", response_model=Rollout)
+    async def abort(self, request: Request, rollout_id: str) -> Rollout:
+        """Drop the remaining devices and withdraw commands not yet delivered."""
+        return await self._transition(request, rollout_id, abort_rollout)
+
+    @staticmethod
+    async def _transition(request: Request, rollout_id: str, change) -> Rollout:
+        redis = request.app.state.redis
+        try:
+            await change(redis, rollout_id)
+        except RolloutConflict as e:
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=e.message)
+        except RolloutError as e:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.message)
+        return await get_rollout(redis, rollout_id)
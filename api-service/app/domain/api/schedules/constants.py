@@ -0,0 +1,5 @@
+SCHEDULE_PREFIX = "SCHEDULE"
+# schedule ids by creation time
+SCHEDULE_INDEX_KEY = f"{SCHEDULE_PREFIX}:index"
+# active schedule id -> start of the next window to load into the timing wheel
+SCHEDULE_DUE_KEY = f"{SCHEDULE_PREFIX}:due"
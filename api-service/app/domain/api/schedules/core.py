@@ -0,0 +1,358 @@
+"""
+Server-side delayed and recurring jobs.
+
+Schedules live in Redis; a sorted set keeps, for every active schedule,
+the start of the next window of ``SCHEDULE_WHEEL_SLOTS`` ticks still to be
+planned. The cluster leader loads each due window into an in-memory
+hashed timing wheel: every device of the target gets one send per period,
+at an offset within ``spread`` derived from the schedule and device ids,
+so a fleet on the same schedule no longer fires on the same minute. Sends
+leave the wheel as their tick passes and are written to the device streams
+at no more than ``SCHEDULE_MAX_DISPATCH_RATE`` entries a second.
+
+Delivery is at most once: a window is claimed when it is loaded, so sends
+still in the wheel of a leader that dies are dropped rather than repeated
+by its successor. Claims are fenced by the lease token and a window's
+sends enter the wheel only once its claim went through, so a deposed
+leader still mid-tick cannot plan a window its successor also plans. Windows due while no leader ran are skipped for
+recurring schedules and caught up for one-off ones.
+"""
+import bisect
+import hashlib
+import math
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from domain.api.executions.core import track_execution
+from domain.api.jobs.schemas import JobFrequency
+from domain.api.rollouts.core import RolloutError, resolve_payload, resolve_targets
+from domain.api.websocket.constants import CommandLane
+from domain.api.websocket.messages import queue_command
+from services.leader import Fence
+from services.logging.logger import log as logger
+from services.metrics import SCHEDULE_BACKLOG, SCHEDULE_SENDS
+from services.redis.exceptions import RedisResponseError
+
+from .constants import SCHEDULE_DUE_KEY, SCHEDULE_INDEX_KEY, SCHEDULE_PREFIX
+from .schemas import PERIODS, Schedule, ScheduleCreate, ScheduleStatus
+from .wheel import TimingWheel
+
+settings = get_app_settings()
+
+# Claims the window of schedule ARGV[1]: the next one starts at ARGV[2], or
+# the schedule leaves the due set when ARGV[2] is empty. ARGV[3:] are
+# field/value pairs to update on the schedule.
+_CLAIM_WINDOW_LUA = """
+if ARGV[2] == '' then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+else
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+end
+if #ARGV > 2 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+end
+return 1
+"""
+
+
+def schedule_key(schedule_id: str) -> str:
+    return f"{SCHEDULE_PREFIX}:{schedule_id}"
+
+
+def device_offset(schedule_id: str, subscriber_uid: str, spread: int) -> float:
+    """Fixed point of the spread at which *subscriber_uid* runs the schedule."""
+    digest = hashlib.blake2b(f"{schedule_id}:{subscriber_uid}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 * spread
+
+
+async def create_schedule(redis: Redis, request: ScheduleCreate) -> Schedule:
+    """
+    :raises RolloutError: unknown or locked job or queue.
+    :raises RedisResponseError: the schedule could not be stored.
+    """
+    action_type, payload_name, _, _ = await resolve_payload(redis, request)
+    now = time.time()
+    period = PERIODS[request.frequency] if request.frequency else 0
+    if request.start_at is not None:
+        start_at = request.start_at
+    else:
+        start_at = now + (request.delay or 0)
+    schedule = Schedule(
+        id=uuid.uuid4().hex,
+        name=request.name,
+        action_type=action_type,
+        job=payload_name if action_type == "job" else "",
+        queue=payload_name if action_type == "queue" else "",
+        target=request.target,
+        period=period,
+        start_at=start_at,
+        spread=request.spread if request.spread is not None else period,
+        lane=request.lane,
+        status=ScheduleStatus.ACTIVE,
+        next_window=start_at,
+        created_at=now,
+        updated_at=now,
+    )
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(schedule_key(schedule.id), mapping=schedule.to_hash())
+            pipe.zadd(SCHEDULE_INDEX_KEY, {schedule.id: now})
+            pipe.zadd(SCHEDULE_DUE_KEY, {schedule.id: start_at})
+            await pipe.execute()
+    except RedisError as e:
+        logger.error("Failed to create schedule %s: %s", schedule.id, e)
+        raise RedisResponseError(message=str(e))
+    logger.info(f"Schedule {schedule.id}: {action_type} {payload_name} every {period}s from {start_at:.0f}")
+    return schedule
+
+
+async def get_schedule(redis: Redis, schedule_id: str) -> Optional[Schedule]:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(schedule_key(schedule_id))
+        pipe.zscore(SCHEDULE_DUE_KEY, schedule_id)
+        data, next_window = await pipe.execute()
+    if not data:
+        return None
+    return Schedule.from_hash({**data, "next_window": next_window})
+
+
+async def list_schedules(redis: Redis, limit: int) -> List[Schedule]:
+    """Newest first."""
+    ids = await redis.zrevrange(SCHEDULE_INDEX_KEY, 0, limit - 1)
+    if not ids:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for schedule_id in ids:
+            pipe.hgetall(schedule_key(schedule_id))
+            pipe.zscore(SCHEDULE_DUE_KEY, schedule_id)
+        replies = await pipe.execute()
+    return [
+        Schedule.from_hash({**data, "next_window": next_window})
+        for data, next_window in zip(replies[::2], replies[1::2]) if data
+    ]
+
+
+async def delete_schedule(redis: Redis, schedule_id: str) -> bool:
+    """Remove a schedule; sends already in the wheel are dropped when due."""
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.delete(schedule_key(schedule_id))
+        pipe.zrem(SCHEDULE_INDEX_KEY, schedule_id)
+        pipe.zrem(SCHEDULE_DUE_KEY, schedule_id)
+        deleted, _, _ = await pipe.execute()
+    return bool(deleted)
+
+
+class _Send(NamedTuple):
+    schedule_id: str
+    subscriber_uid: str
+    # shared by all sends of a period
+    message: dict
+    lane: CommandLane
+
+
+@dataclass
+class _Plan:
+    """Devices of one period of a schedule, ordered by their offset."""
+    period_index: int
+    message: dict
+    offsets: List[float]
+    subscribers: List[str]
+
+
+class ScheduleRunner:
+    """
+    Timing wheel and send budget of the leader. Lives in every worker but
+    is only ticked by the one holding the cluster lease.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.wheel: Optional[TimingWheel] = None
+        self._plans: Dict[str, _Plan] = {}
+        # sends past their tick, waiting for the rate limit
+        self._ready: Deque[_Send] = deque()
+        self._tokens = 0.0
+        self._last_tick = 0.0
+        self._last_prune = 0.0
+
+    async def tick(self, fence: Fence) -> None:
+        """Periodic task: plan due windows and send what has come due."""
+        now = time.time()
+        if self.wheel is None or now - self._last_tick > settings.leader_lease_ttl:
+            self._reset(now)
+        rate = settings.schedule_max_dispatch_rate
+        self._tokens = min(self._tokens + (now - self._last_tick) * rate, rate)
+        self._last_tick = now
+        try:
+            await self._load_due(now, fence)
+            if now - self._last_prune >= self.wheel.span:
+                await self._prune_plans()
+                self._last_prune = now
+        except RedisError as e:
+            logger.error("Failed to load due schedules: %s", e)
+        self._ready.extend(self.wheel.advance(now))
+        await self._send_ready()
+        SCHEDULE_BACKLOG.set(len(self._ready))
+
+    def _reset(self, now: float) -> None:
+        # another worker led in between and claimed the windows since
+        dropped = len(self._ready) + (self.wheel.size if self.wheel else 0)
+        if dropped:
+            logger.warning(f"Scheduler regained leadership, dropping {dropped} stale sends")
+        self.wheel = TimingWheel(settings.schedule_tick_interval, settings.schedule_wheel_slots, now)
+        self._plans.clear()
+        self._ready.clear()
+        self._tokens = settings.schedule_max_dispatch_rate
+        self._last_tick = now
+
+    async def _load_due(self, now: float, fence: Fence) -> None:
+        span = self.wheel.span
+        for schedule_id, start in await self.redis.zrangebyscore(SCHEDULE_DUE_KEY, "-inf", now, withscores=True):
+            schedule = await get_schedule(self.redis, schedule_id)
+            if schedule is None or schedule.status != ScheduleStatus.ACTIVE:
+                await self.redis.zrem(SCHEDULE_DUE_KEY, schedule_id)
+                self._plans.pop(schedule_id, None)
+                continue
+
+            updates: Dict[str, object] = {}
+            end = start + span
+            if start < now - span:
+                if schedule.period:
+                    missed = await self._plan_window(schedule, start, now, updates)
+                    updates["skipped"] = schedule.skipped + missed
+                    logger.warning(f"Schedule {schedule_id}: skipped {missed} sends due since {start:.0f}")
+                    start = now
+                end = now + span
+
+            planned: List[Tuple[float, _Send]] = []
+            await self._plan_window(schedule, start, end, updates, planned)
+            completed = not schedule.period and end >= schedule.start_at + schedule.spread
+            if completed:
+                updates["status"] = ScheduleStatus.COMPLETED.value
+                # its sends in the wheel carry their own entry
+                self._plans.pop(schedule_id, None)
+            fields = [item for pair in {**updates, "updated_at": now}.items() for item in pair] if updates else []
+            await fence.claim(
+                self.redis, _CLAIM_WINDOW_LUA,
+                keys=[schedule_key(schedule_id), SCHEDULE_DUE_KEY],
+                args=[schedule_id, "" if completed else end, *fields],
+            )
+            for at, send in planned:
+                self.wheel.add(at, send)
+
+    def _periods(self, schedule: Schedule, start: float, end: float) -> range:
+        """Indexes of the periods with sends falling in [start, end)."""
+        if not schedule.period:
+            return range(1)
+        first = max(0, math.floor((start - schedule.start_at - schedule.spread) / schedule.period))
+        return range(first, math.floor((end - schedule.start_at) / schedule.period) + 1)
+
+    async def _plan_window(self, schedule: Schedule, start: float, end: float, updates: dict,
+                           planned: Optional[List[Tuple[float, _Send]]] = None) -> int:
+        """
+        Add the sends of [start, end) to *planned*, using the devices of the
+        period the window starts in; only count them without *planned*.
+
+        :return: number of sends in the window.
+        """
+        index = math.floor((start - schedule.start_at) / schedule.period) if schedule.period else 0
+        plan = await self._plan(schedule, max(index, 0), updates)
+        if plan is None:
+            return 0
+        count = 0
+        for index in self._periods(schedule, start, end):
+            base = schedule.start_at + index * schedule.period
+            low = bisect.bisect_left(plan.offsets, start - base)
+            high = bisect.bisect_left(plan.offsets, end - base)
+            count += high - low
+            if planned is None:
+                continue
+            for offset, uid in zip(plan.offsets[low:high], plan.subscribers[low:high]):
+                planned.append((base + offset, _Send(schedule.id, uid, plan.message, schedule.lane)))
+        return count
+
+    async def _plan(self, schedule: Schedule, period_index: int, updates: dict) -> Optional[_Plan]:
+        """
+        Devices and stream entry of a period, resolved once per period so
+        target and job changes apply from the next one.
+        """
+        plan = self._plans.get(schedule.id)
+        if plan is not None and plan.period_index == period_index:
+            return plan
+        try:
+            action_type, _, message, _ = await resolve_payload(self.redis, schedule)
+        except RolloutError as e:
+            updates["last_error"] = e.message
+            logger.warning(f"Schedule {schedule.id}: {e.message}, skipping its period")
+            return None
+        if action_type == "job":
+            # the agent would start its own cron for a periodic frequency
+            message = {**message, "frequency": JobFrequency.ONCE.value}
+        devices = sorted(
+            (device_offset(schedule.id, uid, schedule.spread), uid)
+            for uid in await resolve_targets(self.redis, schedule.target)
+        )
+        plan = _Plan(
+            period_index=period_index,
+            message=message,
+            offsets=[offset for offset, _ in devices],
+            subscribers=[uid for _, uid in devices],
+        )
+        self._plans[schedule.id] = plan
+        if schedule.last_error:
+            updates["last_error"] = ""
+        return plan
+
+    async def _send_ready(self) -> None:
+        if settings.schedule_max_dispatch_rate > 0:
+            count = min(len(self._ready), int(self._tokens))
+            self._tokens -= count
+        else:
+            count = len(self._ready)
+        if not count:
+            return
+        batch = [self._ready.popleft() for _ in range(count)]
+        for start in range(0, count, settings.rollout_pipeline_chunk):
+            await self._send(batch[start:start + settings.rollout_pipeline_chunk])
+
+    async def _prune_plans(self) -> None:
+        """Forget the plans of schedules deleted or completed since."""
+        schedule_ids = list(self._plans)
+        if not schedule_ids:
+            return
+        for schedule_id, score in zip(schedule_ids, await self.redis.zmscore(SCHEDULE_DUE_KEY, schedule_ids)):
+            if score is None:
+                self._plans.pop(schedule_id, None)
+
+    async def _send(self, sends: List[_Send]) -> None:
+        schedule_ids = list(dict.fromkeys(send.schedule_id for send in sends))
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for schedule_id in schedule_ids:
+                    pipe.exists(schedule_key(schedule_id))
+                # deleted since their window was planned
+                deleted = {schedule_id for schedule_id, found in zip(schedule_ids, await pipe.execute()) if not found}
+
+            sent: Dict[str, int] = {}
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for send in sends:
+                    if send.schedule_id in deleted:
+                        continue
+                    entry = track_execution(pipe, send.subscriber_uid, send.message)
+                    queue_command(pipe, send.subscriber_uid, entry, send.lane)
+                    sent[send.schedule_id] = sent.get(send.schedule_id, 0) + 1
+                for schedule_id, count in sent.items():
+                    pipe.hincrby(schedule_key(schedule_id), "dispatched", count)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error("Failed to send %d scheduled commands: %s", len(sends), e)
+            SCHEDULE_SENDS.labels("failed").inc(len(sends))
+            return
+        SCHEDULE_SENDS.labels("sent").inc(sum(sent.values()))
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from domain.api.jobs.schemas import JobFrequency
+from domain.api.rollouts.schemas import RolloutTarget
+from domain.api.websocket.constants import CommandLane
+
+# periods a schedule can repeat at, in seconds
+PERIODS = {
+    JobFrequency.MIN_1: 60,
+    JobFrequency.MIN_15: 15 * 60,
+    JobFrequency.HOUR_1: 3600,
+    JobFrequency.HOUR_24: 24 * 3600,
+}
+
+
+class ScheduleStatus(str, Enum):
+    ACTIVE = "active"
+    # a one-off schedule whose last window has been loaded
+    COMPLETED = "completed"
+
+
+class ScheduleCreate(BaseModel):
+    """
+    Recurring schedule when ``frequency`` is set, a single delayed run
+    otherwise. Each device runs at a fixed point of the period derived
+    from its uid, so the target is spread over ``spread`` seconds.
+    """
+
+    name: str = ""
+    job: Optional[str] = Field(None, description="Job name or uid")
+    queue: Optional[str] = Field(None, description="Queue name or uid")
+    target: RolloutTarget
+    frequency: Optional[JobFrequency] = Field(None, description='"1", "15", "60" or "1440" minutes; unset to run once')
+    start_at: Optional[float] = Field(None, description="Unix time the first period starts, now by default")
+    delay: Optional[int] = Field(None, ge=0, description="Seconds from now to the first period")
+    spread: Optional[int] = Field(
+        None, ge=0, description="Seconds the devices are spread over; the whole period by default, 0 for one-off runs",
+    )
+    lane: CommandLane = CommandLane.BULK
+
+    @model_validator(mode="after")
+    def _check(self) -> "ScheduleCreate":
+        if bool(self.job) == bool(self.queue):
+            raise ValueError("set exactly one of job and queue")
+        if self.frequency is not None and self.frequency not in PERIODS:
+            raise ValueError(f"frequency must be one of {', '.join(f.value for f in PERIODS)}")
+        if self.start_at is not None and self.delay is not None:
+            raise ValueError("set at most one of start_at and delay")
+        if self.frequency is not None and self.spread is not None and self.spread > PERIODS[self.frequency]:
+            raise ValueError("spread cannot be longer than the period")
+        return self
+
+
+class Schedule(BaseModel):
+    id: str
+    name: str = ""
+    action_type: str
+    # name of the job or queue, looked up again every period
+    job: str = ""
+    queue: str = ""
+    target: RolloutTarget
+    # seconds between runs, 0 for a one-off schedule
+    period: int
+    start_at: float
+    spread: int
+    lane: CommandLane
+    status: ScheduleStatus
+    # start of the next window the scheduler will load, None once completed
+    next_window: Optional[float] = None
+    dispatched: int = 0
+    # sends that fell due while no scheduler was running
+    skipped: int = 0
+    last_error: str = ""
+    created_at: float
+    updated_at: float
+
+    model_config = {
+        "extra": "ignore",
+    }
+
+    @property
+    def payload_name(self) -> str:
+        return self.job or self.queue
+
+    @classmethod
+    def from_hash(cls, data: dict) -> "Schedule":
+        return cls(**{**data, "target": json.loads(data["target"])})
+
+    def to_hash(self) -> dict:
+        data = self.model_dump(exclude={"next_window"})
+        data["target"] = self.target.model_dump_json()
+        data["status"] = self.status.value
+        data["lane"] = self.lane.value
+        return data
@@ -0,0 +1,47 @@
+from http import HTTPStatus
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi_utils.cbv import cbv
+
+from domain.api.rollouts.core import RolloutError
+from services.redis.exceptions import RedisResponseError
+
+from .core import create_schedule, delete_schedule, get_schedule, list_schedules
+from .schemas import Schedule, ScheduleCreate
+
+router = APIRouter()
+
+
+@cbv(router)
+class SchedulesAPI:
+    """
+    Delayed and recurring jobs sent from the server.
+    """
+
+    @router.post("/schedules", response_model=Schedule, status_code=HTTPStatus.CREATED)
+    async def create(self, request: Request, body: ScheduleCreate) -> Schedule:
+        try:
+            return await create_schedule(request.app.state.redis, body)
+        except RolloutError as e:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.message)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+
+    @router.get("/schedules", response_model=List[Schedule])
+    async def list_all(self, request: Request, limit: int = Query(50, ge=1, le=500)) -> List[Schedule]:
+        return await list_schedules(request.app.state.redis, limit)
+
+    @router.get("/schedules/{schedule_id}", response_model=Schedule)
+    async def get(self, request: Request, schedule_id: str) -> Schedule:
+        schedule = await get_schedule(request.app.state.redis, schedule_id)
+        if schedule is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Schedule '{schedule_id}' not found")
+        return schedule
+
+    @router.delete("/schedules/{schedule_id}")
+    async def delete(self, request: Request, schedule_id: str):
+        """Stop the schedule; sends already planned for the current window are dropped."""
+        if not await delete_schedule(request.app.state.redis, schedule_id):
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Schedule '{schedule_id}' not found")
+        return {"message": f"Schedule '{schedule_id}' deleted successfully"}
@@ -0,0 +1,51 @@
+import math
+from typing import Any, List
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel: ``slots`` buckets of ``tick`` seconds each. An
+    entry more than one turn ahead sits in its bucket with the number of
+    turns left, so adding and expiring entries costs O(1) however far
+    ahead they are due.
+    """
+
+    def __init__(self, tick: float, slots: int, now: float):
+        self.tick = tick
+        self._buckets: List[list] = [[] for _ in range(slots)]
+        self._cursor = 0
+        # end of the bucket under the cursor
+        self._time = now
+        self._due: List[Any] = []
+        self.size = 0
+
+    @property
+    def span(self) -> float:
+        """Seconds covered by one turn of the wheel."""
+        return self.tick * len(self._buckets)
+
+    def add(self, at: float, item: Any) -> None:
+        self.size += 1
+        ticks = math.ceil((at - self._time) / self.tick)
+        if ticks <= 0:
+            self._due.append(item)
+            return
+        slots = len(self._buckets)
+        self._buckets[(self._cursor + ticks) % slots].append([(ticks - 1) // slots, item])
+
+    def advance(self, now: float) -> List[Any]:
+        """:return: the entries due by *now*, in bucket order."""
+        due, self._due = self._due, []
+        while self._time + self.tick <= now:
+            self._cursor = (self._cursor + 1) % len(self._buckets)
+            self._time += self.tick
+            waiting = []
+            for entry in self._buckets[self._cursor]:
+                if entry[0]:
+                    entry[0] -= 1
+                    waiting.append(entry)
+                else:
+                    due.append(entry[1])
+            self._buckets[self._cursor] = waiting
+        self.size -= len(due)
+        return due
@@ -0,0 +1,9 @@
+SYNC_PREFIX = "SYNC"
+
+SYNC_REVISION_KEY = f"{SYNC_PREFIX}:revision"
+SYNC_CHANGES_KEY = f"{SYNC_PREFIX}:changes"
+SYNC_OPS_KEY = f"{SYNC_PREFIX}:ops"
+SYNC_FLOOR_KEY = f"{SYNC_PREFIX}:floor"
+SYNC_TYPE_REVISIONS_KEY = f"{SYNC_PREFIX}:type_revisions"
+
+SYNC_MEMBER_SEPARATOR = "|"
@@ -0,0 +1,147 @@
+from typing import Dict, Iterable, List, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from config import get_app_settings
+from services.logging.logger import log as logger
+from services.redis.exceptions import RedisResponseError
+from services.singleflight import singleflight
+
+from .constants import (
+    SYNC_CHANGES_KEY,
+    SYNC_FLOOR_KEY,
+    SYNC_MEMBER_SEPARATOR,
+    SYNC_OPS_KEY,
+    SYNC_REVISION_KEY,
+    SYNC_TYPE_REVISIONS_KEY,
+)
+from .schemas import ChangeOp, SyncEntity
+
+settings = get_app_settings()
+
+# Bumps the global revision, stores the latest op per entity (the member is
+# "<type>|<id>", so repeated changes to one entity compact into one entry) and
+# trims the log to its bound. The highest trimmed revision becomes the floor:
+# clients whose `since` is below it have lost history and must resync.
+_RECORD_CHANGE_LUA = """
+local rev = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], rev, ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[5], ARGV[3], rev)
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local trimmed = redis.call('ZRANGE', KEYS[2], 0, excess - 1, 'WITHSCORES')
+    for i = 1, #trimmed, 2 do
+        redis.call('HDEL', KEYS[3], trimmed[i])
+    end
+    redis.call('SET', KEYS[4], trimmed[#trimmed])
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+end
+return rev
+"""
+
+_KEYS = [SYNC_REVISION_KEY, SYNC_CHANGES_KEY, SYNC_OPS_KEY, SYNC_FLOOR_KEY, SYNC_TYPE_REVISIONS_KEY]
+
+
+def _member(entity: SyncEntity, entity_id: str) -> str:
+    return f"{entity.value}{SYNC_MEMBER_SEPARATOR}{entity_id}"
+
+
+def _parse_member(member: str) -> Tuple[SyncEntity, str]:
+    entity, entity_id = member.split(SYNC_MEMBER_SEPARATOR, 1)
+    return SyncEntity(entity), entity_id
+
+
+async def record_changes(redis: Redis, changes: Iterable[Tuple[SyncEntity, str, ChangeOp]]) -> None:
+    """
+    Append changes to the log in a single pipeline.
+
+    Failures are logged and swallowed: the entity write has already happened,
+    and a lost log entry only costs the affected clients a later resync.
+    """
+    changes = [c for c in changes if c[1]]
+    if not changes:
+        return
+    # every logged write also ends read sharing for its entity type
+    for entity in {c[0] for c in changes}:
+        singleflight.forget(entity.value)
+    script = redis.register_script(_RECORD_CHANGE_LUA)
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for entity, entity_id, op in changes:
+            await script(
+                keys=_KEYS,
+                args=[_member(entity, entity_id), op.value, entity.value, settings.sync_changelog_maxlen],
+                client=pipe,
+            )
+        await pipe.execute()
+    except RedisError as e:
+        logger.error("Failed to record sync changes %s: %s", changes, e)
+
+
+async def record_change(redis: Redis, entity: SyncEntity, entity_id: str, op: ChangeOp = ChangeOp.UPSERT) -> None:
+    await record_changes(redis, [(entity, entity_id, op)])
+
+
+async def get_revisions(redis: Redis) -> Tuple[int, int, Dict[str, int]]:
+    """
+    Return the current revision, the trim floor and the per-type revisions.
+    """
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.get(SYNC_REVISION_KEY)
+        pipe.get(SYNC_FLOOR_KEY)
+        pipe.hgetall(SYNC_TYPE_REVISIONS_KEY)
+        revision, floor, type_revisions = await pipe.execute()
+    except RedisError as e:
+        logger.error(e)
+        raise RedisResponseError(message=str(e))
+    return (
+        int(revision or 0),
+        int(floor or 0),
+        {k: int(v) for k, v in (type_revisions or {}).items()},
+    )
+
+
+async def read_changes(
+    redis: Redis, since: int, limit: int
+) -> Tuple[List[Tuple[SyncEntity, str, ChangeOp, int]], bool]:
+    """
+    Read up to *limit* compacted changes with a revision greater than *since*.
+
+    :return: (changes ordered by revision, True if more changes remain).
+    """
+    try:
+        rows = await redis.zrangebyscore(
+            SYNC_CHANGES_KEY, f"({since}", "+inf", start=0, num=limit, withscores=True
+        )
+        members = [member for member, _ in rows]
+        ops = await redis.hmget(SYNC_OPS_KEY, members) if members else []
+    except RedisError as e:
+        logger.error(e)
+        raise RedisResponseError(message=str(e))
+
+    changes = []
+    for (member, score), op in zip(rows, ops):
+        try:
+            entity, entity_id = _parse_member(member)
+        except ValueError:
+            continue
+        changes.append((entity, entity_id, ChangeOp(op or ChangeOp.UPSERT.value), int(score)))
+    return changes, len(rows) == limit
+
+
+def is_too_far_behind(since: int, revision: int, floor: int) -> bool:
+    """A client must resync if it never synced, lost history or is ahead of the server."""
+    return since <= 0 or since < floor or since > revision
+
+
+def max_type_revision(type_revisions: Dict[str, int], types: Iterable[SyncEntity]) -> int:
+    """Latest revision that touched any of *types*; usable as a cache version."""
+    return max((type_revisions.get(t.value, 0) for t in types), default=0)
+
+
+def changed_since(type_revisions: Dict[str, int], types: Iterable[SyncEntity], since: int) -> bool:
+    return any(type_revisions.get(t.value, 0) > since for t in types)
+
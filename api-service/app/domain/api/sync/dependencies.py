@@ -0,0 +1,88 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from services.logging.logger import log as logger
+from services.redis.exceptions import RedisResponseError
+from domain.api.jobs.constants import JOB_PREFIX
+from domain.api.jobs.schemas import JobSchema
+from domain.api.jobs.queues.constants import QUEUE_PREFIX
+from domain.api.jobs.queues.schemas import JobQueueSchema
+from domain.api.northbound.constants import UDPU_ENTITY
+from domain.api.northbound.dependencies import decode_udpu_status, status_key
+from domain.api.roles.constants import ROLE_PREFIX
+from domain.api.roles.dependencies import decode_role
+from domain.api.vbce.constants import VBCE_ENTITY
+
+from .schemas import ChangeOp, SyncEntity
+
+
+def entity_key(entity: SyncEntity, entity_id: str) -> str:
+    if entity == SyncEntity.UDPU:
+        return f"{UDPU_ENTITY}:{entity_id}"
+    if entity == SyncEntity.STATUS:
+        return status_key(entity_id)
+    if entity == SyncEntity.VBCE:
+        return f"{VBCE_ENTITY}:{entity_id}"
+    if entity == SyncEntity.ROLE:
+        return f"{ROLE_PREFIX}:{entity_id}"
+    if entity == SyncEntity.JOB:
+        return f"{JOB_PREFIX}:{entity_id}:{JobSchema._generate_uid(entity_id)}"
+    if entity == SyncEntity.QUEUE:
+        return f"{QUEUE_PREFIX}:{entity_id}:{JobQueueSchema._generate_uid(entity_id)}"
+    raise ValueError(f"Unknown sync entity {entity!r}")
+
+
+def decode_entity(entity: SyncEntity, entity_id: str, data: dict) -> Optional[Any]:
+    """Shape a raw redis hash the same way the entity's list endpoint does."""
+    if not data:
+        return None
+    if entity == SyncEntity.ROLE:
+        return decode_role(data)
+    if entity == SyncEntity.STATUS:
+        status = decode_udpu_status(entity_id, data)
+        if status is None:
+            return None
+        return {
+            "subscriber_uid": status.subscriber_uid,
+            "state": status.state,
+            "status": status.status,
+            "created_at": status.created_at.isoformat(),
+        }
+    if entity == SyncEntity.JOB:
+        return JobSchema(**data).model_dump()
+    if entity == SyncEntity.QUEUE:
+        return JobQueueSchema(**data).model_dump()
+    return data
+
+
+async def load_entities(
+    redis: Redis, changes: Iterable[Tuple[SyncEntity, str, ChangeOp, int]]
+) -> Dict[Tuple[SyncEntity, str], Any]:
+    """
+    Fetch the current state of every upserted entity in one pipeline.
+
+    Entities that vanished after their upsert was logged map to ``None``;
+    their delete is already further along in the log.
+    """
+    wanted = [(entity, entity_id) for entity, entity_id, op, _ in changes if op == ChangeOp.UPSERT]
+    if not wanted:
+        return {}
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for entity, entity_id in wanted:
+            pipe.hgetall(entity_key(entity, entity_id))
+        rows = await pipe.execute()
+    except RedisError as e:
+        logger.error(e)
+        raise RedisResponseError(message=str(e))
+
+    result = {}
+    for (entity, entity_id), data in zip(wanted, rows):
+        try:
+            result[(entity, entity_id)] = decode_entity(entity, entity_id, data)
+        except Exception as e:
+            logger.warning("Cannot decode %s %s for sync: %s", entity.value, entity_id, e)
+            result[(entity, entity_id)] = None
+    return result
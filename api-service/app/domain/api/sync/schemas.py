@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import Any, List, Optional
+
+from pydantic import BaseModel
+
+
+class SyncEntity(str, Enum):
+    """Entity types tracked by the change log."""
+    UDPU = "udpu"
+    STATUS = "status"
+    VBCE = "vbce"
+    ROLE = "role"
+    JOB = "job"
+    QUEUE = "queue"
+
+    @classmethod
+    def parse_list(cls, value: Optional[str]) -> List["SyncEntity"]:
+        if not value:
+            return list(cls)
+        try:
+            return [cls(item.strip()) for item in value.split(",") if item.strip()]
+        except ValueError as exc:
+            raise ValueError(f"Unknown sync entity type in {value!r}") from exc
+
+
+class ChangeOp(str, Enum):
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
+class SyncChange(BaseModel):
+    type: SyncEntity
+    id: str
+    op: ChangeOp
+    revision: int
+    data: Optional[Any] = None
+
+
+class SyncResponse(BaseModel):
+    """
+    Delta sync page.
+
+    ``revision`` is the high-water mark the client passes as ``since`` on the
+    next call. When ``full_resync`` is set the client is too far behind the
+    bounded change log and must re-list the requested entity types; the
+    returned ``revision`` should be stored *before* re-listing.
+    """
+    revision: int
+    full_resync: bool = False
+    has_more: bool = False
+    changes: List[SyncChange] = []
@@ -0,0 +1,66 @@
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi_utils.cbv import cbv
+
+from config import get_app_settings
+from services.redis.exceptions import RedisResponseError
+
+from .core import changed_since, get_revisions, is_too_far_behind, read_changes
+from .dependencies import load_entities
+from .schemas import ChangeOp, SyncChange, SyncEntity, SyncResponse
+
+router = APIRouter()
+
+
+@cbv(router)
+class SyncAPI:
+    """
+    Delta sync over the global change log.
+    """
+    settings = get_app_settings()
+
+    @router.get("/sync", response_model=SyncResponse)
+    async def get(
+        self,
+        request: Request,
+        since: int = Query(0, ge=0, description="Last revision seen by the client"),
+        types: Optional[str] = Query(None, description="Comma-separated entity types, all by default"),
+        limit: Optional[int] = Query(None, ge=1),
+    ) -> SyncResponse:
+        """
+        Return entities created, updated or deleted after revision *since*.
+        """
+        redis = request.app.state.redis
+        try:
+            wanted = SyncEntity.parse_list(types)
+        except ValueError as e:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+        limit = min(limit or self.settings.sync_page_limit, self.settings.sync_page_limit)
+
+        try:
+            revision, floor, type_revisions = await get_revisions(redis)
+            if is_too_far_behind(since, revision, floor):
+                return SyncResponse(revision=revision, full_resync=True)
+            if not changed_since(type_revisions, wanted, since):
+                return SyncResponse(revision=revision)
+
+            changes, has_more = await read_changes(redis, since, limit)
+            selected = [c for c in changes if c[0] in wanted]
+            entities = await load_entities(redis, selected)
+        except RedisResponseError as e:
+            raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail=e.message)
+
+        result = []
+        for entity, entity_id, op, change_revision in selected:
+            data = entities.get((entity, entity_id))
+            if op == ChangeOp.UPSERT and data is None:
+                # deleted after the upsert was read from the log
+                op = ChangeOp.DELETE
+            result.append(SyncChange(type=entity, id=entity_id, op=op, revision=change_revision, data=data))
+
+        # The high-water mark covers every scanned entry, including ones
+        # filtered out by `types`, so the next page never rescans them.
+        high_water_mark = changes[-1][3] if has_more and changes else revision
+        return SyncResponse(revision=high_water_mark, has_more=has_more, changes=result)
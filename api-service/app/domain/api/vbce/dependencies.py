@@ -6,6 +6,9 @@ from redis.asyncio.client import Redis
 from redis.exceptions import ReadOnlyError, ResponseError
 
 from services.redis.exceptions import RedisResponseError
+from services.singleflight import coalesce
+from domain.api.sync.core import record_change
+from domain.api.sync.schemas import ChangeOp, SyncEntity
 
 from .constants import VBCE_ENTITY, VBCE_LOCATION_LIST
 from .schemas import Vbce
@@ -19,6 +22,7 @@ async def update_vbce_location_list(redis: Redis, location_id: str):
         raise RedisResponseError(message=str(e))
 
 
+@coalesce("vbce")
 async def get_vbce_location_list(redis: Redis):
     try:
         return await redis.smembers(VBCE_LOCATION_LIST)
@@ -27,6 +31,7 @@ async def get_vbce_location_list(redis: Redis):
         raise RedisResponseError(message=str(e))
 
 
+@coalesce("vbce")
 async def get_vbce(redis: Redis, key: str):
     try:
         return await redis.hgetall(key)
@@ -35,6 +40,7 @@ async def get_vbce(redis: Redis, key: str):
         raise RedisResponseError(message=str(e))
 
 
+@coalesce("vbce")
 async def get_vbce_list(redis: Redis):
     vbces = []
     try:
@@ -48,6 +54,7 @@ async def get_vbce_list(redis: Redis):
         raise RedisResponseError(message=str(e))
 
 
+@coalesce("vbce")
 async def get_vbce_by_location_id(redis: Redis, location_id: str):
     vbce_list = [vbce for vbce in await redis.keys(f"{VBCE_ENTITY}:*")
                  if "vbce_locations_list" not in vbce]
@@ -57,6 +64,7 @@ async def get_vbce_by_location_id(redis: Redis, location_id: str):
             return vbce
 
 
+@coalesce("vbce")
 async def find_empty_vbce(redis: Redis):
     vbce_list = [vbce for vbce in await redis.keys(f"{VBCE_ENTITY}:*")
                  if "vbce_locations_list" not in vbce]
@@ -73,6 +81,7 @@ async def create_vbce(redis: Redis, vbce: Vbce):
         await redis.hset(vbce.key, mapping=value)
         await redis.set(vbce.location_id, vbce.name)
         await update_vbce_location_list(redis, vbce.location_id)
+        await record_change(redis, SyncEntity.VBCE, vbce.name)
         return value
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
@@ -84,6 +93,7 @@ async def delete_vbce(redis: Redis, key: str):
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
+    await record_change(redis, SyncEntity.VBCE, key.split(":", 1)[-1], ChangeOp.DELETE)
 
 
 async def patch_vbce(redis: Redis, vbce: dict, vbce_to_update: dict):
@@ -101,6 +111,7 @@ async def patch_vbce(redis: Redis, vbce: dict, vbce_to_update: dict):
     vbce["available_users"] = int(vbce["max_users"]) - int(vbce["current_users"])
     try:
         await redis.hset(vbce_key, mapping=vbce)
+        await record_change(redis, SyncEntity.VBCE, vbce["name"])
         return vbce
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
@@ -127,6 +138,7 @@ async def update_vbce(redis: Redis, location_id: str, seed_idx: int):
             await redis.hset(vbce_to_update.key, mapping=vbce_to_update.dict())
             await redis.set(vbce_to_update.location_id, vbce_to_update.name)
             await update_vbce_location_list(redis, vbce_to_update.location_id)
+            await record_change(redis, SyncEntity.VBCE, vbce_to_update.name)
             return vbce_to_update
 
         else:
@@ -141,6 +153,7 @@ async def update_vbce(redis: Redis, location_id: str, seed_idx: int):
     else:
         vbce["seed_idx_used"] = f"{vbce['seed_idx_used']},{seed_idx}"
     await redis.hset(vbce_key, mapping=vbce)
+    await record_change(redis, SyncEntity.VBCE, vbce["name"])
     return vbce
 
 
@@ -157,5 +170,6 @@ async def calculate_vbce_rates(redis):
                 vbce["lq_max_rate"] = max(vbusers_current_rates)
                 vbce["lq_mean_rate"] = round(mean(vbusers_current_rates))
                 await redis.hset(f"{VBCE_ENTITY}:{vbce['name']}", mapping=vbce)
+                await record_change(redis, SyncEntity.VBCE, vbce["name"])
     except Exception as e:
         logger.error(str(e))
@@ -7,6 +7,8 @@ from services.redis.exceptions import RedisResponseError
 from domain.api.roles.dependencies import get_udpu_role, get_primary_ghn_interfaces
 from domain.api.vbce.dependencies import update_vbce, get_vbce
 from domain.api.vbce.constants import VBCE_ENTITY
+from domain.api.sync.core import record_change
+from domain.api.sync.schemas import SyncEntity
 from utils import get_random_seed_index
 
 from .constants import (SEED_INDEX_HIGH, SEED_INDEX_LOW, VBCE_LOCATION_LIST,
@@ -105,6 +107,8 @@ async def delete_vbuser(redis: Redis, vbu_uid: str, location_id: str, seed_idx:
             vbce["available_users"] = max_users - int(vbce["current_users"])
             await redis.hset(vbce_key, mapping=vbce)
         await redis.delete(f"{VBUSER_ENTITY}:{vbu_uid}")
+        if current_users >= 1:
+            await record_change(redis, SyncEntity.VBCE, vbce_name)
     except (ResponseError, ReadOnlyError) as e:
         logger.error(str(e))
         raise RedisResponseError(message=str(e))
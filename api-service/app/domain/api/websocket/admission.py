@@ -0,0 +1,85 @@
+"""
+Admission of agent sockets into this worker.
+
+After a restart the whole fleet reconnects within a few seconds, and every
+socket starts its XREAD loops at once. Admission meters new sockets with a
+token bucket (GCRA): up to WS_ACCEPT_BURST sockets are served at once,
+after that WS_ACCEPT_RATE per second. A socket whose token is due within
+WS_ACCEPT_MAX_WAIT waits for it; any later one is closed with 1013 and a
+``retry-after=<seconds>`` reason. Retry times are handed out one token
+interval apart, behind the sockets already waiting, so a fleet that was
+turned away comes back at the rate it can be served rather than all at
+once. A worker at its cap turns sockets away for WS_FULL_RETRY_AFTER
+seconds. The cap is WS_MAX_CONNECTIONS, lowered to
+REDIS_STREAM_MAX_CONNECTIONS since every socket holds a connection of that
+pool; this effective cap is what the node reports to discovery as its
+capacity.
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+
+from config import get_app_settings
+from services.metrics import WS_ACCEPT_WAIT, WS_ADMISSIONS, WS_CAPACITY
+
+settings = get_app_settings()
+
+
+class Admission:
+    def __init__(self, rate: float, burst: int, max_wait: float, max_connections: int):
+        self.interval = 1 / rate
+        # how far ahead of the current token a socket may be served
+        self.tolerance = (burst - 1) * self.interval
+        self.max_wait = max_wait
+        self.max_connections = max_connections
+        self.connections = 0
+        # theoretical arrival time of the next token, and of the next retry slot
+        self._tat = 0.0
+        self._retry_tat = 0.0
+        WS_CAPACITY.set(max_connections)
+
+    async def admit(self) -> Optional[float]:
+        """
+        Take a token for a new socket, waiting in the accept queue if it is
+        due soon. Admitted sockets must be `release`d.
+
+        :return: None once the socket may be served, otherwise the seconds
+            the client should wait before reconnecting.
+        """
+        if self.connections >= self.max_connections:
+            WS_ADMISSIONS.labels("full").inc()
+            return settings.ws_full_retry_after * random.uniform(1, 1.5)
+
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        delay = tat - now - self.tolerance
+        if delay > self.max_wait:
+            WS_ADMISSIONS.labels("rate_limited").inc()
+            self._retry_tat = max(self._retry_tat, tat) + self.interval
+            return min(self._retry_tat - now, settings.ws_max_retry_after)
+
+        self._tat = tat + self.interval
+        self.connections += 1
+        if delay > 0:
+            WS_ADMISSIONS.labels("queued").inc()
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.release()
+                raise
+        else:
+            WS_ADMISSIONS.labels("admitted").inc()
+        WS_ACCEPT_WAIT.observe(max(delay, 0.0))
+        return None
+
+    def release(self) -> None:
+        self.connections -= 1
+
+
+admission = Admission(
+    rate=settings.ws_accept_rate,
+    burst=settings.ws_accept_burst,
+    max_wait=settings.ws_accept_max_wait,
+    max_connections=min(settings.ws_max_connections, settings.redis_stream_max_connections),
+)
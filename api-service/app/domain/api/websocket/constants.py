@@ -1 +1,28 @@
+from enum import Enum
+
 WS_PATH = "/pubsub"
+# close code for a client that cannot keep up; it may reconnect later
+WS_TRY_AGAIN_LATER = 1013
+
+
+class CommandLane(str, Enum):
+    """Priority lanes of a device's commands, one stream each, drained in this order."""
+    URGENT = "urgent"
+    NORMAL = "normal"
+    BULK = "bulk"
+
+
+# entries taken from each lane per delivery round; a bulk backlog delays an
+# urgent command by at most one round
+LANE_WEIGHTS = {
+    CommandLane.URGENT: 100,
+    CommandLane.NORMAL: 8,
+    CommandLane.BULK: 2,
+}
+
+
+class OverflowPolicy(str, Enum):
+    """What a full outbound WebSocket queue does with one more frame, see websocket.outbox."""
+    SPILL = "spill"
+    DROP_OLDEST = "drop_oldest"
+    DISCONNECT = "disconnect"
@@ -0,0 +1,76 @@
+"""
+Command stream entries understood by the agent. The agent routes each
+entry on ``action_type`` (see process.ProcessAndRespondAsync in the Go client).
+"""
+import time
+
+from redis.asyncio.client import Redis
+
+from config import get_app_settings
+from domain.api.executions.core import track_execution
+from domain.api.jobs.queues.schemas import JobQueueSchema
+from domain.api.jobs.schemas import JobSchema
+
+from .constants import CommandLane
+
+settings = get_app_settings()
+
+
+def lane_stream(subscriber_uid: str, lane: CommandLane) -> str:
+    """Stream of one lane; the normal lane keeps the original per-device stream."""
+    if lane == CommandLane.NORMAL:
+        return subscriber_uid
+    return f"{subscriber_uid}:{lane.value}"
+
+
+def job_message(job: JobSchema) -> dict:
+    return {
+        "action_type": "job",
+        "command": job.command,
+        "frequency": job.frequency.value if job.frequency else "once",
+        "require_output": str(job.require_output).lower(),
+        "name": job.name,
+        "locked": str(job.locked).lower(),
+        "required_software": job.required_software,
+        "type": job.type,
+        "vbuser_id": job.vbuser_id,
+    }
+
+
+def queue_message(queue: JobQueueSchema) -> dict:
+    return {
+        "action_type": "queue",
+        "name": queue.name,
+        "jobs": queue.queue,
+        "locked": queue.locked,
+    }
+
+
+def queue_command(pipe, subscriber_uid: str, entry: dict, lane: CommandLane = CommandLane.NORMAL) -> int:
+    """
+    Queue the XADD of *entry* on *pipe*, trimming the lane to its
+    ``<lane>_LANE_MAXLEN`` entries and ``<lane>_LANE_MAX_AGE`` seconds.
+
+    :return: index of the XADD reply, which is the entry id.
+    """
+    stream = lane_stream(subscriber_uid, lane)
+    position = len(pipe)
+    pipe.xadd(stream, entry, maxlen=getattr(settings, f"{lane.value}_lane_maxlen"), approximate=True)
+    max_age = getattr(settings, f"{lane.value}_lane_max_age")
+    if max_age:
+        pipe.xtrim(stream, minid=f"{int((time.time() - max_age) * 1000)}-0", approximate=True)
+    return position
+
+
+async def publish_command(redis: Redis, subscriber_uid: str, message: dict,
+                          lane: CommandLane = CommandLane.NORMAL) -> str:
+    """
+    Write *message* to a lane of the device's commands as a tracked execution.
+
+    :return: the execution id.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        entry = track_execution(pipe, subscriber_uid, message)
+        queue_command(pipe, subscriber_uid, entry, lane)
+        await pipe.execute()
+    return entry["execution_id"]
@@ -0,0 +1,143 @@
+"""
+Outgoing side of a WebSocket connection.
+
+Readers put frames into a bounded per-connection queue and go back to
+Redis; a writer task sends them. A client on a slow link then only fills
+its own queue instead of stalling the loop that reads its streams. When
+the queue is full the connection's overflow policy applies:
+
+- ``spill``: the frame is refused and its stream entry stays in Redis, to be
+  read again once the queue has room. The reader waits without holding a
+  Redis connection.
+- ``drop_oldest``: the oldest queued frame is dropped to make room.
+- ``disconnect``: the connection is closed with 1013 (try again later); the
+  entries not sent stay in their streams for the next connection.
+
+A send that takes longer than WS_SEND_TIMEOUT also closes the connection.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, NamedTuple, Optional
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from config import get_app_settings
+from services.logging.logger import log as logger
+from services.metrics import WS_OUTBOX_FRAMES, WS_SEND_DURATION, WS_SLOW_CONSUMER
+
+from .constants import WS_TRY_AGAIN_LATER, OverflowPolicy
+
+settings = get_app_settings()
+
+Callback = Optional[Callable[[], Awaitable[None]]]
+
+
+class SlowConsumer(Exception):
+    """The client does not keep up with its frames."""
+
+
+class Frame(NamedTuple):
+    payload: Any
+    # sent with send_json, otherwise send_text
+    json: bool = True
+    # run once the frame is written, e.g. to delete its stream entry
+    on_sent: Callback = None
+    # run when drop_oldest discards the frame
+    on_dropped: Callback = None
+
+
+class Outbox:
+    def __init__(self, websocket: WebSocket, endpoint: str,
+                 size: Optional[int] = None, policy: Optional[OverflowPolicy] = None):
+        self.websocket = websocket
+        self.endpoint = endpoint
+        self.size = size or settings.ws_send_queue_size
+        self.policy = policy or OverflowPolicy(settings.ws_overflow_policy)
+        self._frames: Deque[Frame] = deque()
+        self._queued = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._overflowed = False
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    async def put(self, frame: Frame) -> bool:
+        """
+        Queue *frame* for sending.
+
+        :return: False if the queue is full and the frame was not taken; the
+            caller waits for `wait_for_room` before offering it again.
+        """
+        if len(self._frames) >= self.size:
+            WS_SLOW_CONSUMER.labels(self.endpoint, self.policy.value).inc()
+            if self.policy == OverflowPolicy.DROP_OLDEST:
+                dropped = self._frames.popleft()
+                WS_OUTBOX_FRAMES.labels(self.endpoint).dec()
+                if dropped.on_dropped is not None:
+                    await dropped.on_dropped()
+            else:
+                self._room.clear()
+                if self.policy == OverflowPolicy.DISCONNECT:
+                    self._overflowed = True
+                    self._queued.set()
+                return False
+        self._frames.append(frame)
+        WS_OUTBOX_FRAMES.labels(self.endpoint).inc()
+        self._queued.set()
+        return True
+
+    async def send(self, frame: Frame) -> None:
+        """Queue *frame*, waiting for room as long as the policy refuses it."""
+        while not await self.put(frame):
+            await self.wait_for_room()
+
+    async def wait_for_room(self) -> None:
+        await self._room.wait()
+
+    async def run(self) -> None:
+        """
+        Writer task: send queued frames in order.
+
+        :raises SlowConsumer: the queue overflowed under the disconnect
+            policy, or a send timed out.
+        """
+        try:
+            while True:
+                await self._queued.wait()
+                if self._overflowed:
+                    raise SlowConsumer(f"{self.size} frames queued")
+                if not self._frames:
+                    self._queued.clear()
+                    continue
+                frame = self._frames.popleft()
+                WS_OUTBOX_FRAMES.labels(self.endpoint).dec()
+                if len(self._frames) < self.size:
+                    self._room.set()
+                started = time.perf_counter()
+                send = self.websocket.send_json if frame.json else self.websocket.send_text
+                try:
+                    await asyncio.wait_for(send(frame.payload), settings.ws_send_timeout)
+                except asyncio.TimeoutError:
+                    WS_SLOW_CONSUMER.labels(self.endpoint, "timeout").inc()
+                    raise SlowConsumer(f"send took over {settings.ws_send_timeout}s")
+                WS_SEND_DURATION.labels(self.endpoint).observe(time.perf_counter() - started)
+                if frame.on_sent is not None:
+                    await frame.on_sent()
+        finally:
+            WS_OUTBOX_FRAMES.labels(self.endpoint).dec(len(self._frames))
+            self._frames.clear()
+
+    async def close(self, slow: bool = False) -> None:
+        """Close the connection; a stalled client gets WS_SEND_TIMEOUT to take the close frame."""
+        if self.websocket.application_state == WebSocketState.DISCONNECTED:
+            return
+        try:
+            await asyncio.wait_for(
+                self.websocket.close(code=WS_TRY_AGAIN_LATER if slow else 1000),
+                settings.ws_send_timeout,
+            )
+        except (asyncio.TimeoutError, RuntimeError) as e:
+            logger.warning(f"Cannot close {self.endpoint} websocket cleanly: {e!r}")
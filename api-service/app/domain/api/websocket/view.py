@@ -1,4 +1,6 @@
 import asyncio
+import json
+import math
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from redis.asyncio.client import Redis
 from starlette.websockets import WebSocketState
@@ -7,8 +9,16 @@ from domain.api.jobs.core import JobRepository
 from domain.api.jobs.schemas import JobSchema
 from domain.api.northbound.dependencies import get_udpu_status
 from domain.api.jobs.queues.core import QueueRepository
+from domain.api.jobs.queues.schemas import ExpandedQueue
+from domain.api.executions.core import append_output, mark_delivered
+from domain.api.presence.core import Connection, is_connected
 from services.logging.logger import log as logger
+from services.metrics import WS_CONNECTIONS, WS_DELIVERY_LAG, WS_MESSAGES, stream_entry_age
 from services.redis.exceptions import RedisResponseError
+from .admission import admission
+from .constants import LANE_WEIGHTS, WS_TRY_AGAIN_LATER, CommandLane
+from .messages import job_message, lane_stream, publish_command, queue_message
+from .outbox import Frame, Outbox, SlowConsumer
 
 
 ws_router = APIRouter()
@@ -21,6 +31,16 @@ def _normalize_map(m):
     """Return a dict with str keys and str values. Decode bytes where needed."""
     return {_to_str(k): _to_str(v) for k, v in m.items()}
 
+def _execution_frame(text):
+    """Return the agent frame if it reports on an execution, else None."""
+    try:
+        frame = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(frame, dict) and frame.get("execution_id"):
+        return frame
+    return None
+
 
 @ws_router.websocket("/pubsub")
 async def pubsub_endpoint(
@@ -30,34 +50,86 @@ async def pubsub_endpoint(
     """
     Agent-facing WebSocket.
 
-    - Reads entries from the client's personal stream and sends them to the WebSocket.
-    - Receives text from the WebSocket and writes it to the server:<client> stream.
+    - Reads entries from the client's command lanes and queues them for the WebSocket.
+    - Receives text from the WebSocket: output of an execution goes to the
+      execution's output stream, anything else to the server:<client> stream.
+
+    Sockets beyond the worker's admission rate or cap are closed with 1013
+    and a ``retry-after=<seconds>`` reason, see websocket.admission.
     """
-    await websocket.accept()
+    retry_after = await admission.admit()
+    if retry_after is not None:
+        await websocket.accept()
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason=f"retry-after={math.ceil(retry_after)}")
+        return
+    try:
+        await websocket.accept()
+    except Exception:
+        admission.release()
+        raise
+    WS_CONNECTIONS.labels("pubsub").inc()
     redis: Redis = websocket.app.state.redis
     client = channel
+    outbox = Outbox(websocket, "pubsub")
+    slow = False
+    presence = Connection(redis, client)
+    await presence.register()
+
+    def command_frame(stream: str, msg_id: str, data: dict) -> Frame:
+        async def sent() -> None:
+            WS_DELIVERY_LAG.labels("pubsub").observe(stream_entry_age(msg_id))
+            WS_MESSAGES.labels("pubsub", "out").inc()
+            if data.get("execution_id"):
+                try:
+                    await mark_delivered(redis, data["execution_id"])
+                except Exception as e:
+                    logger.error("Cannot mark execution %s delivered", data["execution_id"], exc_info=e)
+            await dropped()
+
+        async def dropped() -> None:
+            # Delete the processed entry from the lane.
+            try:
+                await redis.xdel(stream, msg_id)
+            except Exception as e:
+                logger.error("XDEL pubsub failed for %s", msg_id, exc_info=e)
 
-    # Personal stream where the server publishes commands for this client.
-    client_stream = client
+        return Frame(data, on_sent=sent, on_dropped=dropped)
 
     async def deliver() -> None:
-        """Read from the client's personal stream and send to the WebSocket. XREAD + XDEL."""
-        last_id = "0-0"
+        """
+        Queue the client's commands lane by lane. Each round reads up to
+        LANE_WEIGHTS[lane] entries of every lane, urgent first; entries are
+        deleted once sent. XREAD + XDEL. A full outbox ends the round, which
+        resumes at the first entry not taken once there is room.
+        """
+        streams = {lane: lane_stream(client, lane) for lane in CommandLane}
+        last_ids = {lane: "0-0" for lane in CommandLane}
+        # reads go through the lane pool, which has a connection for every admitted socket
+        lanes: Redis = websocket.app.state.redis_streams
         while True:
             try:
-                resp = await redis.xread(streams={client_stream: last_id}, count=1, block=1000)
-                if not resp:
+                async with lanes.pipeline(transaction=False) as pipe:
+                    for lane in CommandLane:
+                        pipe.xread(streams={streams[lane]: last_ids[lane]}, count=LANE_WEIGHTS[lane])
+                    replies = await pipe.execute()
+                if not any(replies):
+                    # Wait for an entry on any lane, then read them in priority order.
+                    await lanes.xread(
+                        streams={streams[lane]: last_ids[lane] for lane in CommandLane}, count=1, block=1000,
+                    )
                     continue
-                _, messages = resp[0]
-                for msg_id, raw in messages:
-                    data = _normalize_map(raw)
-                    await websocket.send_json(data)
-                    # Delete the processed entry from the client's stream.
-                    try:
-                        await redis.xdel(client_stream, msg_id)
-                    except Exception as e:
-                        logger.error("XDEL pubsub failed for %s", msg_id, exc_info=e)
-                    last_id = msg_id
+                full = False
+                for lane, resp in zip(CommandLane, replies):
+                    if not resp or full:
+                        continue
+                    _, messages = resp[0]
+                    for msg_id, raw in messages:
+                        if not await outbox.put(command_frame(streams[lane], msg_id, _normalize_map(raw))):
+                            full = True
+                            break
+                        last_ids[lane] = msg_id
+                if full:
+                    await outbox.wait_for_room()
             except (asyncio.CancelledError, WebSocketDisconnect):
                 break
             except Exception as e:
@@ -65,11 +137,16 @@ async def pubsub_endpoint(
                 await asyncio.sleep(1)
 
     async def receive() -> None:
-        """Receive text from the WebSocket and write it to the server:<client> stream."""
+        """Receive text from the WebSocket and write it to the execution's output or the server:<client> stream."""
         server_stream = f"server:{client}"
         while True:
             try:
                 text = await websocket.receive_text()
+                frame = _execution_frame(text)
+                if frame is not None:
+                    await append_output(redis, frame)
+                    WS_MESSAGES.labels("pubsub", "in").inc()
+                    continue
                 # Normalize newlines and collapse whitespace.
                 text = text.replace("\r", " ").replace("\n", " ")
                 text = " ".join(text.split())
@@ -80,6 +157,7 @@ async def pubsub_endpoint(
                     maxlen=1,
                     approximate=False,
                 )
+                WS_MESSAGES.labels("pubsub", "in").inc()
             except (asyncio.CancelledError, WebSocketDisconnect):
                 break
             except Exception as e:
@@ -87,16 +165,30 @@ async def pubsub_endpoint(
                 break
 
     try:
-        # Run producer and consumer concurrently for this WebSocket connection.
+        # Run reader, writer and consumer concurrently for this WebSocket connection.
         async with asyncio.TaskGroup() as tg:
-            tg.create_task(deliver(), name=f"deliver:{client}")
-            tg.create_task(receive(), name=f"receive:{client}")
+            background = [
+                tg.create_task(outbox.run(), name=f"send:{client}"),
+                tg.create_task(deliver(), name=f"deliver:{client}"),
+                tg.create_task(presence.keep_alive(), name=f"presence:{client}"),
+            ]
+            await receive()
+            # the client is gone: stop reading its lanes and refreshing its presence
+            for task in background:
+                task.cancel()
+    except* SlowConsumer as eg:
+        slow = True
+        logger.warning(f"Closing pubsub websocket of slow client {client}: {eg.exceptions[0]}")
+    except* WebSocketDisconnect:
+        pass
     except* Exception as eg:
         for e in eg.exceptions:
             logger.error("Websocket task failed", exc_info=e)
     finally:
-        if websocket.application_state != WebSocketState.DISCONNECTED:
-            await websocket.close()
+        WS_CONNECTIONS.labels("pubsub").dec()
+        admission.release()
+        await presence.unregister()
+        await outbox.close(slow)
 
 
 @ws_router.websocket("/pub")
@@ -108,11 +200,14 @@ async def pub_endpoint(
     UI-facing WebSocket.
 
     - Receives commands from the UI and publishes tasks to the client's personal stream.
-    - Subscribes to server:<client>, sends incoming messages to the UI, then deletes them.
+    - Subscribes to server:<client>, queues incoming messages for the UI and deletes them once sent.
     """
     await websocket.accept()
+    WS_CONNECTIONS.labels("pub").inc()
     redis: Redis = websocket.app.state.redis
     client = channel
+    outbox = Outbox(websocket, "pub")
+    slow = False
 
     # Personal incoming stream from this client to the server.
     server_stream = f"server:{client}"
@@ -120,44 +215,47 @@ async def pub_endpoint(
     queue_repo = QueueRepository(redis)
     shutdown_event = asyncio.Event()
 
+    async def command(message: dict, lane: CommandLane) -> None:
+        """Publish to the client's lane; tell the UI when the agent is not there to take it."""
+        await publish_command(redis, client, message, lane)
+        if not await is_connected(redis, client):
+            await outbox.send(Frame(f"{client} is not connected, the command is queued until it reconnects", json=False))
+
     async def publisher() -> None:
         """Read commands from the WebSocket and push tasks into the client's personal stream."""
-        stream = client
         while True:
             try:
                 cmd = await websocket.receive_text()
+                WS_MESSAGES.labels("pub", "in").inc()
+
+                # "urgent run job <id>" skips the queued normal and bulk commands
+                lane = CommandLane.NORMAL
+                if cmd.startswith("urgent "):
+                    lane = CommandLane.URGENT
+                    cmd = cmd[len("urgent "):].lstrip()
 
                 if cmd.startswith("run queue"):
                     _, qid = cmd.split("run queue", 1)
                     qid = qid.strip()
                     try:
-                        queue = await queue_repo.get(qid)
+                        expanded = await queue_repo.get_expanded(qid)
                     except RedisResponseError as e:
                         logger.error("Failed to fetch queue %s: %s", qid, e)
-                        await websocket.send_text(f"Error fetching queue: {qid}")
+                        await outbox.send(Frame(f"Error fetching queue: {qid}", json=False))
                         continue
-                    if queue:
-                        await redis.xadd(
-                            stream,
-                            {
-                                "action_type": "queue",
-                                "name": queue.name,
-                                "jobs": queue.queue,
-                                "locked": queue.locked,
-                            },
-                            maxlen=10000,
-                            approximate=True,
-                        )
+                    if expanded:
+                        queue = ExpandedQueue.model_validate_json(expanded["body"]).queue
+                        await command(queue_message(queue), lane)
                     else:
-                        await websocket.send_text(f"No such queue: {qid}")
+                        await outbox.send(Frame(f"No such queue: {qid}", json=False))
 
                 elif cmd.startswith("run job"):
                     if "status" in cmd:
                         obj = await get_udpu_status(redis, client)
                         if obj:
-                            await websocket.send_json({"state": obj.state, "status": obj.status})
+                            await outbox.send(Frame({"state": obj.state, "status": obj.status}))
                         else:
-                            await websocket.send_text(f"Error fetching udpu status: {client}")
+                            await outbox.send(Frame(f"Error fetching udpu status: {client}", json=False))
                         continue
 
                     _, jid = cmd.split("run job", 1)
@@ -166,29 +264,14 @@ async def pub_endpoint(
                         job: JobSchema = await job_repo.get(jid)
                     except RedisResponseError as e:
                         logger.error("Failed to fetch job %s: %s", jid, e)
-                        await websocket.send_text(f"Error fetching job: {jid}")
+                        await outbox.send(Frame(f"Error fetching job: {jid}", json=False))
                         continue
 
                     if not job:
-                        await websocket.send_text(f"No such job: {jid}")
+                        await outbox.send(Frame(f"No such job: {jid}", json=False))
                         continue
 
-                    await redis.xadd(
-                        stream,
-                        {
-                            "action_type": "job",
-                            "command": job.command,
-                            "frequency": job.frequency.value if job.frequency else "once",
-                            "require_output": str(job.require_output).lower(),
-                            "name": job.name,
-                            "locked": str(job.locked).lower(),
-                            "required_software": job.required_software,
-                            "type": job.type,
-                            "vbuser_id": job.vbuser_id,
-                        },
-                        maxlen=10000,
-                        approximate=True,
-                    )
+                    await command(job_message(job), lane)
 
             except (asyncio.CancelledError, WebSocketDisconnect):
                 shutdown_event.set()
@@ -199,8 +282,22 @@ async def pub_endpoint(
                 break
         shutdown_event.set()
 
+    def reply_frame(msg_id: str, text: str) -> Frame:
+        async def sent() -> None:
+            WS_DELIVERY_LAG.labels("pub").observe(stream_entry_age(msg_id))
+            WS_MESSAGES.labels("pub", "out").inc()
+            await dropped()
+
+        async def dropped() -> None:
+            try:
+                await redis.xdel(server_stream, msg_id)
+            except Exception as e:
+                logger.error("XDEL server failed for %s", msg_id, exc_info=e)
+
+        return Frame(text, json=False, on_sent=sent, on_dropped=dropped)
+
     async def subscriber() -> None:
-        """Read one message from server:<client>, send it to the WebSocket, then delete it."""
+        """Read one message from server:<client> and queue it for the WebSocket; it is deleted once sent."""
         last_id = "0-0"
         while True:
             if shutdown_event.is_set():
@@ -219,11 +316,15 @@ async def pub_endpoint(
                     if text is not None:
                         if shutdown_event.is_set() or websocket.application_state != WebSocketState.CONNECTED or websocket.client_state != WebSocketState.CONNECTED:
                             break
-                        await websocket.send_text(text)
-                    try:
-                        await redis.xdel(server_stream, msg_id)
-                    except Exception as e:
-                        logger.error("XDEL server failed for %s", msg_id, exc_info=e)
+                        if not await outbox.put(reply_frame(msg_id, text)):
+                            # read it again once the UI has caught up
+                            await outbox.wait_for_room()
+                            break
+                    else:
+                        try:
+                            await redis.xdel(server_stream, msg_id)
+                        except Exception as e:
+                            logger.error("XDEL server failed for %s", msg_id, exc_info=e)
                     last_id = msg_id
 
             except (asyncio.CancelledError, WebSocketDisconnect):
@@ -238,13 +339,21 @@ async def pub_endpoint(
                 await asyncio.sleep(0.5)
 
     try:
-        # Run command publisher and server subscriber concurrently.
+        # Run command publisher, server subscriber and writer concurrently.
         async with asyncio.TaskGroup() as tg:
+            sender = tg.create_task(outbox.run(), name=f"send:{client}")
             tg.create_task(publisher(), name=f"pub:{client}")
             tg.create_task(subscriber(), name=f"sub:{client}")
+            await shutdown_event.wait()
+            sender.cancel()
+    except* SlowConsumer as eg:
+        slow = True
+        logger.warning(f"Closing pub websocket of slow client {client}: {eg.exceptions[0]}")
+    except* WebSocketDisconnect:
+        pass
     except* Exception as eg:
         for e in eg.exceptions:
             logger.error("Websocket task failed", exc_info=e)
     finally:
-        if websocket.application_state != WebSocketState.DISCONNECTED:
-            await websocket.close()
+        WS_CONNECTIONS.labels("pub").dec()
+        await outbox.close(slow)
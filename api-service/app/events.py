@@ -1,15 +1,74 @@
+import asyncio
 from typing import Callable
 
 from fastapi import FastAPI
 from services.logging.logger import log as logger
 
-from services.discovery.register import register_service
+from services.discovery.register import DiscoveryRegistrar
+from services.metrics import monitor_runtime
 from services.redis import close_redis_connection, connect_to_redis
-from services.scheduler import shutdown_scheduler, start_scheduler, vbce_scheduler
+from services.scheduler import (
+    PeriodicTask,
+    PeriodicTaskRegistry,
+    node_scope,
+    shutdown_scheduler,
+    start_scheduler,
+)
 from settings.base import BaseAppSettings
+from domain.api.jobs.core import build_job_role_index
+from domain.api.jobs.queues.expansion import build_queue_role_index
+from domain.api.northbound.dependencies import build_role_index
+from domain.api.rollouts.core import advance_rollouts
+from domain.api.queue_runs.core import advance_queue_runs
+from domain.api.schedules.core import ScheduleRunner
 from domain.api.vbce.dependencies import calculate_vbce_rates
 
 
+def build_periodic_tasks(app: FastAPI, settings: BaseAppSettings) -> PeriodicTaskRegistry:
+    """
+    Platform periodic tasks. Each runs in one worker of its scope: service
+    registration once per node, rollouts, schedules, queue runs and VBCE
+    rates once per cluster.
+    """
+    registry = PeriodicTaskRegistry()
+    registry.register(PeriodicTask(
+        name="register_service",
+        func=app.state.registrar.register,
+        interval=settings.register_service_interval,
+        jitter=settings.register_service_interval / 10,
+        scope=node_scope(settings.server_host, settings.server_port),
+    ))
+    registry.register(PeriodicTask(
+        name="advance_rollouts",
+        func=advance_rollouts,
+        interval=settings.rollout_tick_interval,
+        args=(app.state.redis,),
+        fenced=True,
+    ))
+    registry.register(PeriodicTask(
+        name="run_schedules",
+        func=app.state.schedule_runner.tick,
+        interval=settings.schedule_tick_interval,
+        fenced=True,
+    ))
+    registry.register(PeriodicTask(
+        name="advance_queue_runs",
+        func=advance_queue_runs,
+        interval=settings.queue_run_tick_interval,
+        args=(app.state.redis,),
+        fenced=True,
+    ))
+    if settings.vbce_rates_enabled:
+        registry.register(PeriodicTask(
+            name="calculate_vbce_rates",
+            func=calculate_vbce_rates,
+            interval=settings.vbce_rates_interval,
+            jitter=settings.vbce_rates_interval / 10,
+            args=(app.state.redis,),
+        ))
+    return registry
+
+
 def create_start_app_handler(app: FastAPI, settings: BaseAppSettings) -> Callable:
     """
     Create a startup event handler for the FastAPI application.
@@ -25,9 +84,23 @@ def create_start_app_handler(app: FastAPI, settings: BaseAppSettings) -> Callabl
     async def start_app() -> None:
         # Connect to Redis and store the connection in app.state
         await connect_to_redis(app, settings)
-        # Start scheduler tasks for service registration and VBCE rate calculation
-        #vbce_scheduler(app, func=calculate_vbce_rates, args=[app.state.redis])
-        start_scheduler(app, func=register_service, args=[settings])
+        # Sample event-loop lag and Redis pool usage for /metrics
+        app.state.runtime_monitor = asyncio.create_task(monitor_runtime(app.state.redis))
+        app.state.registrar = DiscoveryRegistrar(settings)
+        app.state.schedule_runner = ScheduleRunner(app.state.redis)
+        # Rollouts target devices by role; index the ones created before it existed
+        indexed = await build_role_index(app.state.redis)
+        if indexed:
+            logger.info(f"Indexed {indexed} UDPUs by role")
+        # Agent bundles read a role's jobs and queues through their role indexes
+        indexed = await build_job_role_index(app.state.redis)
+        if indexed:
+            logger.info(f"Indexed {indexed} jobs by role")
+        indexed = await build_queue_role_index(app.state.redis)
+        if indexed:
+            logger.info(f"Indexed {indexed} queues by role")
+        # Start leader-elected periodic tasks (service registration, VBCE rates)
+        start_scheduler(app, app.state.redis, build_periodic_tasks(app, settings), settings.leader_lease_ttl)
 
     return start_app
 
@@ -44,9 +117,11 @@ def create_stop_app_handler(app: FastAPI) -> Callable:
 
     @logger.catch
     async def stop_app() -> None:
+        app.state.runtime_monitor.cancel()
+        # Shutdown scheduler tasks and release leader leases
+        await shutdown_scheduler(app)
+        await app.state.registrar.close()
         # Close Redis connection
         await close_redis_connection(app)
-        # Shutdown scheduler tasks
-        shutdown_scheduler(app)
 
     return stop_app
@@ -1,5 +1,6 @@
 import re
 import json
+import time
 import uvicorn
 
 from fastapi import FastAPI, Request
@@ -9,10 +10,13 @@ from starlette.middleware.cors import CORSMiddleware
 from normality import collapse_spaces
 
 from config import get_app_settings
-from domain.api import routers
+from domain.api import metrics_router, routers
+from domain.api.profiling.dependencies import record_request
 from events import create_start_app_handler, create_stop_app_handler
 from settings.base import BaseAppSettings
 from services.logging.logger import log as logger
+from services.metrics import PrometheusMiddleware
+from services.redis.profiling import start_profile, stop_profile
 
 
 settings = get_app_settings()
@@ -38,6 +42,9 @@ def get_application(settings: BaseAppSettings) -> FastAPI:
 
     )
 
+    # Record per-route latency for /metrics
+    app.add_middleware(PrometheusMiddleware)
+
     # Add startup and shutdown event handlers
     app.add_event_handler(
         "startup",
@@ -52,6 +59,9 @@ def get_application(settings: BaseAppSettings) -> FastAPI:
     for router in routers:
         app.include_router(router, prefix="/api/v1.0")
 
+    # Scraped at the conventional path, outside the versioned API
+    app.include_router(metrics_router)
+
     return app
 
 
@@ -107,5 +117,41 @@ async def preprocess_request_body(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def profile_redis_commands(request: Request, call_next):
+    """
+    Middleware to account the Redis commands issued while serving a request.
+
+    Totals feed the per-route summary; slow requests are appended to the
+    slow request log. In debug mode the totals are returned as headers.
+
+    :param request: Incoming HTTP request.
+    :param call_next: Callable to pass the request to the next middleware or route handler.
+    :return: HTTP response.
+    """
+    if not settings.redis_profiling_enabled:
+        return await call_next(request)
+
+    started = time.perf_counter()
+    token = start_profile(settings.profile_top_commands)
+    try:
+        response = await call_next(request)
+    finally:
+        profile = stop_profile(token)
+    duration = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    # unmatched paths share one name so scanners cannot blow up the route series
+    route_name = f"{request.method} {getattr(route, 'path', 'unmatched')}"
+    args = {**request.path_params, **request.query_params}
+    await record_request(request.app.state.redis, route_name, args, response.status_code, duration, profile)
+
+    if settings.debug:
+        response.headers["X-Redis-Commands"] = str(profile.commands)
+        response.headers["X-Redis-Time-Ms"] = f"{profile.redis_time * 1000:.3f}"
+        response.headers["X-Redis-Pipelines"] = str(profile.pipelines)
+    return response
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8888, reload=True)
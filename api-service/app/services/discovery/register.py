@@ -1,31 +1,112 @@
-import requests
+import asyncio
+import os
+import random
+from typing import Dict, Optional
+
+import httpx
 from services.logging.logger import log as logger
 
+from services.metrics import bucket_quantile, gauge_total, histogram_buckets
+
+
+class LoadSampler:
+    """
+    Load figures of this node for the discovery heartbeat.
+
+    p99 latency covers only the requests served since the previous sample,
+    so a node recovers its ranking as soon as it speeds up again.
+    """
+
+    def __init__(self):
+        self._previous: Dict[float, float] = {}
+
+    def p99_ms(self) -> Optional[float]:
+        current = histogram_buckets("http_request_duration_seconds")
+        window = {le: count - self._previous.get(le, 0.0) for le, count in current.items()}
+        self._previous = current
+        p99 = bucket_quantile(window, 0.99)
+        return None if p99 is None else round(p99 * 1000, 1)
+
+    def sample(self) -> dict:
+        figures = {
+            "connections": int(gauge_total("websocket_connections")),
+            # 1-minute load average per core: 1.0 means the CPUs are saturated
+            "cpu_load": round(os.getloadavg()[0] / (os.cpu_count() or 1), 3),
+        }
+        # sum of the workers' WS_MAX_CONNECTIONS, what discovery scales connections by
+        capacity = int(gauge_total("websocket_connection_capacity"))
+        if capacity:
+            figures["capacity"] = capacity
+        p99 = self.p99_ms()
+        if p99 is not None:
+            figures["p99_ms"] = p99
+        return figures
 
-def register_service(settings):
+
+class DiscoveryRegistrar:
     """
-    Register the service to the discovery server.
+    Registers this instance with the discovery server.
+
+    Uses one keep-alive connection with bounded timeouts, so a slow
+    discovery server costs a few awaited seconds at most and never blocks
+    the event loop. Each registration carries a TTL and doubles as a
+    heartbeat: the entry lapses if heartbeats stop.
     """
-    try:
-        response = requests.post(
-            url=settings.discovery_url,
-            json={
-                "host": settings.server_host,
-                "port": settings.server_port,
-                "service_type": "server"
-            }
+
+    def __init__(self, settings, service_type: str = "server"):
+        self.settings = settings
+        self.service_type = service_type
+        self.load = LoadSampler()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.discovery_timeout, connect=settings.discovery_connect_timeout),
+            limits=httpx.Limits(
+                max_connections=2,
+                max_keepalive_connections=1,
+                keepalive_expiry=settings.register_service_interval * 2,
+            ),
         )
-        # If status code is not in 200–299 range, log a warning
-        if 200 <= response.status_code < 300:
-            # logger.info(
-            #     f"Server registration successful: {response.status_code}; message: {response.text}"
-            # )
-            logger.info(
-                f"Server registration successful: {response.status_code}"
-            )
-        else:
-            logger.warning(
-                f"Unexpected registration status: {response.status_code}; message: {response.text}"
-            )
-    except Exception as e:
-        logger.exception(e)
+
+    def payload(self) -> dict:
+        return {
+            "host": self.settings.server_host,
+            "port": self.settings.server_port,
+            "service_type": self.service_type,
+            "ttl": self.settings.discovery_registration_ttl,
+            "weight": self.settings.discovery_weight,
+            **self.load.sample(),
+        }
+
+    async def register(self) -> bool:
+        """
+        Send one heartbeat, retrying transient failures with exponential
+        backoff and jitter.
+
+        :return: True if the discovery server accepted the registration.
+        """
+        delay = self.settings.discovery_backoff_base
+        attempts = self.settings.discovery_max_attempts
+        payload = self.payload()
+        for attempt in range(1, attempts + 1):
+            try:
+                response = await self.client.post(self.settings.discovery_url, json=payload)
+                if 200 <= response.status_code < 300:
+                    logger.info(f"Server registration successful: {response.status_code}")
+                    return True
+                logger.warning(
+                    f"Unexpected registration status: {response.status_code}; message: {response.text}"
+                )
+                if response.status_code < 500:
+                    # the request itself is wrong, retrying will not help
+                    return False
+            except httpx.HTTPError as e:
+                logger.warning(f"Server registration attempt {attempt}/{attempts} failed: {e!r}")
+
+            if attempt < attempts:
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, self.settings.discovery_backoff_max)
+
+        logger.error(f"Server registration failed after {attempts} attempts")
+        return False
+
+    async def close(self) -> None:
+        await self.client.aclose()
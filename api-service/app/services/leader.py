@@ -0,0 +1,184 @@
+import asyncio
+import os
+import random
+import socket
+import time
+from typing import Awaitable, Callable, Optional
+from uuid import uuid4
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError, ResponseError
+
+from services.logging.logger import log as logger
+
+LEADER_PREFIX = "LEADER"
+
+# Renews the lease if this holder owns it, otherwise takes it when free.
+# Each new acquisition increments the fencing token, so a deposed leader's
+# token is always lower than its successor's.
+_ACQUIRE_OR_RENEW_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+if current then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return redis.call('INCR', KEYS[2])
+"""
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# Prepended to the claim scripts of leader-only tasks. The fence key and
+# token are passed last and removed before the script body runs, so the
+# body sees only its own KEYS and ARGV.
+_FENCE_GUARD_LUA = """
+local fence_token = table.remove(ARGV)
+if redis.call('GET', table.remove(KEYS)) ~= fence_token then
+    return redis.error_reply('FENCED lease taken over')
+end
+"""
+
+
+class FencedOut(Exception):
+    """The lease a task was started under has passed to another holder."""
+
+
+class Fence:
+    """
+    Fencing token a leader-only task was started under. Claims the task
+    makes through it fail atomically once a successor has taken the lease,
+    instead of racing the successor's own claims.
+    """
+
+    def __init__(self, key: str, token: int):
+        self.key = key
+        self.token = token
+
+    async def claim(self, redis: Redis, lua: str, keys: list, args: list):
+        """
+        Run *lua* if the token still holds the lease.
+
+        :raises FencedOut: a successor holds the lease.
+        """
+        script = redis.register_script(_FENCE_GUARD_LUA + lua)
+        try:
+            return await script(keys=[*keys, self.key], args=[*args, self.token])
+        except ResponseError as e:
+            if str(e).startswith("FENCED"):
+                raise FencedOut(f"{self.key} is no longer held under token {self.token}") from e
+            raise
+
+
+class LeaderLease:
+    """
+    Redis lease for one election scope with a fencing token.
+
+    Leadership is trusted locally only until the lease could have expired
+    on the server, measured from before the acquiring call was sent.
+    """
+
+    def __init__(self, redis: Redis, scope: str, ttl: float):
+        self.redis = redis
+        self.scope = scope
+        self.ttl = ttl
+        self.key = f"{LEADER_PREFIX}:{scope}"
+        self.fence_key = f"{self.key}:fence"
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.token: Optional[int] = None
+        self._valid_until = 0.0
+        self._acquire = redis.register_script(_ACQUIRE_OR_RENEW_LUA)
+        self._release = redis.register_script(_RELEASE_LUA)
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None and time.monotonic() < self._valid_until
+
+    async def acquire_or_renew(self) -> bool:
+        started = time.monotonic()
+        token = int(await self._acquire(keys=[self.key, self.fence_key], args=[self.holder, int(self.ttl * 1000)]))
+        if token:
+            self.token = token
+            self._valid_until = started + self.ttl
+        else:
+            self.token = None
+        return bool(token)
+
+    async def validate(self) -> bool:
+        """
+        Check with Redis that this holder still owns the lease under the
+        same fencing token; call before side effects.
+        """
+        if not self.is_leader:
+            return False
+        holder, token = await self.redis.mget(self.key, self.fence_key)
+        return holder == self.holder and token is not None and int(token) == self.token
+
+    def fence(self) -> Fence:
+        return Fence(self.fence_key, self.token)
+
+    async def release(self) -> None:
+        if self.token is None:
+            return
+        self.token = None
+        try:
+            await self._release(keys=[self.key], args=[self.holder])
+        except RedisError as e:
+            logger.warning("Failed to release leader lease %s: %s", self.key, e)
+
+
+class LeaderElector:
+    """
+    Keeps trying to hold the lease of *scope* and reports transitions.
+
+    Leaders renew every third of the TTL; followers retry at the same pace
+    with jitter, so a dead leader is replaced within about 1.3 × TTL and a
+    gracefully stopped one at the next follower attempt.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        scope: str,
+        ttl: float,
+        on_elected: Callable[[LeaderLease], Awaitable[None]],
+        on_demoted: Callable[[LeaderLease], Awaitable[None]],
+    ):
+        self.lease = LeaderLease(redis, scope, ttl)
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._leading = False
+
+    async def run(self) -> None:
+        interval = self.lease.ttl / 3
+        while True:
+            try:
+                await self.lease.acquire_or_renew()
+            except RedisError as e:
+                # keep leading on a transient error until the lease may have lapsed
+                logger.warning("Leader lease %s renewal failed: %s", self.lease.key, e)
+
+            leading = self.lease.is_leader
+            if leading and not self._leading:
+                logger.info("Elected leader of %s with token %s", self.lease.scope, self.lease.token)
+                await self._on_elected(self.lease)
+            elif self._leading and not leading:
+                logger.warning("Lost leadership of %s", self.lease.scope)
+                await self._on_demoted(self.lease)
+            self._leading = leading
+
+            await asyncio.sleep(interval if leading else interval * random.uniform(0.8, 1.2))
+
+    async def stop(self) -> None:
+        if self._leading:
+            self._leading = False
+            await self._on_demoted(self.lease)
+        await self.lease.release()
@@ -0,0 +1,303 @@
+"""
+Prometheus metrics.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+and /metrics merges them (see gunicorn.conf.py for the cleanup hooks).
+Without that variable the process-local registry is served.
+"""
+import asyncio
+import functools
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from services.logging.logger import log as logger
+
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served",
+    ["method"], multiprocess_mode="livesum",
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis command and pipeline latency",
+    ["command"], buckets=_FAST_BUCKETS,
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Redis connection pool usage",
+    ["state"], multiprocess_mode="livesum",
+)
+WS_CONNECTIONS = Gauge(
+    "websocket_connections", "Open WebSocket connections",
+    ["endpoint"], multiprocess_mode="livesum",
+)
+WS_MESSAGES = Counter(
+    "websocket_messages_total", "Messages relayed over WebSockets",
+    ["endpoint", "direction"],
+)
+WS_DELIVERY_LAG = Histogram(
+    "websocket_delivery_lag_seconds", "Time from stream entry creation to WebSocket send",
+    ["endpoint"], buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+WS_OUTBOX_FRAMES = Gauge(
+    "websocket_outbox_frames", "Frames queued for sending on WebSockets",
+    ["endpoint"], multiprocess_mode="livesum",
+)
+WS_SEND_DURATION = Histogram(
+    "websocket_send_seconds", "Time to write one frame to a WebSocket",
+    ["endpoint"], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+WS_SLOW_CONSUMER = Counter(
+    "websocket_slow_consumer_total", "Full outbound queues and send timeouts, by action taken",
+    ["endpoint", "action"],
+)
+WS_CAPACITY = Gauge(
+    "websocket_connection_capacity", "Agent sockets the workers accept at most",
+    multiprocess_mode="livesum",
+)
+WS_ADMISSIONS = Counter(
+    "websocket_admissions_total", "New agent sockets by admission outcome",
+    ["outcome"],
+)
+WS_ACCEPT_WAIT = Histogram(
+    "websocket_accept_wait_seconds", "Time admitted agent sockets waited for their turn",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HEARTBEATS = Counter("udpu_heartbeats_total", "UDPU status reports received")
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay of a periodic event-loop wakeup past its deadline",
+    buckets=_FAST_BUCKETS,
+)
+ROLLOUT_DEVICES = Counter(
+    "rollout_devices_total", "Rollout devices settled, by result",
+    ["result"],
+)
+_COMMAND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+COMMAND_STAGE_BY_JOB = Histogram(
+    "command_stage_seconds_by_job", "Latency of dispatched commands by stage and job",
+    ["stage", "job"], buckets=_COMMAND_BUCKETS,
+)
+COMMAND_STAGE_BY_ROLE = Histogram(
+    "command_stage_seconds_by_role", "Latency of dispatched commands by stage and device role",
+    ["stage", "role"], buckets=_COMMAND_BUCKETS,
+)
+SCHEDULE_SENDS = Counter(
+    "schedule_sends_total", "Scheduled commands written to device streams, by outcome",
+    ["outcome"],
+)
+SCHEDULE_BACKLOG = Gauge(
+    "schedule_backlog", "Scheduled sends due but held back by the dispatch rate limit",
+    multiprocess_mode="livesum",
+)
+QUEUE_RUN_STEPS = Counter(
+    "queue_run_steps_total", "Queue run steps settled, by status",
+    ["status"],
+)
+EXECUTION_OUTPUT_STREAMS = Gauge(
+    "execution_output_streams", "Clients following the output of an execution",
+    multiprocess_mode="livesum",
+)
+PROFILE_ROUTE = Counter(
+    "profile_route", "Redis profiling sums per route: requests, commands, pipelines, slow_requests, "
+    "redis_seconds, duration_seconds",
+    ["route", "stat"],
+)
+PROFILE_ROUTE_MAX = Gauge(
+    "profile_route_max", "Largest commands and redis_seconds of a single request per route",
+    ["route", "stat"], multiprocess_mode="max",
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds", "Duration of scheduled jobs",
+    ["job", "outcome"], buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+def _registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> tuple:
+    """
+    :return: (body, content type) for the /metrics response.
+    """
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def gauge_total(name: str) -> float:
+    """Sum of a gauge over all label sets and, under gunicorn, all workers."""
+    return sum(
+        sample.value
+        for metric in _registry().collect() if metric.name == name
+        for sample in metric.samples
+    )
+
+
+def sample_values(sample: str, *labels: str) -> Dict[Tuple[str, ...], float]:
+    """Values of the samples named *sample* summed per combination of *labels*."""
+    values: Dict[Tuple[str, ...], float] = {}
+    for metric in _registry().collect():
+        for item in metric.samples:
+            if item.name == sample:
+                key = tuple(item.labels.get(label, "") for label in labels)
+                values[key] = values.get(key, 0.0) + item.value
+    return values
+
+
+def histogram_buckets(name: str) -> Dict[float, float]:
+    """Cumulative bucket counts of a histogram summed over all label sets."""
+    buckets: Dict[float, float] = {}
+    for metric in _registry().collect():
+        if metric.name != name:
+            continue
+        for sample in metric.samples:
+            if sample.name == f"{name}_bucket":
+                le = float(sample.labels["le"])
+                buckets[le] = buckets.get(le, 0.0) + sample.value
+    return buckets
+
+
+def histogram_buckets_by(name: str, *labels: str) -> Dict[Tuple[str, ...], Dict[float, float]]:
+    """Cumulative bucket counts of a histogram per combination of *labels*."""
+    series: Dict[Tuple[str, ...], Dict[float, float]] = {}
+    for metric in _registry().collect():
+        if metric.name != name:
+            continue
+        for sample in metric.samples:
+            if sample.name == f"{name}_bucket":
+                buckets = series.setdefault(tuple(sample.labels.get(label, "") for label in labels), {})
+                le = float(sample.labels["le"])
+                buckets[le] = buckets.get(le, 0.0) + sample.value
+    return series
+
+
+def bucket_quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """
+    Upper bound of the bucket holding quantile *q* of cumulative *buckets*;
+    the last finite bound if it falls in +Inf, None if there are no samples.
+    """
+    bounds = sorted(buckets)
+    total = buckets.get(math.inf, 0.0)
+    if total <= 0:
+        return None
+    finite = [le for le in bounds if le != math.inf]
+    for le in finite:
+        if buckets[le] >= q * total:
+            return le
+    return finite[-1] if finite else None
+
+
+def stream_entry_age(entry_id: str) -> float:
+    """Seconds since a Redis stream entry was added, from its millisecond id."""
+    try:
+        return max(time.time() - int(str(entry_id).split("-", 1)[0]) / 1000, 0.0)
+    except ValueError:
+        return 0.0
+
+
+class PrometheusMiddleware:
+    """
+    Pure ASGI middleware recording request latency by route template.
+
+    Unmatched paths share one label so scanners cannot blow up cardinality.
+    Event streams stay open for as long as their client follows them, so
+    they are left out of the latency histogram, which discovery ranks on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status_code = 500
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            if not streaming:
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+
+
+async def monitor_runtime(redis, interval: float = 1.0) -> None:
+    """
+    Per-worker loop sampling event-loop lag and Redis pool usage.
+    """
+    pool = redis.connection_pool
+    while True:
+        deadline = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(time.perf_counter() - deadline, 0.0))
+        try:
+            REDIS_POOL_CONNECTIONS.labels("in_use").set(len(getattr(pool, "_in_use_connections", ())))
+            REDIS_POOL_CONNECTIONS.labels("idle").set(len(getattr(pool, "_available_connections", ())))
+            REDIS_POOL_CONNECTIONS.labels("max").set(pool.max_connections)
+        except Exception as e:
+            logger.debug("Cannot sample redis pool: %s", e)
+
+
+def timed_job(name: str, func):
+    """Wrap a scheduler job, sync or async, to record its duration."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started, outcome = time.perf_counter(), "success"
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                SCHEDULER_JOB_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started, outcome = time.perf_counter(), "success"
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            SCHEDULER_JOB_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+    return wrapper
@@ -1 +1 @@
-from .redis import close_redis_connection, connect_to_redis
+from .redis import close_redis_connection, connect_to_redis, get_batching_redis, get_redis
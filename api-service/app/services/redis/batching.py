@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, List, Tuple
+
+from redis.asyncio.client import Redis
+
+from services.logging.logger import log as logger
+
+from .profiling import record_command
+
+# Single-key commands whose pipelined reply is identical to the direct one.
+# Blocking, multi-step and iterator commands (scan_iter, pipeline, pubsub,
+# xread with block) are passed straight through to the wrapped client.
+BATCHABLE_COMMANDS = frozenset({
+    "get", "set", "mget", "exists", "delete", "expire", "ttl", "incr", "incrby",
+    "hget", "hgetall", "hmget", "hset", "hdel", "hexists", "hincrby",
+    "sadd", "srem", "sismember", "smembers", "scard",
+    "zadd", "zrem", "zscore", "zcard",
+    "lpush", "rpush", "ltrim", "lrange",
+    "xadd", "publish",
+})
+
+
+@dataclass
+class BatchingStats:
+    flushes: int = 0
+    commands: int = 0
+    max_batch: int = 0
+    errors: int = 0
+
+    def snapshot(self) -> dict:
+        data = asdict(self)
+        data["avg_batch"] = round(self.commands / self.flushes, 2) if self.flushes else 0
+        return data
+
+
+class AutoBatchingRedis:
+    """
+    Drop-in wrapper that coalesces commands issued in the same event-loop
+    tick into one non-transactional pipeline.
+
+    Each caller still awaits its own reply, and a failing command only fails
+    its own caller. Commands from one coroutine keep their order because the
+    coroutine awaits each reply before issuing the next command.
+    """
+
+    def __init__(self, redis: Redis, max_batch_size: int = 128, commands: Iterable[str] = BATCHABLE_COMMANDS):
+        self._redis = redis
+        self._max_batch_size = max_batch_size
+        self._commands = frozenset(commands)
+        self._pending: List[Tuple[str, tuple, dict, asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._tasks: set = set()
+        self.stats = BatchingStats()
+
+    @property
+    def client(self) -> Redis:
+        return self._redis
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._redis, name)
+        if name not in self._commands:
+            return attr
+
+        async def command(*args, **kwargs):
+            return await self._enqueue(name, args, kwargs)
+
+        return command
+
+    async def _enqueue(self, name: str, args: tuple, kwargs: dict) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((name, args, kwargs, future))
+        started = time.perf_counter()
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            # the flush serves many requests, so it runs outside any of them
+            loop.call_soon(self._flush, context=contextvars.Context())
+        try:
+            return await future
+        finally:
+            record_command(name.upper(), args[0] if args else None, time.perf_counter() - started, batched=True)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._execute(batch), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, batch: List[Tuple[str, tuple, dict, asyncio.Future]]) -> None:
+        self.stats.flushes += 1
+        self.stats.commands += len(batch)
+        self.stats.max_batch = max(self.stats.max_batch, len(batch))
+
+        if len(batch) == 1:
+            name, args, kwargs, future = batch[0]
+            try:
+                result = await getattr(self._redis, name)(*args, **kwargs)
+            except Exception as e:
+                self.stats.errors += 1
+                _resolve(future, exception=e)
+            else:
+                _resolve(future, result=result)
+            return
+
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for name, args, kwargs, _ in batch:
+                getattr(pipe, name)(*args, **kwargs)
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error("Redis batch of %s commands failed: %s", len(batch), e)
+            self.stats.errors += len(batch)
+            for *_, future in batch:
+                _resolve(future, exception=e)
+            return
+
+        for (*_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.stats.errors += 1
+                _resolve(future, exception=result)
+            else:
+                _resolve(future, result=result)
+
+
+def _resolve(future: asyncio.Future, result: Any = None, exception: BaseException = None) -> None:
+    # the caller may have been cancelled while the batch was in flight
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
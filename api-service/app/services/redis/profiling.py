@@ -0,0 +1,112 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from redis.asyncio.client import Pipeline, Redis
+
+from services.metrics import REDIS_COMMAND_DURATION
+
+# Profile of the request being served; None outside a request (startup,
+# scheduler jobs, batched flushes run in an empty context).
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("redis_request_profile", default=None)
+
+
+@dataclass
+class RequestProfile:
+    top_n: int = 5
+    commands: int = 0
+    redis_time: float = 0.0
+    pipelines: int = 0
+    pipelined_commands: int = 0
+    batched_commands: int = 0
+    by_command: Dict[str, List[float]] = field(default_factory=dict)
+    slowest: List[tuple] = field(default_factory=list)
+
+    def record(self, name: str, key: Any, elapsed: float, size: int = 1, batched: bool = False) -> None:
+        self.commands += size
+        self.redis_time += elapsed
+        if batched:
+            self.batched_commands += 1
+        stats = self.by_command.setdefault(name, [0, 0.0])
+        stats[0] += size
+        stats[1] += elapsed
+        if len(self.slowest) < self.top_n or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, name, str(key)[:128] if key is not None else ""))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.top_n:]
+
+    def as_dict(self) -> dict:
+        return {
+            "commands": self.commands,
+            "redis_ms": round(self.redis_time * 1000, 3),
+            "pipelines": self.pipelines,
+            "pipelined_commands": self.pipelined_commands,
+            "batched_commands": self.batched_commands,
+            "by_command": {
+                name: {"count": count, "ms": round(total * 1000, 3)}
+                for name, (count, total) in sorted(self.by_command.items(), key=lambda kv: -kv[1][1])
+            },
+            "slowest": [
+                {"command": name, "key": key, "ms": round(elapsed * 1000, 3)}
+                for elapsed, name, key in self.slowest
+            ],
+        }
+
+
+def start_profile(top_n: int = 5):
+    return _current_profile.set(RequestProfile(top_n=top_n))
+
+
+def stop_profile(token) -> Optional[RequestProfile]:
+    profile = _current_profile.get()
+    _current_profile.reset(token)
+    return profile
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def record_command(name: str, key: Any, elapsed: float, batched: bool = False) -> None:
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(name, key, elapsed, batched=batched)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        profile = _current_profile.get()
+        size = len(self.command_stack)
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            elapsed = time.perf_counter() - started
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(elapsed)
+            if profile is not None:
+                profile.pipelines += 1
+                profile.pipelined_commands += size
+                profile.record("PIPELINE", f"{size} commands", elapsed, size=size)
+
+
+class InstrumentedRedis(Redis):
+    """
+    Redis client that feeds command latency to Prometheus and charges every
+    command and pipeline to the profile of the current request, if any.
+    """
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            elapsed = time.perf_counter() - started
+            name = str(args[0]).upper()
+            REDIS_COMMAND_DURATION.labels(name).observe(elapsed)
+            profile = _current_profile.get()
+            if profile is not None:
+                profile.record(name, args[1] if len(args) > 1 else None, elapsed)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -1,19 +1,39 @@
 from fastapi import FastAPI, Request
 from services.logging.logger import log as logger
+from redis.asyncio import BlockingConnectionPool
 from redis.asyncio.client import Redis
 from redis.exceptions import ConnectionError
 
 from settings.base import BaseAppSettings
 
+from .batching import AutoBatchingRedis
+from .profiling import InstrumentedRedis
+
+# seconds a command may wait for its reply; blocking reads must block for less
+REDIS_SOCKET_TIMEOUT = 10
+
 
 async def connect_to_redis(app: FastAPI, settings: BaseAppSettings) -> None:
     logger.info("Connecting to Redis")
-    app.state.redis = Redis.from_url(
+    app.state.redis = InstrumentedRedis.from_url(
         settings.redis_url,
         decode_responses=True,
-        max_connections=200,
+        max_connections=settings.redis_max_connections,
         socket_connect_timeout=5,
-        socket_timeout=10
+        socket_timeout=REDIS_SOCKET_TIMEOUT
+    )
+    # agent sockets block on their command lanes; a pool of their own, one
+    # connection per admitted socket, keeps them from starving requests
+    app.state.redis_streams = InstrumentedRedis(connection_pool=BlockingConnectionPool.from_url(
+        settings.redis_url,
+        decode_responses=True,
+        max_connections=settings.redis_stream_max_connections,
+        socket_connect_timeout=5,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+    ))
+    app.state.redis_batch = (
+        AutoBatchingRedis(app.state.redis, max_batch_size=settings.redis_autobatch_max_size)
+        if settings.redis_autobatch_enabled else app.state.redis
     )
     try:
         await app.state.redis.ping()
@@ -26,6 +46,7 @@ async def connect_to_redis(app: FastAPI, settings: BaseAppSettings) -> None:
 async def close_redis_connection(app: FastAPI) -> None:
     logger.info("Closing connection to database")
     await app.state.redis.close()
+    await app.state.redis_streams.close(close_connection_pool=True)
     logger.info("Connection closed")
 
 
@@ -36,4 +57,16 @@ def get_redis(request: Request) -> Redis:
     :param request: FastAPI request object.
     :return: Redis connection instance.
     """
-    return request.app.state.redis
\ No newline at end of file
+    return request.app.state.redis
+
+
+def get_batching_redis(request: Request) -> Redis:
+    """
+    Retrieve the auto-batching Redis client for hot, independent commands.
+
+    Falls back to the plain connection when batching is disabled.
+
+    :param request: FastAPI request object.
+    :return: Redis-compatible client.
+    """
+    return request.app.state.redis_batch
@@ -1,27 +1,135 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
 from fastapi import FastAPI
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from services.leader import FencedOut, LeaderElector, LeaderLease
 from services.logging.logger import log as logger
+from services.metrics import timed_job
 
+CLUSTER_SCOPE = "cluster"
 
-def start_scheduler(app: FastAPI, func=None, args=None) -> None:
-    logger.info("Starting the scheduler")
-    app.scheduler = AsyncIOScheduler()
 
-    app.scheduler.add_job(func, args=args, trigger="cron", second="*/30")
-    app.scheduler.start()
-    logger.info("Scheduler started")
+def node_scope(host: str, port: int) -> str:
+    """Election scope for tasks that must run once per API node."""
+    return f"node:{host}:{port}"
+
+
+@dataclass
+class PeriodicTask:
+    """
+    A named job run only by the current leader of *scope*.
+
+    Runs never overlap: a run that is still going when the next one is due
+    makes the scheduler skip (and log) that next run.
+
+    Leadership is checked before every run, but a run can outlast it. A
+    *fenced* task gets the lease's `Fence` as its ``fence`` keyword and
+    makes its claims through it, so a deposed leader's claims fail
+    instead of racing its successor's. Unfenced tasks must be safe to run
+    twice at once.
+    """
+    name: str
+    func: Callable
+    interval: float
+    jitter: float = 0
+    scope: str = CLUSTER_SCOPE
+    args: Tuple = field(default_factory=tuple)
+    fenced: bool = False
+
+
+class PeriodicTaskRegistry:
+    def __init__(self):
+        self._tasks: Dict[str, PeriodicTask] = {}
+
+    def register(self, task: PeriodicTask) -> None:
+        if task.name in self._tasks:
+            raise ValueError(f"Periodic task {task.name} is already registered")
+        self._tasks[task.name] = task
 
+    def by_scope(self) -> Dict[str, List[PeriodicTask]]:
+        scopes: Dict[str, List[PeriodicTask]] = {}
+        for task in self._tasks.values():
+            scopes.setdefault(task.scope, []).append(task)
+        return scopes
 
-def vbce_scheduler(app: FastAPI, func=None, args=None) -> None:
-    logger.info("Starting the vbce scheduler")
-    app.scheduler = AsyncIOScheduler()
 
-    app.scheduler.add_job(func, args=args, trigger="cron", minute="*/2")
+def _fenced(task: PeriodicTask, lease: LeaderLease) -> Callable:
+    func = timed_job(task.name, task.func)
+
+    async def run() -> None:
+        try:
+            if not await lease.validate():
+                logger.warning("Skipping %s: leadership of %s is no longer held", task.name, lease.scope)
+                return
+        except RedisError as e:
+            logger.warning("Skipping %s: cannot validate leadership: %s", task.name, e)
+            return
+        kwargs = {"fence": lease.fence()} if task.fenced else {}
+        try:
+            if asyncio.iscoroutinefunction(task.func):
+                await func(*task.args, **kwargs)
+            else:
+                await asyncio.to_thread(func, *task.args, **kwargs)
+        except FencedOut as e:
+            logger.warning(f"Stopped {task.name}: {e}")
+
+    return run
+
+
+def _log_overrun(event) -> None:
+    logger.warning("Periodic task %s is still running, skipped a run", event.job_id)
+
+
+def start_scheduler(app: FastAPI, redis: Redis, registry: PeriodicTaskRegistry, lease_ttl: float) -> None:
+    """
+    Start the per-worker scheduler and one leader elector per task scope.
+    Jobs of a scope are added when this worker wins its lease and removed
+    when it loses it.
+    """
+    logger.info("Starting the scheduler")
+    app.scheduler = AsyncIOScheduler(job_defaults={"coalesce": True, "max_instances": 1})
+    app.scheduler.add_listener(_log_overrun, EVENT_JOB_MAX_INSTANCES)
     app.scheduler.start()
-    logger.info("VBCE scheduler started")
+
+    app.state.leader_electors = []
+    app.state.leader_tasks = []
+    for scope, tasks in registry.by_scope().items():
+        async def on_elected(lease: LeaderLease, tasks=tasks) -> None:
+            for task in tasks:
+                app.scheduler.add_job(
+                    _fenced(task, lease),
+                    trigger=IntervalTrigger(seconds=task.interval, jitter=task.jitter or None),
+                    id=task.name,
+                    name=task.name,
+                    # a new leader catches up right away instead of after a full interval
+                    next_run_time=datetime.now(),
+                    replace_existing=True,
+                )
+
+        async def on_demoted(lease: LeaderLease, tasks=tasks) -> None:
+            for task in tasks:
+                if app.scheduler.get_job(task.name):
+                    app.scheduler.remove_job(task.name)
+
+        elector = LeaderElector(redis, scope, lease_ttl, on_elected, on_demoted)
+        app.state.leader_electors.append(elector)
+        app.state.leader_tasks.append(asyncio.create_task(elector.run(), name=f"leader:{scope}"))
+    logger.info("Scheduler started")
 
 
-def shutdown_scheduler(app: FastAPI) -> None:
+async def shutdown_scheduler(app: FastAPI) -> None:
     logger.info("Stoping the scheduler")
+    for task in app.state.leader_tasks:
+        task.cancel()
+    for elector in app.state.leader_electors:
+        await elector.stop()
     app.scheduler.shutdown()
     logger.info("Scheduler stopped")
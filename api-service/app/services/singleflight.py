@@ -0,0 +1,103 @@
+import asyncio
+import copy
+import functools
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from services.logging.logger import log as logger
+
+
+class _Flight:
+    __slots__ = ("task", "followers")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent reads within one worker.
+
+    The first caller for a key starts the operation; callers arriving while
+    it is in flight await the same task. Once a result is shared every
+    caller gets its own deep copy, so callers mutating the result do not
+    affect each other. The shared task is shielded, so a cancelled caller
+    never cancels the others.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, str, Hashable], _Flight] = {}
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "executions": 0, "coalesced": 0})
+
+    async def do(self, group: str, op: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        stats = self.stats[op]
+        stats["calls"] += 1
+        flight_key = (group, op, key)
+        flight = self._flights.get(flight_key)
+        if flight is not None:
+            stats["coalesced"] += 1
+            flight.followers += 1
+            return copy.deepcopy(await asyncio.shield(flight.task))
+
+        stats["executions"] += 1
+        flight = _Flight(asyncio.ensure_future(fn()))
+        self._flights[flight_key] = flight
+        # registered before the shield below, so the flight is closed to new
+        # followers before the leader resumes
+        flight.task.add_done_callback(lambda _: self._discard(flight_key, flight))
+        result = await asyncio.shield(flight.task)
+        return copy.deepcopy(result) if flight.followers else result
+
+    def _discard(self, flight_key, flight: _Flight) -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+
+    def forget(self, group: str) -> None:
+        """
+        Stop sharing flights of *group*: callers arriving after a write must
+        not join a read that started before it.
+        """
+        for flight_key in [k for k in self._flights if k[0] == group]:
+            del self._flights[flight_key]
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {op: dict(values) for op, values in self.stats.items()}
+
+
+singleflight = SingleFlight()
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def coalesce(group: str, skip: int = 1) -> Callable:
+    """
+    Decorator sharing one in-flight call among identical concurrent calls.
+
+    :param group: invalidation group, see :meth:`SingleFlight.forget`.
+    :param skip: leading positional arguments left out of the key
+        (the redis client for functions, ``self`` for repository methods).
+    """
+
+    def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        op = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                key = (_freeze(args[skip:]), _freeze(kwargs))
+                hash(key)
+            except TypeError:
+                logger.debug("Unhashable arguments for %s, not coalescing", op)
+                return await fn(*args, **kwargs)
+            return await singleflight.do(group, op, key, lambda: fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -27,6 +27,15 @@ class BaseAppSettings(BaseSettings):
     # ------------------------------------------------------------------
     discovery_service_host: str = "localhost"
     discovery_service_port: int = 8886
+    discovery_timeout: float = 2.0
+    discovery_connect_timeout: float = 1.0
+    discovery_max_attempts: int = 3
+    discovery_backoff_base: float = 0.5
+    discovery_backoff_max: float = 5.0
+    # discovery drops the registration if no heartbeat arrives in time
+    discovery_registration_ttl: int = 90
+    # relative share of new agents this node should receive
+    discovery_weight: float = 1.0
 
     # ------------------------------------------------------------------
     # HTTP server
@@ -41,6 +50,23 @@ class BaseAppSettings(BaseSettings):
     redis_pass: Optional[str] = None
     redis_host: str = "localhost"
     redis_port: int = 6379
+    # Connections per worker: the shared pool, and the pool agent sockets
+    # wait on their command lanes with. Every socket holds one connection
+    # of the latter, so its size also caps the sockets a worker admits;
+    # Redis maxclients must cover both pools of every worker
+    redis_max_connections: int = 200
+    redis_stream_max_connections: int = 2000
+
+    # Auto-batching wrapper handed out by services.redis.get_batching_redis
+    redis_autobatch_enabled: bool = True
+    redis_autobatch_max_size: int = 128
+
+    # Per-request command accounting (profiling middleware); command
+    # latency metrics are always collected
+    redis_profiling_enabled: bool = True
+    slow_request_threshold_ms: int = 500
+    slow_request_log_maxlen: int = 1000
+    profile_top_commands: int = 5
 
     # ------------------------------------------------------------------
     # File‑system
@@ -79,6 +105,107 @@ class BaseAppSettings(BaseSettings):
     max_connection_count: int = 10
     min_connection_count: int = 10
 
+    # ------------------------------------------------------------------
+    # Periodic tasks (leader elected, see services.scheduler)
+    # ------------------------------------------------------------------
+    leader_lease_ttl: float = 6.0
+    register_service_interval: int = 30
+    vbce_rates_enabled: bool = False
+    vbce_rates_interval: int = 120
+
+    # ------------------------------------------------------------------
+    # Delta sync
+    # ------------------------------------------------------------------
+    sync_changelog_maxlen: int = 100_000
+    sync_page_limit: int = 1000
+
+    # ------------------------------------------------------------------
+    # Staged rollouts (defaults for requests that leave them unset)
+    # ------------------------------------------------------------------
+    rollout_tick_interval: float = 2.0
+    rollout_wave_size: int = 100
+    rollout_max_concurrency: int = 50
+    rollout_success_threshold: float = 0.95
+    rollout_device_timeout: int = 900
+    # devices per pipeline when dispatching or checking uids
+    rollout_pipeline_chunk: int = 500
+    # finished rollouts and their device results are kept this long
+    rollout_retention: int = 7 * 24 * 3600
+
+    # ------------------------------------------------------------------
+    # WebSocket outbound queues: frames queued per connection, what a full
+    # queue does (spill, drop_oldest or disconnect) and the longest a single
+    # send may take before the client counts as gone
+    # ------------------------------------------------------------------
+    ws_send_queue_size: int = 64
+    ws_overflow_policy: str = "spill"
+    ws_send_timeout: float = 10.0
+
+    # ------------------------------------------------------------------
+    # Agent socket admission, per worker: new sockets per second and
+    # burst, the longest a socket waits for its turn before it is told to
+    # come back, and the connection cap with the retry-after it triggers
+    # ------------------------------------------------------------------
+    ws_accept_rate: float = 50.0
+    ws_accept_burst: int = 100
+    ws_accept_max_wait: float = 5.0
+    ws_max_retry_after: float = 300.0
+    ws_max_connections: int = 2500
+    ws_full_retry_after: float = 60.0
+
+    # ------------------------------------------------------------------
+    # Agent socket presence: refresh period and TTL of a registration
+    # ------------------------------------------------------------------
+    presence_refresh_interval: float = 10.0
+    presence_ttl: int = 30
+
+    # ------------------------------------------------------------------
+    # Device command lanes: approximate length cap and maximum age in
+    # seconds (0 keeps entries until the length cap) of each lane
+    # ------------------------------------------------------------------
+    urgent_lane_maxlen: int = 1000
+    urgent_lane_max_age: int = 0
+    normal_lane_maxlen: int = 10000
+    normal_lane_max_age: int = 0
+    bulk_lane_maxlen: int = 100000
+    bulk_lane_max_age: int = 24 * 3600
+
+    # ------------------------------------------------------------------
+    # Server-side job scheduler
+    # ------------------------------------------------------------------
+    schedule_tick_interval: float = 1.0
+    # the wheel covers slots * tick seconds, the window planned at a time
+    schedule_wheel_slots: int = 60
+    # stream entries per second over the whole cluster, 0 for no limit
+    schedule_max_dispatch_rate: float = 500.0
+
+    # ------------------------------------------------------------------
+    # Queue runs (step defaults for requests that leave them unset)
+    # ------------------------------------------------------------------
+    queue_run_tick_interval: float = 1.0
+    queue_step_timeout: int = 600
+    # seconds before the first retry, doubled after each
+    queue_step_backoff: float = 5.0
+    # tail of std_out and std_err kept per step
+    queue_step_output_limit: int = 4096
+    queue_run_retention: int = 7 * 24 * 3600
+
+    # ------------------------------------------------------------------
+    # Command execution tracking
+    # ------------------------------------------------------------------
+    execution_retention: int = 24 * 3600
+    # output entries kept per execution, oldest trimmed first
+    execution_output_maxlen: int = 10000
+    # seconds between keep-alive comments on an idle output stream, at most
+    # half the Redis socket timeout
+    execution_output_heartbeat: float = 5.0
+
+    # ------------------------------------------------------------------
+    # Agent bootstrap bundle
+    # ------------------------------------------------------------------
+    agent_bundle_cache_size: int = 256
+    agent_bundle_cache_ttl: int = 300
+
     # ------------------------------------------------------------------
     # Hosts / CORS
     # ------------------------------------------------------------------
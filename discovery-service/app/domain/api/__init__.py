@@ -1,4 +1,5 @@
 from .health_check.view import router as health_check_router
+from .metrics.view import router as metrics_router
 from .service.view import router as service_discovery_router
 
 routers = (
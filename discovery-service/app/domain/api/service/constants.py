@@ -1 +1,14 @@
 SERVICE_DISCOVERY_PREFIX = "SERVICE_DISCOVERY"
+
+# sorted set per service type: registration key -> expiry timestamp
+SERVICE_DISCOVERY_INDEX_PREFIX = "SERVICE_DISCOVERY_INDEX"
+
+# kept outside the SERVICE_DISCOVERY_ prefix, which holds registrations only
+SERVICE_TYPES_KEY = "SERVICE_TYPES"
+SERVICE_PROBE_PREFIX = "SERVICE_PROBE"
+SERVICE_EVENTS_PREFIX = "SERVICE_EVENTS"
+
+EVENT_JOINED = "joined"
+EVENT_LEFT = "left"
+EVENT_UP = "up"
+EVENT_DOWN = "down"
@@ -1,10 +1,22 @@
+import json
 import logging
+import time
+from typing import Dict, List, Optional, Tuple
 
 from redis.asyncio.client import Redis
 from redis.exceptions import ReadOnlyError, ResponseError
 
-from domain.api.service.constants import SERVICE_DISCOVERY_PREFIX
+from domain.api.service.constants import (
+    EVENT_JOINED,
+    EVENT_LEFT,
+    SERVICE_DISCOVERY_INDEX_PREFIX,
+    SERVICE_DISCOVERY_PREFIX,
+    SERVICE_EVENTS_PREFIX,
+    SERVICE_PROBE_PREFIX,
+    SERVICE_TYPES_KEY,
+)
 from domain.api.service.schemas import ServiceDiscoverySchema
+from settings.base import BaseAppSettings
 
 
 class RedisResponseError(Exception):
@@ -16,6 +28,75 @@ class RedisResponseError(Exception):
         return self.message
 
 
+class LookupCache:
+    """
+    Per-process cache of ranked lookups by service type.
+
+    Agents poll the same few types, so a TTL of about a second absorbs
+    bursts without hiding a new or lapsed instance for long.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, List[dict]]] = {}
+
+    def get(self, service_type: str) -> Optional[List[dict]]:
+        entry = self._entries.get(service_type)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, service_type: str, instances: List[dict], ttl: float) -> None:
+        if ttl > 0:
+            self._entries[service_type] = (time.monotonic() + ttl, instances)
+
+    def invalidate(self, service_type: str) -> None:
+        self._entries.pop(service_type, None)
+
+
+lookup_cache = LookupCache()
+
+
+def index_key(service_type: str) -> str:
+    return f"{SERVICE_DISCOVERY_INDEX_PREFIX}_{service_type}"
+
+
+def probe_key(service_type: str) -> str:
+    return f"{SERVICE_PROBE_PREFIX}_{service_type}"
+
+
+def events_key(service_type: str) -> str:
+    return f"{SERVICE_EVENTS_PREFIX}_{service_type}"
+
+
+def rank(instance: dict, settings: BaseAppSettings) -> dict:
+    """
+    Annotate a registration with its load, health and score.
+
+    Load is the most saturated of the reported figures and the latest
+    probe latency, each scaled so that 1.0 means at capacity. An instance
+    at or over capacity, or one the prober reports down, is unhealthy.
+    Score is weight / (1 + load), higher is better.
+    """
+    figures = []
+    probe = instance.get("probe")
+    if probe and probe.get("latency_ms") is not None:
+        figures.append(probe["latency_ms"] / settings.registry_p99_budget_ms)
+    if instance.get("cpu_load"):
+        figures.append(float(instance["cpu_load"]))
+    if instance.get("connections"):
+        capacity = int(instance.get("capacity") or settings.registry_connections_capacity)
+        figures.append(int(instance["connections"]) / capacity)
+    if instance.get("p99_ms"):
+        figures.append(float(instance["p99_ms"]) / settings.registry_p99_budget_ms)
+    load = max(figures, default=0.0)
+    weight = float(instance.get("weight") or 1.0)
+
+    instance["load"] = round(load, 3)
+    instance["healthy"] = load < 1.0 and (probe is None or probe["up"])
+    instance["score"] = round(weight / (1 + load), 4)
+    return instance
+
+
 async def get(redis: Redis, key: str):
     if not key.startswith(SERVICE_DISCOVERY_PREFIX):
         key = f"{SERVICE_DISCOVERY_PREFIX}_{key}"
@@ -26,18 +107,144 @@ async def get(redis: Redis, key: str):
         raise RedisResponseError(message=e)
 
 
-async def create(redis: Redis, obj: ServiceDiscoverySchema):
+async def create(redis: Redis, obj: ServiceDiscoverySchema, settings: BaseAppSettings):
+    """
+    Register or renew an instance. Every call is a heartbeat: it replaces
+    the load figures and pushes the expiry of the hash and its index
+    entry another ttl seconds out.
+    """
+    ttl = min(obj.ttl or settings.registration_default_ttl, settings.registration_max_ttl)
+    now = time.time()
+    index = index_key(obj.service_type)
     try:
-        await redis.hset(obj.key, mapping=obj.serialize())
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(obj.key)
+            pipe.hset(obj.key, mapping={**obj.serialize(), "ttl": str(ttl), "last_seen": str(int(now))})
+            pipe.expire(obj.key, ttl)
+            pipe.zadd(index, {obj.key: now + ttl})
+            pipe.sadd(SERVICE_TYPES_KEY, obj.service_type)
+            added = (await pipe.execute())[3]
+        if added:
+            await publish_event(redis, obj.service_type, EVENT_JOINED, obj.key, settings)
     except (ResponseError, ReadOnlyError) as e:
         logging.error(e)
         raise RedisResponseError(message=e)
+    lookup_cache.invalidate(obj.service_type)
     return await get(redis, obj.key)
 
 
-async def get_all(redis: Redis, service_type: str):
+async def get_all(redis: Redis, service_type: str, settings: BaseAppSettings):
+    """
+    Live instances of a type, healthy ones first, then by score.
+
+    Reads the type's index instead of scanning the keyspace and fetches
+    every hash in a single round trip.
+    """
+    cached = lookup_cache.get(service_type)
+    if cached is not None:
+        return cached
+
+    keys = await redis.zrangebyscore(index_key(service_type), time.time(), "+inf")
+    rows, probes = [], []
+    if keys:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            pipe.hmget(probe_key(service_type), keys)
+            *rows, probes = await pipe.execute()
+
     objects = []
-    objects_keys = await redis.keys(f"{SERVICE_DISCOVERY_PREFIX}_{service_type}_*")
-    for key in objects_keys or []:
-        objects.append(await redis.hgetall(key))
+    for row, probe in zip(rows, probes):
+        # a hash may expire a moment before its index entry is pruned
+        if row:
+            row["probe"] = json.loads(probe) if probe else None
+            objects.append(rank(row, settings))
+    objects.sort(key=lambda obj: (not obj["healthy"], -obj["score"]))
+    lookup_cache.put(service_type, objects, settings.registry_cache_ttl)
     return objects
+
+
+async def publish_event(redis: Redis, service_type: str, event: str, key: str, settings: BaseAppSettings) -> str:
+    """Append a membership or health change to the type's watch stream."""
+    return await redis.xadd(
+        events_key(service_type),
+        {"event": event, "key": key, "at": str(int(time.time()))},
+        maxlen=settings.watch_events_maxlen,
+        approximate=True,
+    )
+
+
+async def prune_expired(redis: Redis, service_type: str, settings: BaseAppSettings) -> List[str]:
+    """
+    Drop index entries whose registration lapsed and announce each one.
+
+    ZREM succeeds for only one caller per key, so concurrent pruners never
+    announce the same departure twice.
+    """
+    index = index_key(service_type)
+    left = []
+    for key in await redis.zrangebyscore(index, "-inf", time.time()):
+        if await redis.zrem(index, key):
+            await redis.hdel(probe_key(service_type), key)
+            await publish_event(redis, service_type, EVENT_LEFT, key, settings)
+            left.append(key)
+    if left:
+        lookup_cache.invalidate(service_type)
+    return left
+
+
+async def expire_unindexed_registrations(redis: Redis, settings: BaseAppSettings) -> int:
+    """
+    Give registrations written before expiry existed a TTL so they age out
+    instead of lingering forever. Index keys and hashes that already expire
+    are left alone.
+    """
+    expired = 0
+    async for key in redis.scan_iter(match=f"{SERVICE_DISCOVERY_PREFIX}_*", count=500):
+        if key.startswith(SERVICE_DISCOVERY_INDEX_PREFIX):
+            continue
+        if await redis.ttl(key) == -1:
+            await redis.expire(key, settings.registration_default_ttl)
+            expired += 1
+    return expired
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def watch(redis: Redis, service_type: str, cursor: Optional[str], timeout: float, settings: BaseAppSettings):
+    """
+    Long-poll the type's change stream.
+
+    Without a cursor, or with one older than the retained history, the
+    caller gets a snapshot of the live instances and a fresh cursor to
+    resume from. Otherwise the call blocks up to *timeout* seconds and
+    returns the changes after *cursor* (possibly none).
+    """
+    stream = events_key(service_type)
+    if cursor:
+        try:
+            _stream_id(cursor)
+        except ValueError:
+            cursor = None
+
+    if cursor:
+        oldest = await redis.xrange(stream, "-", "+", count=1)
+        if not oldest or _stream_id(cursor) >= _stream_id(oldest[0][0]):
+            response = await redis.xread({stream: cursor}, count=settings.watch_batch_size, block=int(timeout * 1000))
+            events = [{"id": entry_id, **fields} for _, entries in response or [] for entry_id, fields in entries]
+            return {
+                "cursor": events[-1]["id"] if events else cursor,
+                "reset": False,
+                "events": events,
+            }
+
+    latest = await redis.xrevrange(stream, "+", "-", count=1)
+    return {
+        "cursor": latest[0][0] if latest else "0-0",
+        "reset": True,
+        "events": [],
+        "instances": await get_all(redis, service_type, settings),
+    }
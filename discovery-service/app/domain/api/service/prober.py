@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+import httpx
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from domain.api.service.constants import EVENT_DOWN, EVENT_UP, SERVICE_TYPES_KEY
+from domain.api.service.dependencies import index_key, lookup_cache, probe_key, prune_expired, publish_event
+from services.logging.logger import log as logger
+from services.metrics import SERVICE_PROBES
+from settings.base import BaseAppSettings
+
+
+class HealthProber:
+    """
+    Background health checks of every registered instance.
+
+    Each round prunes lapsed registrations, then probes all live
+    instances concurrently, never more than probe_concurrency at a time.
+    Results go to SERVICE_PROBE_<type> (registration key -> JSON) and
+    up/down transitions to the type's watch stream. An instance is down
+    after probe_failure_threshold consecutive failures and up again after
+    one success.
+    """
+
+    def __init__(self, redis: Redis, settings: BaseAppSettings):
+        self.redis = redis
+        self.settings = settings
+        self.semaphore = asyncio.Semaphore(settings.probe_concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.probe_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.probe_concurrency,
+                max_keepalive_connections=settings.probe_concurrency,
+            ),
+        )
+
+    async def check(self, instance: dict) -> Optional[float]:
+        """:return: health endpoint latency in ms, None if the instance is unreachable."""
+        url = f"http://{instance['host']}:{instance['port']}{self.settings.probe_path}"
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(url)
+            except httpx.HTTPError:
+                return None
+            if not response.is_success:
+                return None
+            return round((time.perf_counter() - started) * 1000, 1)
+
+    async def probe(self, service_type: str, key: str, instance: dict, previous: Optional[str]) -> None:
+        latency = await self.check(instance)
+        SERVICE_PROBES.labels(service_type, "up" if latency is not None else "down").inc()
+
+        state = json.loads(previous) if previous else {"up": True, "failures": 0}
+        failures = 0 if latency is not None else state["failures"] + 1
+        up = latency is not None or (state["up"] and failures < self.settings.probe_failure_threshold)
+        await self.redis.hset(
+            probe_key(service_type),
+            key,
+            json.dumps({"up": up, "latency_ms": latency, "failures": failures, "checked_at": int(time.time())}),
+        )
+        if up != state["up"]:
+            logger.info(f"{key} is {'up' if up else 'down'}")
+            await publish_event(self.redis, service_type, EVENT_UP if up else EVENT_DOWN, key, self.settings)
+            lookup_cache.invalidate(service_type)
+
+    async def probe_type(self, service_type: str) -> None:
+        await prune_expired(self.redis, service_type, self.settings)
+        if not self.settings.probe_enabled:
+            return
+        keys = await self.redis.zrangebyscore(index_key(service_type), time.time(), "+inf")
+        if not keys:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            pipe.hmget(probe_key(service_type), keys)
+            *instances, previous = await pipe.execute()
+        await asyncio.gather(*(
+            self.probe(service_type, key, instance, state)
+            for key, instance, state in zip(keys, instances, previous)
+            if instance
+        ))
+
+    async def run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                for service_type in await self.redis.smembers(SERVICE_TYPES_KEY):
+                    await self.probe_type(service_type)
+            except RedisError as e:
+                logger.warning(f"Probe round failed: {e}")
+            await asyncio.sleep(max(self.settings.probe_interval - (time.monotonic() - started), 0))
+
+    async def close(self) -> None:
+        await self.client.aclose()
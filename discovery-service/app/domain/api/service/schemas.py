@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, confloat, conint
 
 from domain.api.service.constants import SERVICE_DISCOVERY_PREFIX
 
@@ -7,6 +9,15 @@ class ServiceDiscoverySchema(BaseModel):
     host: str
     port: int
     service_type: str
+    # seconds until the registration lapses unless renewed
+    ttl: Optional[conint(gt=0)] = None
+    weight: confloat(ge=0) = 1.0
+    # load figures reported with every heartbeat
+    connections: Optional[conint(ge=0)] = None
+    # connections the instance accepts at most, REGISTRY_CONNECTIONS_CAPACITY if unset
+    capacity: Optional[conint(gt=0)] = None
+    cpu_load: Optional[confloat(ge=0)] = None
+    p99_ms: Optional[confloat(ge=0)] = None
 
     @property
     def key(self):
@@ -15,8 +26,11 @@ class ServiceDiscoverySchema(BaseModel):
     def serialize(self):
         data = {}
         for k in self.__fields__.keys():
+            value = getattr(self, k, None)
+            if value is None:
+                continue
             try:
-                data[k] = str(getattr(self, k, ""))
+                data[k] = str(value)
             except Exception as e:
                 print(e)
         return data
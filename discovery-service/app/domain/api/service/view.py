@@ -1,9 +1,11 @@
-from fastapi import Request
+from typing import Optional
+
+from fastapi import Query, Request
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
 
 from config import get_app_settings
-from domain.api.service.dependencies import create, get_all
+from domain.api.service.dependencies import create, get_all, watch
 from domain.api.service.schemas import ServiceDiscoverySchema
 
 router = InferringRouter()
@@ -17,9 +19,20 @@ class ServiceDiscovery:
     @router.get("/services")
     async def get(self, request: Request, service_type: str):
         redis = request.app.state.redis
-        return await get_all(redis, service_type)
+        return await get_all(redis, service_type, self.settings)
 
     @router.post("/services")
     async def post(self, service: ServiceDiscoverySchema, request: Request):
         redis = request.app.state.redis
-        return await create(redis, service)
+        return await create(redis, service, self.settings)
+
+    @router.get("/services/watch")
+    async def watch_changes(
+        self,
+        request: Request,
+        service_type: str,
+        cursor: Optional[str] = None,
+        timeout: float = Query(25.0, gt=0),
+    ):
+        redis = request.app.state.redis
+        return await watch(redis, service_type, cursor, min(timeout, self.settings.watch_max_timeout), self.settings)
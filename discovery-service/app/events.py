@@ -1,8 +1,13 @@
+import asyncio
 from typing import Callable
 
 from fastapi import FastAPI
+from redis.exceptions import RedisError
 from services.logging.logger import log as logger
 
+from domain.api.service.dependencies import expire_unindexed_registrations
+from domain.api.service.prober import HealthProber
+from services.metrics import monitor_runtime
 from services.redis import close_redis_connection, connect_to_redis
 from settings.base import BaseAppSettings
 
@@ -10,6 +15,16 @@ from settings.base import BaseAppSettings
 def create_start_app_handler(app: FastAPI, settings: BaseAppSettings) -> Callable:  # type: ignore
     async def start_app() -> None:
         await connect_to_redis(app, settings)
+        try:
+            expired = await expire_unindexed_registrations(app.state.redis, settings)
+        except RedisError as e:
+            logger.warning(f"Can't expire legacy registrations: {e}")
+        else:
+            if expired:
+                logger.info(f"Set expiry on {expired} registrations without a TTL")
+        app.state.runtime_monitor = asyncio.create_task(monitor_runtime(app.state.redis))
+        app.state.prober = HealthProber(app.state.redis, settings)
+        app.state.prober_task = asyncio.create_task(app.state.prober.run())
 
     return start_app
 
@@ -17,6 +32,9 @@ def create_start_app_handler(app: FastAPI, settings: BaseAppSettings) -> Callabl
 def create_stop_app_handler(app: FastAPI) -> Callable:  # type: ignore
     @logger.catch
     async def stop_app() -> None:
+        app.state.runtime_monitor.cancel()
+        app.state.prober_task.cancel()
+        await app.state.prober.close()
         await close_redis_connection(app)
 
     return stop_app
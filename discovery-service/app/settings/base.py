@@ -25,6 +25,25 @@ class BaseAppSettings(BaseSettings):
     redis_host: Optional[str] = None
     redis_port: Optional[int] = None
 
+    # service registry
+    registration_default_ttl: int = 90
+    registration_max_ttl: int = 3600
+    registry_cache_ttl: float = 1.0
+    # load figures are scaled against these to rank instances
+    registry_connections_capacity: int = 1000
+    registry_p99_budget_ms: float = 500.0
+
+    # health prober and watch API
+    probe_enabled: bool = True
+    probe_interval: float = 10.0
+    probe_timeout: float = 2.0
+    probe_concurrency: int = 20
+    probe_failure_threshold: int = 2
+    probe_path: str = "/api/v1.0/health"
+    watch_max_timeout: float = 30.0
+    watch_batch_size: int = 100
+    watch_events_maxlen: int = 1000
+
     # service root dir
     root_dir: str = Path(__file__).parent.parent.__str__()
 
@@ -1,11 +1,11 @@
 import json
 import os
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
 
 import streamlit as st
-import websocket
 
 try:
     import pandas as pd
@@ -15,6 +15,8 @@ except Exception:
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://api-service:8888")
 API_PREFIX = "/api/v1.0"
+# seconds to wait for the end of a command's output
+COMMAND_OUTPUT_TIMEOUT = float(os.getenv("COMMAND_OUTPUT_TIMEOUT", "300"))
 
 st.set_page_config(page_title="mDPU Admin", layout="wide")
 
@@ -193,11 +195,28 @@ footer,
 # -----------------------------
 # API helpers
 # -----------------------------
-def api_request(method: str, path: str, payload=None):
+def _api_url(path):
     if API_BASE_URL.endswith(API_PREFIX):
-        url = f"{API_BASE_URL}{path}"
-    else:
-        url = f"{API_BASE_URL}{API_PREFIX}{path}"
+        return f"{API_BASE_URL}{path}"
+    return f"{API_BASE_URL}{API_PREFIX}{path}"
+
+
+def _error_message(exc):
+    message = exc.read().decode("utf-8")
+    try:
+        detail = json.loads(message)
+    except json.JSONDecodeError:
+        detail = {"message": message}
+    error_message = detail.get("message")
+    if not error_message and isinstance(detail.get("detail"), str):
+        error_message = detail.get("detail")
+    if not error_message and isinstance(detail.get("detail"), list):
+        error_message = "; ".join([str(item) for item in detail.get("detail")])
+    return error_message or "Request failed"
+
+
+def api_request(method: str, path: str, payload=None):
+    url = _api_url(path)
 
     data = None
     headers = {"Content-Type": "application/json"}
@@ -215,81 +234,80 @@ def api_request(method: str, path: str, payload=None):
             return json.loads(body)
 
     except urllib.error.HTTPError as exc:
-        message = exc.read().decode("utf-8")
-        try:
-            detail = json.loads(message)
-        except json.JSONDecodeError:
-            detail = {"message": message}
-        error_message = detail.get("message")
-        if not error_message and isinstance(detail.get("detail"), str):
-            error_message = detail.get("detail")
-        if not error_message and isinstance(detail.get("detail"), list):
-            error_message = "; ".join([str(item) for item in detail.get("detail")])
-        if not error_message:
-            error_message = "Request failed"
-        raise RuntimeError(error_message) from exc
+        raise RuntimeError(_error_message(exc)) from exc
 
     except urllib.error.URLError as exc:
         raise RuntimeError("API is unavailable") from exc
 
 
-def _build_ws_url(path, channel):
-    base = API_BASE_URL
-    if base.endswith(API_PREFIX):
-        base = base[: -len(API_PREFIX)]
-    parsed = urllib.parse.urlparse(base)
-    scheme = "wss" if parsed.scheme == "https" else "ws"
-    netloc = parsed.netloc or parsed.path
-    if not netloc:
-        raise RuntimeError("Invalid API base URL")
-    return f"{scheme}://{netloc}{API_PREFIX}{path}?channel={urllib.parse.quote(channel)}"
+def run_command(channel, job=None, queue=None):
+    """Send a job or queue to one device; returns the execution record."""
+    payload = {"subscriber_uid": channel, "job": job, "queue": queue}
+    return api_request("POST", "/executions", payload)
 
 
-def parse_ws_message(message):
-    try:
-        payload = json.loads(message)
-    except json.JSONDecodeError:
-        return message
-    if isinstance(payload, dict) and "response" in payload:
-        response_value = payload["response"]
-        if isinstance(response_value, str):
-            return response_value
-        return json.dumps(response_value, ensure_ascii=False)
-    return message
-
-
-def run_ws_command(command, channel, collect_all=False):
-    url = _build_ws_url("/pub", channel)
-    try:
-        ws = websocket.create_connection(url, timeout=10)
-    except Exception as exc:
-        raise RuntimeError("WebSocket connection failed") from exc
-    try:
-        ws.send(command)
-        responses = [parse_ws_message(ws.recv())]
-        if collect_all:
-            ws.settimeout(0.5)
-            while True:
-                try:
-                    responses.append(parse_ws_message(ws.recv()))
-                except websocket.WebSocketTimeoutException:
-                    break
-        return "\n".join(responses)
-    except Exception as exc:
-        raise RuntimeError("WebSocket request failed") from exc
-    finally:
+def iter_execution_events(execution_id, timeout=COMMAND_OUTPUT_TIMEOUT):
+    """
+    Yield (event, data) from the execution's output stream until its end
+    event or *timeout* seconds. A dropped connection is resumed after the
+    last event received.
+    """
+    url = _api_url(f"/executions/{urllib.parse.quote(execution_id)}/output")
+    deadline = time.monotonic() + timeout
+    last_event_id = None
+    while time.monotonic() < deadline:
+        headers = {"Accept": "text/event-stream"}
+        if last_event_id:
+            headers["Last-Event-ID"] = last_event_id
+        request = urllib.request.Request(url, headers=headers)
         try:
-            ws.close()
-        except Exception:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                event, event_id, data = "message", None, []
+                for raw in response:
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("id:"):
+                        event_id = line[3:].strip()
+                    elif line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[5:].removeprefix(" "))
+                    elif not line:
+                        if data:
+                            last_event_id = event_id or last_event_id
+                            yield event, json.loads("\n".join(data))
+                            if event == "end":
+                                return
+                        event, event_id, data = "message", None, []
+                    if time.monotonic() >= deadline:
+                        return
+        except urllib.error.HTTPError as exc:
+            if exc.code == 404 and last_event_id:
+                # expired after it was followed
+                return
+            raise RuntimeError(_error_message(exc)) from exc
+        except (urllib.error.URLError, OSError):
             pass
-
-
-def run_job_via_ws(job_name, channel):
-    return run_ws_command(f"run job {job_name}", channel)
-
-
-def run_queue_via_ws(queue_name, channel):
-    return run_ws_command(f"run queue {queue_name}", channel, collect_all=True)
+        time.sleep(1)
+
+
+def stream_command_output(execution_id, placeholder):
+    """Render the output of an execution into *placeholder* as it arrives; returns the full text."""
+    text = ""
+    placeholder.code("Waiting for output...", language="text")
+    for event, data in iter_execution_events(execution_id):
+        if event == "end":
+            break
+        if event == "output":
+            text += data.get("text", "")
+        elif event == "exit":
+            if text and not text.endswith("\n"):
+                text += "\n"
+            text += f"[{data.get('job', '')} exited with {data.get('exit_code')}]\n"
+        placeholder.code(text or "Waiting for output...", language="text")
+    else:
+        text += "[no end of output yet, the command may still be running]\n"
+    placeholder.code(text, language="text")
+    return text
 
 
 def fetch_roles():
@@ -1781,22 +1799,27 @@ def render_job_detail():
             )
         else:
             channel_value = st.text_input("Channel", value=channel_value)
-        if st.button("Run job", use_container_width=True):
+        run = st.button("Run job", use_container_width=True)
+        response_area = st.empty()
+        if run:
             if not channel_value.strip():
                 st.error("Channel is required")
                 return
             try:
-                with st.spinner("Running job..."):
-                    response = run_job_via_ws(name, channel_value.strip())
+                execution = run_command(channel_value.strip(), job=name)
                 st.session_state.job_ws_channel = channel_value.strip()
-                st.session_state.job_ws_response = response
                 st.toast("Job command sent")
+                with response_area.container():
+                    st.markdown("#### Response")
+                    output = st.empty()
+                st.session_state.job_ws_response = stream_command_output(execution["id"], output)
             except RuntimeError as exc:
                 st.error(str(exc))
 
         if st.session_state.job_ws_response:
-            st.markdown("#### Response")
-            st.code(st.session_state.job_ws_response, language="text")
+            with response_area.container():
+                st.markdown("#### Response")
+                st.code(st.session_state.job_ws_response, language="text")
 
 
 def render_job_form(title, job=None):
@@ -2115,22 +2138,27 @@ def render_queue_detail():
         else:
             channel_value = st.text_input("Channel", value=channel_value, key="queue-run-channel-input")
 
-        if st.button("Run queue", key="run-queue-btn", use_container_width=True):
+        run = st.button("Run queue", key="run-queue-btn", use_container_width=True)
+        response_area = st.empty()
+        if run:
             if not channel_value.strip():
                 st.error("Channel is required")
                 return
             try:
-                with st.spinner("Running queue..."):
-                    response = run_queue_via_ws(name, channel_value.strip())
+                execution = run_command(channel_value.strip(), queue=name)
                 st.session_state.queue_ws_channel = channel_value.strip()
-                st.session_state.queue_ws_response = response
                 st.toast("Queue command sent")
+                with response_area.container():
+                    st.markdown("#### Response")
+                    output = st.empty()
+                st.session_state.queue_ws_response = stream_command_output(execution["id"], output)
             except RuntimeError as exc:
                 st.error(str(exc))
 
         if st.session_state.queue_ws_response:
-            st.markdown("#### Response")
-            st.code(st.session_state.queue_ws_response, language="text")
+            with response_area.container():
+                st.markdown("#### Response")
+                st.code(st.session_state.queue_ws_response, language="text")
 
 
 def render_queue_form(title, queue=None):
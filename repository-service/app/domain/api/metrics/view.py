@@ -0,0 +1,15 @@
+from fastapi import Response
+from fastapi_utils.cbv import cbv
+from fastapi_utils.inferring_router import InferringRouter
+
+from services.metrics import render_metrics
+
+router = InferringRouter()
+
+
+@cbv(router)
+class Metrics:
+    @router.get("/metrics", include_in_schema=False)
+    def get(self):
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
@@ -1,3 +1,19 @@
 REPO_ENTITY = "SERVICE_REPOSITORY"
-FILE_CHUNK_SIZE = 1024
-DOWNLOADS_FOLDER = "downloads"
+
+# software uids whose background checksum has not finished yet
+CHECKSUM_PENDING_KEY = "REPOSITORY_CHECKSUM_PENDING"
+
+CHECKSUM_PENDING = "pending"
+CHECKSUM_READY = "ready"
+CHECKSUM_FAILED = "failed"
+
+# download analytics
+DOWNLOADS_TOP_KEY = "REPOSITORY_DOWNLOADS_TOP"
+# hash per time bucket: software_uid -> downloads in that bucket
+DOWNLOADS_HISTORY_PREFIX = "REPOSITORY_DOWNLOADS"
+
+# catalog indexes
+INDEX_CREATED_KEY = "REPOSITORY_INDEX_CREATED"
+# set of software uids per checksum / per sha256 of the url
+INDEX_SHA256_PREFIX = "REPOSITORY_INDEX_SHA256"
+INDEX_URL_PREFIX = "REPOSITORY_INDEX_URL"
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import Counter
+from typing import List
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from services.logging.logger import log as logger
+
+from .constants import DOWNLOADS_HISTORY_PREFIX, DOWNLOADS_TOP_KEY, REPO_ENTITY
+
+# Counts only downloads of repositories that still exist, so a flush never
+# recreates a deleted entry.
+_FLUSH_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'number_of_downloads', ARGV[2])
+redis.call('ZINCRBY', KEYS[2], ARGV[2], ARGV[1])
+redis.call('HINCRBY', KEYS[3], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return 1
+"""
+
+
+def history_key(bucket: int) -> str:
+    return f"{DOWNLOADS_HISTORY_PREFIX}_{bucket}"
+
+
+class DownloadCounter:
+    """
+    In-process buffer of download counts.
+
+    Increments only touch a local Counter; a background loop writes the
+    totals to Redis in one pipeline every flush interval, and once more at
+    shutdown. Counts of a failed flush are put back for the next one.
+    """
+
+    def __init__(self, redis: Redis, settings):
+        self.redis = redis
+        self.interval = settings.download_flush_interval
+        self.bucket = settings.download_history_bucket
+        self.retention = settings.download_history_retention
+        self._pending: Counter = Counter()
+        self._flush = redis.register_script(_FLUSH_LUA)
+        self._lock = asyncio.Lock()
+
+    def incr(self, software_uid: str, amount: int = 1) -> None:
+        self._pending[software_uid] += amount
+
+    def pending(self, software_uid: str) -> int:
+        return self._pending.get(software_uid, 0)
+
+    async def flush(self) -> int:
+        """:return: number of repositories whose counts were written."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, Counter()
+            bucket = int(time.time()) // self.bucket * self.bucket
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for software_uid, amount in batch.items():
+                        await self._flush(
+                            keys=[f"{REPO_ENTITY}_{software_uid}", DOWNLOADS_TOP_KEY, history_key(bucket)],
+                            args=[software_uid, amount, self.retention],
+                            client=pipe,
+                        )
+                    await pipe.execute()
+            except RedisError:
+                self._pending.update(batch)
+                raise
+            return len(batch)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except RedisError as e:
+                logger.warning(f"Download counter flush failed, will retry: {e}")
+
+    def buckets(self, hours: int) -> List[int]:
+        """Start timestamps of the history buckets covering the last *hours*, oldest first."""
+        now = int(time.time())
+        current = now // self.bucket * self.bucket
+        count = max(-(-hours * 3600 // self.bucket), 1)
+        return [current - i * self.bucket for i in range(count - 1, -1, -1)]
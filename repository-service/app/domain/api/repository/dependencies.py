@@ -1,4 +1,7 @@
+import hashlib
 import logging
+import time
+from typing import Optional
 
 from fastapi.security import HTTPBasic
 from redis.asyncio.client import Redis
@@ -7,7 +10,10 @@ from redis.exceptions import ReadOnlyError, ResponseError
 from services.exceptions import RedisResponseError
 from services.utils import decode_dict, redis_key_prefix
 
-from .constants import REPO_ENTITY
+from .constants import (CHECKSUM_PENDING_KEY, DOWNLOADS_TOP_KEY,
+                        INDEX_CREATED_KEY, INDEX_SHA256_PREFIX,
+                        INDEX_URL_PREFIX, REPO_ENTITY)
+from .counters import history_key
 from .schemas import Repository
 
 security = HTTPBasic()
@@ -23,9 +29,39 @@ async def get_repository(redis: Redis, key: str):
         raise RedisResponseError(message=str(e))
 
 
-async def create_repository(redis: Redis, repo: Repository):
+def url_index_key(url: str) -> str:
+    return f"{INDEX_URL_PREFIX}_{hashlib.sha256(url.encode()).hexdigest()}"
+
+
+def sha256_index_key(sha256_checksum: str) -> str:
+    return f"{INDEX_SHA256_PREFIX}_{sha256_checksum}"
+
+
+def _index(pipe, repo: Repository, previous: Optional[dict] = None) -> None:
+    """Queue the catalog index updates of *repo*, dropping stale entries of *previous*."""
+    previous = Repository(**previous) if previous else None
+    pipe.zadd(INDEX_CREATED_KEY, {repo.software_uid: repo.created_at or time.time()}, nx=True)
+    if previous and previous.url and previous.url != repo.url:
+        pipe.srem(url_index_key(previous.url), repo.software_uid)
+    if repo.url:
+        pipe.sadd(url_index_key(repo.url), repo.software_uid)
+    if previous and previous.sha256_checksum and previous.sha256_checksum != repo.sha256_checksum:
+        pipe.srem(sha256_index_key(previous.sha256_checksum), repo.software_uid)
+    if repo.sha256_checksum:
+        pipe.sadd(sha256_index_key(repo.sha256_checksum), repo.software_uid)
+
+
+async def create_repository(redis: Redis, repo: Repository, previous: Optional[dict] = None):
+    if repo.created_at is None:
+        repo.created_at = time.time()
+    unset = [k for k in repo.__fields__.keys() if getattr(repo, k, None) is None]
     try:
-        await redis.hset(repo.repository_key, mapping=repo.serialize())
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(repo.repository_key, mapping=repo.serialize())
+            if unset:
+                pipe.hdel(repo.repository_key, *unset)
+            _index(pipe, repo, previous)
+            await pipe.execute()
     except (ResponseError, ReadOnlyError) as e:
         logging.error(str(e))
         raise RedisResponseError(message=str(e))
@@ -35,14 +71,165 @@ async def patch_repository(redis: Redis, stored_repo, updated_data):
     repo = Repository(**stored_repo)
     updated_repo = repo.copy(update=updated_data)
 
-    await create_repository(redis, updated_repo)
+    await create_repository(redis, updated_repo, previous=stored_repo)
 
     return updated_repo
 
 
-@redis_key_prefix(REPO_ENTITY)
-async def increment_number_of_downloads(redis: Redis, key: str):
+async def delete_repository(redis: Redis, stored_repo: dict) -> bool:
+    """
+    Delete a repository with its index, pending-checksum and ranking entries.
+
+    :return: True if no other repository shares its checksum, so the stored
+        artifact can be dropped too.
+    """
+    repo = Repository(**stored_repo)
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(repo.repository_key)
+            pipe.zrem(INDEX_CREATED_KEY, repo.software_uid)
+            pipe.srem(CHECKSUM_PENDING_KEY, repo.software_uid)
+            pipe.zrem(DOWNLOADS_TOP_KEY, repo.software_uid)
+            if repo.url:
+                pipe.srem(url_index_key(repo.url), repo.software_uid)
+            if repo.sha256_checksum:
+                pipe.srem(sha256_index_key(repo.sha256_checksum), repo.software_uid)
+                pipe.scard(sha256_index_key(repo.sha256_checksum))
+            result = await pipe.execute()
+    except (ResponseError, ReadOnlyError) as e:
+        logging.error(str(e))
+        raise RedisResponseError(message=str(e))
+    return bool(repo.sha256_checksum) and result[-1] == 0
+
+
+async def get_repositories(redis: Redis, software_uids: list):
+    """Repositories for many software uids in one round trip, in input order; missing ones are empty dicts."""
+    if not software_uids:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for software_uid in software_uids:
+            pipe.hgetall(f"{REPO_ENTITY}_{software_uid}")
+        return [decode_dict(repo) for repo in await pipe.execute()]
+
+
+async def list_repositories(
+    redis: Redis,
+    offset: int,
+    limit: int,
+    sha256_checksum: Optional[str] = None,
+    url: Optional[str] = None,
+    created_from: Optional[float] = None,
+    created_to: Optional[float] = None,
+):
+    """
+    Page of repositories, newest first.
+
+    Checksum and URL filters read their index sets (small by nature);
+    otherwise the creation-time index is paged directly.
+    """
+    if sha256_checksum or url:
+        sets = []
+        if sha256_checksum:
+            sets.append(sha256_index_key(sha256_checksum))
+        if url:
+            sets.append(url_index_key(url))
+        candidates = list(await redis.sinter(*sets) if len(sets) > 1 else await redis.smembers(sets[0]))
+        if candidates:
+            async with redis.pipeline(transaction=False) as pipe:
+                for software_uid in candidates:
+                    pipe.zscore(INDEX_CREATED_KEY, software_uid)
+                scores = await pipe.execute()
+        else:
+            scores = []
+        ranked = sorted(
+            (
+                (score or 0.0, software_uid)
+                for software_uid, score in zip(candidates, scores)
+                if (created_from is None or (score or 0.0) >= created_from)
+                and (created_to is None or (score or 0.0) <= created_to)
+            ),
+            reverse=True,
+        )
+        total = len(ranked)
+        software_uids = [software_uid for _, software_uid in ranked[offset:offset + limit]]
+    elif created_from is not None or created_to is not None:
+        low = "-inf" if created_from is None else created_from
+        high = "+inf" if created_to is None else created_to
+        total = await redis.zcount(INDEX_CREATED_KEY, low, high)
+        software_uids = await redis.zrevrangebyscore(INDEX_CREATED_KEY, high, low, start=offset, num=limit)
+    else:
+        total = await redis.zcard(INDEX_CREATED_KEY)
+        software_uids = await redis.zrevrange(INDEX_CREATED_KEY, offset, offset + limit - 1)
+
+    items = [Repository(**repo) for repo in await get_repositories(redis, software_uids) if repo]
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "items": items,
+    }
+
+
+async def reindex_repositories(redis: Redis) -> int:
+    """Rebuild the catalog indexes from the stored hashes; returns the number indexed."""
+    count = 0
+    async for key in redis.scan_iter(match=f"{REPO_ENTITY}_*", count=500):
+        stored = decode_dict(await redis.hgetall(key))
+        if not stored.get("software_uid"):
+            continue
+        repo = Repository(**stored)
+        async with redis.pipeline(transaction=True) as pipe:
+            if repo.created_at is None:
+                # unknown creation time: index entries from before this version as the oldest
+                repo.created_at = 0
+            _index(pipe, repo)
+            await pipe.execute()
+        count += 1
+    return count
+
+
+async def get_top_downloads(redis: Redis, limit: int):
     try:
-        await redis.hincrby(key, "number_of_downloads", 1)
+        ranked = await redis.zrevrange(DOWNLOADS_TOP_KEY, 0, limit - 1, withscores=True)
     except ResponseError as e:
         logging.error(str(e))
+        raise RedisResponseError(message=str(e))
+    return [{"software_uid": software_uid, "downloads": int(score)} for software_uid, score in ranked]
+
+
+async def get_download_history(redis: Redis, software_uid: str, buckets: list):
+    async with redis.pipeline(transaction=False) as pipe:
+        for bucket in buckets:
+            pipe.hget(history_key(bucket), software_uid)
+        counts = await pipe.execute()
+    return [{"bucket": bucket, "downloads": int(count or 0)} for bucket, count in zip(buckets, counts)]
+
+
+async def mark_checksum_pending(redis: Redis, software_uid: str):
+    await redis.sadd(CHECKSUM_PENDING_KEY, software_uid)
+
+
+async def get_pending_checksums(redis: Redis):
+    return await redis.smembers(CHECKSUM_PENDING_KEY)
+
+
+async def save_checksum_result(redis: Redis, software_uid: str, fields: dict):
+    """Store the outcome of a background checksum unless the repository is gone."""
+    key = f"{REPO_ENTITY}_{software_uid}"
+    try:
+        if await redis.exists(key):
+            async with redis.pipeline(transaction=True) as pipe:
+                values = {k: str(v) for k, v in fields.items() if v is not None}
+                if values:
+                    pipe.hset(key, mapping=values)
+                unset = [k for k, v in fields.items() if v is None]
+                if unset:
+                    pipe.hdel(key, *unset)
+                if fields.get("sha256_checksum"):
+                    pipe.sadd(sha256_index_key(fields["sha256_checksum"]), software_uid)
+                await pipe.execute()
+        await redis.srem(CHECKSUM_PENDING_KEY, software_uid)
+    except (ResponseError, ReadOnlyError) as e:
+        logging.error(str(e))
+        raise RedisResponseError(message=str(e))
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Dict
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from services.checksum import ChecksumError, StreamingHasher
+from services.logging.logger import log as logger
+
+from .constants import CHECKSUM_FAILED, CHECKSUM_READY
+from .dependencies import get_pending_checksums, get_repository, mark_checksum_pending, save_checksum_result
+
+
+class ChecksumJobs:
+    """
+    Checksums computed after POST /repo?background=true has returned.
+
+    Pending software uids are kept in Redis, so jobs cut short by a
+    restart are resumed on the next startup.
+    """
+
+    def __init__(self, redis: Redis, hasher: StreamingHasher, max_jobs: int):
+        self.redis = redis
+        self.hasher = hasher
+        self._semaphore = asyncio.Semaphore(max_jobs)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, software_uid: str, url: str) -> None:
+        await mark_checksum_pending(self.redis, software_uid)
+        self._start(software_uid, url)
+
+    def _start(self, software_uid: str, url: str) -> None:
+        if software_uid not in self._tasks:
+            self._tasks[software_uid] = asyncio.create_task(self._run(software_uid, url), name=f"checksum:{software_uid}")
+
+    async def _run(self, software_uid: str, url: str) -> None:
+        try:
+            async with self._semaphore:
+                try:
+                    result = await self.hasher.checksum(url)
+                except ChecksumError as e:
+                    logger.warning(f"Checksum of {software_uid} failed: {e}")
+                    fields = {"checksum_status": CHECKSUM_FAILED, "checksum_error": e.message}
+                else:
+                    fields = {
+                        "sha256_checksum": result.sha256,
+                        "size": result.size,
+                        "checksum_status": CHECKSUM_READY,
+                        "checksum_error": None,
+                    }
+                await save_checksum_result(self.redis, software_uid, fields)
+        except RedisError as e:
+            logger.error(f"Cannot store checksum of {software_uid}: {e}")
+        finally:
+            self._tasks.pop(software_uid, None)
+
+    def cancel(self, software_uid: str) -> None:
+        task = self._tasks.get(software_uid)
+        if task is not None:
+            task.cancel()
+
+    async def resume(self) -> None:
+        for software_uid in await get_pending_checksums(self.redis):
+            repo = await get_repository(self.redis, software_uid)
+            if repo and repo.get("url"):
+                self._start(software_uid, repo["url"])
+            else:
+                await save_checksum_result(self.redis, software_uid, {})
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
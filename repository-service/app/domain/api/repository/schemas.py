@@ -1,10 +1,10 @@
-from typing import Optional, Union
+from typing import List, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist, validator
 
-from services.utils import get_hashed_software_uid, get_sha256_checksum
+from services.utils import get_hashed_software_uid
 
-from .constants import REPO_ENTITY
+from .constants import CHECKSUM_READY, REPO_ENTITY
 
 
 class Repository(BaseModel):
@@ -15,22 +15,55 @@ class Repository(BaseModel):
     software_uid: Union[str, None] = None
     sha256_checksum: Union[str, None] = None
     number_of_downloads: Optional[int] = 0
+    size: Optional[int] = None
+    checksum_status: Union[str, None] = None
+    checksum_error: Union[str, None] = None
+    created_at: Optional[float] = None
+
+    @validator("*", pre=True)
+    def stored_none(cls, value):
+        # older entries stored missing values as the string "None"
+        return None if value == "None" else value
 
     def calculate_software_uid(self):
         self.software_uid = get_hashed_software_uid(self.url, self.password)
 
-    def calculate_sha256_checksum(self):
-        self.sha256_checksum = get_sha256_checksum(self.url)
+    async def calculate_sha256_checksum(self, hasher):
+        result = await hasher.checksum(self.url)
+        self.sha256_checksum = result.sha256
+        self.size = result.size
+        self.checksum_status = CHECKSUM_READY
 
     @property
     def repository_key(self):
         return f"{REPO_ENTITY}_{self.software_uid}"
 
     def serialize(self):
+        """Field values as strings; unset (None) fields are left out."""
         data = {}
         for k in self.__fields__.keys():
+            value = getattr(self, k, None)
+            if value is None:
+                continue
             try:
-                data[k] = str(getattr(self, k, ""))
+                data[k] = str(value)
             except Exception as e:
                 print(e)
         return data
+
+
+class RepositoryBatchLookup(BaseModel):
+    software_uids: conlist(str, min_items=1, max_items=500)
+
+
+class RepositoryBatch(BaseModel):
+    items: List[Repository]
+    missing: List[str]
+
+
+class RepositoryPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    next_offset: Optional[int] = None
+    items: List[Repository]
@@ -1,13 +1,25 @@
-from fastapi import Request
-from fastapi.responses import JSONResponse
+import asyncio
+from pathlib import PurePosixPath
+from typing import Optional
+from urllib.parse import urlparse
+
+from fastapi import Query, Request
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
 
 from config import get_app_settings
+from services.artifacts import artifact_response
+from services.checksum import ArtifactNotFound, ChecksumError
 
-from .dependencies import (create_repository, get_repository,
-                           increment_number_of_downloads, patch_repository)
-from .schemas import Repository
+from .constants import CHECKSUM_FAILED, CHECKSUM_PENDING
+from .dependencies import (create_repository, delete_repository,
+                           get_download_history, get_repositories,
+                           get_repository, get_top_downloads,
+                           list_repositories, patch_repository,
+                           reindex_repositories)
+from .schemas import (Repository, RepositoryBatch, RepositoryBatchLookup,
+                      RepositoryPage)
 
 router = InferringRouter()
 
@@ -17,27 +29,68 @@ class RepositoryView:
     settings = get_app_settings()
 
     @router.post("/repo", response_model=Repository)
-    async def post(self, repository: Repository, request: Request):
+    async def post(self, repository: Repository, request: Request, background: bool = False):
         redis = request.app.state.redis
         repository.calculate_software_uid()
-        repository.calculate_sha256_checksum()
 
-        if repository.sha256_checksum:
-            if await get_repository(redis, repository.software_uid):
-                return JSONResponse(
-                    status_code=400,
-                    content={
-                        "message": f"Repository object with software_uid {repository.software_uid} already exists"
-                    },
-                )
+        if await get_repository(redis, repository.software_uid):
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "message": f"Repository object with software_uid {repository.software_uid} already exists"
+                },
+            )
 
+        if background:
+            repository.checksum_status = CHECKSUM_PENDING
             await create_repository(redis, repository)
-            return repository
+            await request.app.state.checksum_jobs.submit(repository.software_uid, repository.url)
+            return JSONResponse(status_code=202, content=repository.dict())
 
-        return JSONResponse(
-            status_code=404,
-            content={"message": f"File object with url = {repository.url} is not found"},
-        )
+        try:
+            await repository.calculate_sha256_checksum(request.app.state.hasher)
+        except ArtifactNotFound as e:
+            return JSONResponse(status_code=404, content={"message": e.message})
+        except ChecksumError as e:
+            return JSONResponse(status_code=502, content={"message": e.message})
+
+        await create_repository(redis, repository)
+        return repository
+
+    @router.get("/repo", response_model=RepositoryPage)
+    async def list_all(
+        self,
+        request: Request,
+        offset: int = Query(0, ge=0),
+        limit: int = Query(50, ge=1, le=500),
+        sha256_checksum: Optional[str] = None,
+        url: Optional[str] = None,
+        created_from: Optional[float] = None,
+        created_to: Optional[float] = None,
+    ):
+        redis = request.app.state.redis
+        return await list_repositories(redis, offset, limit, sha256_checksum, url, created_from, created_to)
+
+    @router.post("/repo/batch", response_model=RepositoryBatch)
+    async def batch(self, lookup: RepositoryBatchLookup, request: Request):
+        redis = request.app.state.redis
+        counter = request.app.state.download_counter
+
+        software_uids = list(dict.fromkeys(lookup.software_uids))
+        items, missing = [], []
+        for software_uid, repo in zip(software_uids, await get_repositories(redis, software_uids)):
+            if not repo:
+                missing.append(software_uid)
+                continue
+            counter.incr(software_uid)
+            repo["number_of_downloads"] = int(repo.get("number_of_downloads") or 0) + counter.pending(software_uid)
+            items.append(repo)
+        return {"items": items, "missing": missing}
+
+    @router.post("/repo/reindex")
+    async def reindex(self, request: Request):
+        redis = request.app.state.redis
+        return {"indexed": await reindex_repositories(redis)}
 
     @router.get("/repo/{software_uid}", response_model=Repository)
     async def get(self, software_uid: str, request: Request):
@@ -49,10 +102,69 @@ class RepositoryView:
                 status_code=404,
                 content={"message": f"Repository object with software_uid {software_uid} is not found"},
             )
-        await increment_number_of_downloads(redis, software_uid)
-        repo["number_of_downloads"] = int(repo["number_of_downloads"]) + 1
+        counter = request.app.state.download_counter
+        counter.incr(software_uid)
+        repo["number_of_downloads"] = int(repo["number_of_downloads"]) + counter.pending(software_uid)
         return repo
 
+    @router.get("/repo/downloads/top")
+    async def top_downloads(self, request: Request, limit: int = Query(10, ge=1, le=1000)):
+        redis = request.app.state.redis
+        return await get_top_downloads(redis, limit)
+
+    @router.get("/repo/{software_uid}/downloads")
+    async def download_history(self, software_uid: str, request: Request, hours: int = Query(24, ge=1, le=24 * 90)):
+        redis = request.app.state.redis
+        counter = request.app.state.download_counter
+        if not await get_repository(redis, software_uid):
+            return JSONResponse(
+                status_code=404,
+                content={"message": f"Repository object with software_uid {software_uid} is not found"},
+            )
+        return {
+            "software_uid": software_uid,
+            "bucket_seconds": counter.bucket,
+            "history": await get_download_history(redis, software_uid, counter.buckets(hours)),
+        }
+
+    @router.api_route("/repo/{software_uid}/download", methods=["GET", "HEAD"])
+    async def download(self, software_uid: str, request: Request):
+        redis = request.app.state.redis
+
+        repo = await get_repository(redis, software_uid)
+        if not repo:
+            return JSONResponse(
+                status_code=404,
+                content={"message": f"Repository object with software_uid {software_uid} is not found"},
+            )
+        digest = repo.get("sha256_checksum")
+        if repo.get("checksum_status") in (CHECKSUM_PENDING, CHECKSUM_FAILED) or digest in (None, "", "None"):
+            return JSONResponse(
+                status_code=409,
+                content={"message": f"Checksum of repository object with software_uid {software_uid} is not ready"},
+            )
+
+        store = request.app.state.artifact_store
+        if store is None:
+            return RedirectResponse(repo["url"], status_code=307)
+        filename = PurePosixPath(urlparse(repo["url"]).path).name or digest
+        # a file evicted between the fetch and the open is fetched once more
+        for _ in range(2):
+            try:
+                path = await store.fetch(digest, repo["url"], request.app.state.hasher)
+            except ArtifactNotFound as e:
+                return JSONResponse(status_code=404, content={"message": e.message})
+            except ChecksumError as e:
+                return JSONResponse(status_code=502, content={"message": e.message})
+            try:
+                return await artifact_response(path, digest, filename, request.headers, self.settings)
+            except FileNotFoundError:
+                continue
+        return JSONResponse(
+            status_code=503,
+            content={"message": f"File of repository object with software_uid {software_uid} was evicted, retry later"},
+        )
+
     @router.patch("/repo/{software_uid}", response_model=Repository)
     async def patch(self, software_uid: str, repo_to_update: Repository, request: Request):
         redis = request.app.state.redis
@@ -69,7 +181,21 @@ class RepositoryView:
 
     @router.delete("/repo/{software_uid}")
     async def delete(self, software_uid: str, request: Request):
+        redis = request.app.state.redis
+
+        repo = await get_repository(redis, software_uid)
+        if not repo:
+            return JSONResponse(
+                status_code=404,
+                content={"message": f"Repository object with software_uid {software_uid} is not found"},
+            )
+        request.app.state.checksum_jobs.cancel(software_uid)
+        last_reference = await delete_repository(redis, repo)
+
+        store = request.app.state.artifact_store
+        if last_reference and store is not None:
+            await asyncio.to_thread(store.remove, repo["sha256_checksum"])
         return JSONResponse(
             status_code=200,
-            content={"message": "Mock for delete method"},
+            content={"message": f"Repository object with software_uid {software_uid} is deleted"},
         )
@@ -1,9 +1,18 @@
+import asyncio
 from typing import Callable
 
 from fastapi import FastAPI
+from redis.exceptions import RedisError
 from services.logging.logger import log as logger
 
-from services.discovery.register import register_service
+from domain.api.repository.constants import INDEX_CREATED_KEY
+from domain.api.repository.counters import DownloadCounter
+from domain.api.repository.dependencies import reindex_repositories
+from domain.api.repository.jobs import ChecksumJobs
+from services.artifacts import ArtifactStore
+from services.checksum import StreamingHasher
+from services.discovery.register import DiscoveryRegistrar
+from services.metrics import monitor_runtime
 from services.redis import close_redis_connection, connect_to_redis
 from settings.base import BaseAppSettings
 from services.scheduler import shutdown_scheduler, start_scheduler
@@ -12,7 +21,26 @@ from services.scheduler import shutdown_scheduler, start_scheduler
 def create_start_app_handler(app: FastAPI, settings: BaseAppSettings) -> Callable:  # type: ignore
     async def start_app() -> None:
         await connect_to_redis(app, settings)
-        start_scheduler(app, func=register_service, args=[settings])
+        app.state.runtime_monitor = asyncio.create_task(monitor_runtime(app.state.redis))
+        app.state.artifact_store = None
+        if settings.artifact_store_enabled:
+            app.state.artifact_store = ArtifactStore(settings.artifact_store_dir, settings.artifact_store_max_bytes)
+            await asyncio.to_thread(app.state.artifact_store.clear_partials)
+        try:
+            if not await app.state.redis.exists(INDEX_CREATED_KEY):
+                logger.info(f"Indexed {await reindex_repositories(app.state.redis)} repositories")
+        except RedisError as e:
+            logger.warning(f"Can't build the repository index: {e}")
+        app.state.hasher = StreamingHasher(settings, app.state.artifact_store)
+        app.state.checksum_jobs = ChecksumJobs(app.state.redis, app.state.hasher, settings.checksum_max_jobs)
+        try:
+            await app.state.checksum_jobs.resume()
+        except RedisError as e:
+            logger.warning(f"Can't resume pending checksums: {e}")
+        app.state.download_counter = DownloadCounter(app.state.redis, settings)
+        app.state.download_flusher = asyncio.create_task(app.state.download_counter.run())
+        app.state.registrar = DiscoveryRegistrar(settings)
+        start_scheduler(app, func=app.state.registrar.register, interval=settings.register_service_interval)
 
     return start_app
 
@@ -20,7 +48,16 @@ def create_start_app_handler(app: FastAPI, settings: BaseAppSettings) -> Callabl
 def create_stop_app_handler(app: FastAPI) -> Callable:  # type: ignore
     @logger.catch
     async def stop_app() -> None:
+        app.state.runtime_monitor.cancel()
+        await app.state.checksum_jobs.stop()
+        await app.state.hasher.close()
+        app.state.download_flusher.cancel()
+        try:
+            await app.state.download_counter.flush()
+        except RedisError as e:
+            logger.error(f"Download counts lost at shutdown: {e}")
         await close_redis_connection(app)
         shutdown_scheduler(app)
+        await app.state.registrar.close()
 
     return stop_app
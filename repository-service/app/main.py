@@ -5,10 +5,11 @@ from starlette.exceptions import HTTPException
 from starlette.middleware.cors import CORSMiddleware
 
 from config import get_app_settings
-from domain.api import routers
+from domain.api import metrics_router, routers
 from events import create_start_app_handler, create_stop_app_handler
 from exceptions.handlers.http_error import http_error_handler
 from exceptions.handlers.validation_error import http422_error_handler
+from services.metrics import PrometheusMiddleware
 from settings.base import BaseAppSettings
 
 settings = get_app_settings()
@@ -26,6 +27,8 @@ def get_application(settings: BaseAppSettings) -> FastAPI:
         allow_headers=["*"],
     )
 
+    application.add_middleware(PrometheusMiddleware)
+
     application.add_event_handler(
         "startup",
         create_start_app_handler(application, settings),
@@ -41,6 +44,8 @@ def get_application(settings: BaseAppSettings) -> FastAPI:
     for router in routers:
         application.include_router(router, prefix="/api/v1.0")
 
+    application.include_router(metrics_router)
+
     return application
 
 
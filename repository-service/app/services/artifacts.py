@@ -0,0 +1,266 @@
+"""
+Content-addressed artifact store and its download responses.
+
+Files live at ``<root>/sha256/<ab>/<sha256>``, downloads in progress under
+``<root>/.partial``. A file's mtime marks its last use: lookups refresh it
+and eviction removes the least recently used files once the store grows
+past its byte budget.
+"""
+import asyncio
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+
+from services.checksum import ChecksumError
+from services.logging.logger import log as logger
+
+# lookups refresh mtime at most this often
+_TOUCH_INTERVAL = 60
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class ArtifactStore:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.partial_dir = self.root / ".partial"
+        self.objects_dir = self.root / "sha256"
+        self._fetches: Dict[str, asyncio.Task] = {}
+
+    def path_for(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def new_partial(self) -> Path:
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        return self.partial_dir / uuid.uuid4().hex
+
+    def commit(self, partial: Path, digest: str) -> Path:
+        target = self.path_for(digest)
+        if target.exists():
+            # same content already stored
+            partial.unlink(missing_ok=True)
+            self.touch(target)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(partial, target)
+            self.evict(keep=target)
+        return target
+
+    def discard(self, partial: Optional[Path]) -> None:
+        if partial is not None:
+            partial.unlink(missing_ok=True)
+
+    def remove(self, digest: str) -> bool:
+        path = self.path_for(digest)
+        if not path.exists():
+            return False
+        path.unlink(missing_ok=True)
+        return True
+
+    def clear_partials(self) -> None:
+        """Drop downloads left unfinished by a previous process."""
+        shutil.rmtree(self.partial_dir, ignore_errors=True)
+
+    def touch(self, path: Path) -> None:
+        if time.time() - path.stat().st_mtime > _TOUCH_INTERVAL:
+            os.utime(path)
+
+    def lookup(self, digest: str) -> Optional[Path]:
+        path = self.path_for(digest)
+        try:
+            self.touch(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def usage(self) -> Tuple[int, int]:
+        """:return: number of stored files and their total size in bytes."""
+        files = total = 0
+        for path in self.objects_dir.glob("*/*"):
+            files += 1
+            total += path.stat().st_size
+        return files, total
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        Remove least recently used files until the store fits its budget.
+
+        :return: number of bytes freed.
+        """
+        entries = []
+        for path in self.objects_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            # open downloads keep reading the unlinked file
+            path.unlink(missing_ok=True)
+            freed += size
+            logger.info(f"Evicted artifact {path.name} ({size} bytes)")
+        return freed
+
+    async def fetch(self, digest: str, url: str, hasher) -> Path:
+        """
+        Local path of the artifact with *digest*, pulled from *url* first if
+        missing. Concurrent callers for one digest share a single download,
+        and content whose hash differs from *digest* is rejected.
+        """
+        path = await asyncio.to_thread(self.lookup, digest)
+        if path is not None:
+            return path
+        task = self._fetches.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._ingest(digest, url, hasher))
+            self._fetches[digest] = task
+            task.add_done_callback(lambda _: self._fetches.pop(digest, None))
+        # a caller that disconnects must not cancel the others' download
+        return await asyncio.shield(task)
+
+    async def _ingest(self, digest: str, url: str, hasher) -> Path:
+        result = await hasher.checksum(url)
+        if result.sha256 != digest:
+            raise ChecksumError(f"Content of {url} has sha256 {result.sha256}, expected {digest}")
+        return result.path
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    :return: inclusive (start, end) of a single byte range, or None to send
+        the whole file (no header, several ranges or a malformed header).
+    :raises RangeNotSatisfiable: the range lies outside the file.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if header is None:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ArtifactResponse(Response):
+    """
+    Byte range of an open stored file, closed once sent. Uses the ASGI
+    zero-copy send extension when the server offers it and reads bounded
+    chunks otherwise.
+    """
+
+    def __init__(self, file: BinaryIO, start: int, end: int, status_code: int, headers: Mapping[str, str], chunk_size: int):
+        self.file = file
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.chunk_size = chunk_size
+        self.media_type = "application/octet-stream"
+        self.background = None
+        self.init_headers({**headers, "content-length": str(end - start + 1)})
+
+    async def __call__(self, scope, receive, send) -> None:
+        async with anyio.wrap_file(self.file) as file:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            count = self.end - self.start + 1
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file,
+                    "offset": self.start,
+                    "count": count,
+                })
+                return
+
+            await file.seek(self.start)
+            while count > 0:
+                chunk = await file.read(min(self.chunk_size, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+
+async def artifact_response(path: Path, digest: str, filename: str, request_headers: Mapping[str, str],
+                            settings) -> Response:
+    """
+    Answer a download of a stored artifact: conditional requests by ETag
+    (the digest), single byte ranges with If-Range, and optional hand-off
+    to nginx through X-Accel-Redirect.
+
+    :raises FileNotFoundError: the file was evicted since it was looked up.
+    """
+    etag = f'"{digest}"'
+    headers = {
+        "etag": etag,
+        "accept-ranges": "bytes",
+        "cache-control": f"public, max-age={settings.artifact_cache_max_age}",
+        "content-disposition": f'attachment; filename="{filename}"',
+    }
+
+    if_match = request_headers.get("if-match")
+    if if_match is not None and not _etag_matches(if_match, etag):
+        return Response(status_code=412, headers=headers)
+    if _etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.artifact_accel_redirect_prefix:
+        # nginx serves the file with sendfile and handles ranges itself
+        location = f"{settings.artifact_accel_redirect_prefix.rstrip('/')}/{digest[:2]}/{digest}"
+        return Response(headers={**headers, "x-accel-redirect": location}, media_type="application/octet-stream")
+
+    # opened before the response starts, so a later eviction cannot cut it off
+    file = await asyncio.to_thread(open, path, "rb")
+    size = os.fstat(file.fileno()).st_size
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        # the client holds a different version, send it the whole file
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        file.close()
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+    if byte_range is None or size == 0:
+        return ArtifactResponse(file, 0, size - 1, 200, headers, settings.artifact_chunk_size)
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return ArtifactResponse(file, start, end, 206, headers, settings.artifact_chunk_size)
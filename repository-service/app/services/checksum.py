@@ -0,0 +1,177 @@
+"""
+Streaming SHA-256 of remote artifacts.
+
+Artifacts are hashed chunk by chunk as they arrive, so memory use does not
+depend on their size. Given an artifact store, each download is also kept
+there under its digest. The store also lets large files be fetched as
+concurrent byte ranges, written in place and hashed from disk afterwards.
+"""
+import asyncio
+import hashlib
+import math
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import httpx
+
+from services.logging.logger import log as logger
+
+
+class ChecksumError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
+
+
+class ArtifactNotFound(ChecksumError):
+    """The artifact URL did not answer with the file."""
+
+
+@dataclass
+class ChecksumResult:
+    sha256: str
+    size: int
+    # stored copy, None without an artifact store
+    path: Optional[Path] = None
+
+
+def _hash_file(path: Path, chunk_size: int) -> Tuple[str, int]:
+    sha256, size = hashlib.sha256(), 0
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+async def _pwrite(fd: int, chunk: bytes, offset: int) -> None:
+    """
+    Write *chunk* at *offset* in a thread. A cancelled caller still waits
+    for the write, so the descriptor is never closed under it.
+    """
+    write = asyncio.ensure_future(asyncio.to_thread(os.pwrite, fd, chunk, offset))
+    try:
+        await asyncio.shield(write)
+    except asyncio.CancelledError:
+        await asyncio.wait([write])
+        raise
+
+
+class StreamingHasher:
+    def __init__(self, settings, store=None):
+        self.store = store
+        self.chunk_size = settings.checksum_chunk_size
+        self.parallel = settings.checksum_parallel_ranges
+        self.parallel_threshold = settings.checksum_parallel_threshold
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.checksum_read_timeout, connect=settings.checksum_connect_timeout),
+            follow_redirects=True,
+        )
+
+    async def checksum(self, url: str) -> ChecksumResult:
+        """
+        :raises ArtifactNotFound: the server did not return the file.
+        :raises ChecksumError: the download failed or timed out.
+        """
+        try:
+            async with self.client.stream("GET", url) as response:
+                self._ensure_found(response, url)
+                length = int(response.headers.get("content-length") or 0)
+                if not self._use_ranges(response, length):
+                    return await self._sequential(response)
+            # leaving the block above dropped the full-body response unread
+            try:
+                return await self._ranged(url, length)
+            except ChecksumError as e:
+                logger.warning(f"Ranged download of {url} failed ({e}), retrying sequentially")
+            async with self.client.stream("GET", url) as response:
+                self._ensure_found(response, url)
+                return await self._sequential(response)
+        except httpx.TimeoutException as e:
+            raise ChecksumError(f"Timed out downloading {url}: {e!r}")
+        except httpx.HTTPError as e:
+            raise ChecksumError(f"Cannot download {url}: {e!r}")
+
+    @staticmethod
+    def _ensure_found(response: httpx.Response, url: str) -> None:
+        if response.status_code != 200:
+            raise ArtifactNotFound(f"File object with url = {url} is not found")
+
+    def _use_ranges(self, response: httpx.Response, length: int) -> bool:
+        return (
+            self.store is not None
+            and self.parallel > 1
+            and length >= self.parallel_threshold
+            and response.headers.get("accept-ranges", "").lower() == "bytes"
+        )
+
+    async def _sequential(self, response: httpx.Response) -> ChecksumResult:
+        sha256, size = hashlib.sha256(), 0
+        if self.store is None:
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                sha256.update(chunk)
+                size += len(chunk)
+            return ChecksumResult(sha256=sha256.hexdigest(), size=size)
+
+        partial = await asyncio.to_thread(self.store.new_partial)
+        try:
+            with open(partial, "wb") as file:
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(file.write, chunk)
+            digest = sha256.hexdigest()
+            path = await asyncio.to_thread(self.store.commit, partial, digest)
+        except BaseException:
+            self.store.discard(partial)
+            raise
+        return ChecksumResult(sha256=digest, size=size, path=path)
+
+    async def _ranged(self, url: str, length: int) -> ChecksumResult:
+        partial = await asyncio.to_thread(self.store.new_partial)
+        part = max(math.ceil(length / self.parallel), self.chunk_size)
+
+        async def fetch(fd: int, start: int, end: int) -> None:
+            headers = {"Range": f"bytes={start}-{end}"}
+            offset = start
+            try:
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    if response.status_code != 206:
+                        raise ChecksumError(f"range request answered with {response.status_code}")
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        await _pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+            except httpx.HTTPError as e:
+                # a ChecksumError makes the caller retry sequentially
+                raise ChecksumError(f"range {start}-{end} failed: {e!r}")
+            if offset != end + 1:
+                raise ChecksumError(f"range {start}-{end} ended at byte {offset}")
+
+        try:
+            fd = os.open(partial, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, length)
+                # a failed range cancels its siblings before the file is closed
+                async with asyncio.TaskGroup() as group:
+                    for start in range(0, length, part):
+                        group.create_task(fetch(fd, start, min(start + part, length) - 1))
+            finally:
+                os.close(fd)
+            digest, size = await asyncio.to_thread(_hash_file, partial, self.chunk_size)
+            path = await asyncio.to_thread(self.store.commit, partial, digest)
+        except BaseExceptionGroup as group:
+            self.store.discard(partial)
+            # surface the first failure as the caller expects a plain exception
+            raise group.exceptions[0]
+        except BaseException:
+            self.store.discard(partial)
+            raise
+        return ChecksumResult(sha256=digest, size=size, path=path)
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -1,12 +1,70 @@
-import requests
+import asyncio
+import random
+
+import httpx
 from services.logging.logger import log as logger
 
 
-def register_service(settings):
-    try:
-        response = requests.post(
-            url=settings.discovery_url,
-            json={"host": settings.server_host, "port": settings.server_port, "service_type": "repo"})
-        logger.info(f"Server registration status: {response.status_code}; message: {response.text}")
-    except Exception as e:
-        logger.exception(e)
+class DiscoveryRegistrar:
+    """
+    Registers this instance with the discovery server.
+
+    Uses one keep-alive connection with bounded timeouts, so a slow
+    discovery server costs a few awaited seconds at most and never blocks
+    the event loop. Each registration carries a TTL and doubles as a
+    heartbeat: the entry lapses if heartbeats stop.
+    """
+
+    def __init__(self, settings, service_type: str = "repo"):
+        self.settings = settings
+        self.service_type = service_type
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.discovery_timeout, connect=settings.discovery_connect_timeout),
+            limits=httpx.Limits(
+                max_connections=2,
+                max_keepalive_connections=1,
+                keepalive_expiry=settings.register_service_interval * 2,
+            ),
+        )
+
+    def payload(self) -> dict:
+        return {
+            "host": self.settings.server_host,
+            "port": self.settings.server_port,
+            "service_type": self.service_type,
+            "ttl": self.settings.discovery_registration_ttl,
+        }
+
+    async def register(self) -> bool:
+        """
+        Send one heartbeat, retrying transient failures with exponential
+        backoff and jitter.
+
+        :return: True if the discovery server accepted the registration.
+        """
+        delay = self.settings.discovery_backoff_base
+        attempts = self.settings.discovery_max_attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                response = await self.client.post(self.settings.discovery_url, json=self.payload())
+                if 200 <= response.status_code < 300:
+                    logger.info(f"Server registration status: {response.status_code}")
+                    return True
+                logger.warning(
+                    f"Unexpected registration status: {response.status_code}; message: {response.text}"
+                )
+                if response.status_code < 500:
+                    # the request itself is wrong, retrying will not help
+                    return False
+            except httpx.HTTPError as e:
+                logger.warning(f"Server registration attempt {attempt}/{attempts} failed: {e!r}")
+
+            if attempt < attempts:
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, self.settings.discovery_backoff_max)
+
+        logger.error(f"Server registration failed after {attempts} attempts")
+        return False
+
+    async def close(self) -> None:
+        await self.client.aclose()
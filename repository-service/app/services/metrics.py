@@ -0,0 +1,140 @@
+"""
+Prometheus metrics.
+
+When PROMETHEUS_MULTIPROC_DIR is set (several server processes) samples
+are merged from that directory; otherwise the process registry is served.
+"""
+import asyncio
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from services.logging.logger import log as logger
+
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served",
+    ["method"], multiprocess_mode="livesum",
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis command and pipeline latency",
+    ["command"], buckets=_FAST_BUCKETS,
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Redis connection pool usage",
+    ["state"], multiprocess_mode="livesum",
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay of a periodic event-loop wakeup past its deadline",
+    buckets=_FAST_BUCKETS,
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds", "Duration of scheduled jobs",
+    ["job", "outcome"], buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+def render_metrics() -> tuple:
+    """
+    :return: (body, content type) for the /metrics response.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """
+    Pure ASGI middleware recording request latency by route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+
+
+async def monitor_runtime(redis, interval: float = 1.0) -> None:
+    """
+    Sample event-loop lag and Redis pool usage.
+    """
+    pool = redis.connection_pool
+    while True:
+        deadline = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(time.perf_counter() - deadline, 0.0))
+        try:
+            REDIS_POOL_CONNECTIONS.labels("in_use").set(len(getattr(pool, "_in_use_connections", ())))
+            REDIS_POOL_CONNECTIONS.labels("idle").set(len(getattr(pool, "_available_connections", ())))
+            REDIS_POOL_CONNECTIONS.labels("max").set(pool.max_connections)
+        except Exception as e:
+            logger.debug("Cannot sample redis pool: %s", e)
+
+
+def timed_job(name: str, func):
+    """Wrap a scheduler job, sync or async, to record its duration."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started, outcome = time.perf_counter(), "success"
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                SCHEDULER_JOB_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started, outcome = time.perf_counter(), "success"
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            SCHEDULER_JOB_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+    return wrapper
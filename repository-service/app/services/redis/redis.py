@@ -1,14 +1,40 @@
 from fastapi import FastAPI
 from services.logging.logger import log as logger
-from redis.asyncio.client import Redis
+import time
+
+from redis.asyncio.client import Pipeline, Redis
 from redis.exceptions import ConnectionError
 
+from services.metrics import REDIS_COMMAND_DURATION
 from settings.base import BaseAppSettings
 
 
+class MeteredPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(time.perf_counter() - started)
+
+
+class MeteredRedis(Redis):
+    """Redis client reporting command latency to Prometheus."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return MeteredPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 async def connect_to_redis(app: FastAPI, settings: BaseAppSettings) -> None:
     logger.info("Connecting to Redis")
-    app.state.redis = Redis.from_url(settings.redis_url, decode_responses=True)
+    app.state.redis = MeteredRedis.from_url(settings.redis_url, decode_responses=True)
     try:
         await app.state.redis.ping()
     except ConnectionError:
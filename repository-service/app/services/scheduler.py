@@ -1,13 +1,19 @@
+from datetime import datetime
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import FastAPI
 from services.logging.logger import log as logger
+from services.metrics import timed_job
 
 
-def start_scheduler(app: FastAPI, func=None, args=None) -> None:
+def start_scheduler(app: FastAPI, func=None, args=None, interval: int = 30) -> None:
     logger.info("Starting the scheduler")
     app.scheduler = AsyncIOScheduler()
 
-    app.scheduler.add_job(func, args=args, trigger="cron", second="*/30")
+    app.scheduler.add_job(
+        timed_job(func.__name__, func), args=args, trigger="interval", seconds=interval,
+        jitter=interval / 10, max_instances=1, coalesce=True, next_run_time=datetime.now(),
+    )
     app.scheduler.start()
     logger.info("Scheduler started")
 
@@ -1,16 +1,7 @@
-import hashlib
-import os
 import uuid
 from functools import wraps
-from http import HTTPStatus
-from io import BytesIO
 from typing import Callable
 
-import requests
-
-from domain.api.repository.constants import (DOWNLOADS_FOLDER,
-                                                 FILE_CHUNK_SIZE)
-
 
 def redis_key_prefix(prefix: str):
     """Add prefix to the 'redis key' function argument"""
@@ -54,20 +45,3 @@ def decode_dict(dct: dict) -> dict:
 def get_hashed_software_uid(url, password):
     return uuid.uuid5(uuid.NAMESPACE_DNS, url + password).hex
 
-
-def get_sha256_checksum(file_url):
-    response = requests.get(file_url, stream=True)
-    if response.status_code == HTTPStatus.OK:
-        if not os.path.exists(DOWNLOADS_FOLDER):
-            # Create a new directory because it does not exist
-            os.makedirs(DOWNLOADS_FOLDER)
-
-        file = BytesIO()
-        for chunk in response.iter_content(chunk_size=FILE_CHUNK_SIZE):
-            if chunk:
-                file.write(chunk)
-        sha256_checksum = hashlib.sha256(file.read()).hexdigest()
-        file.close()
-
-        return sha256_checksum
-    return None
@@ -24,6 +24,13 @@ class BaseAppSettings(BaseSettings):
 
     discovery_service_host: str
     discovery_service_port: int
+    discovery_timeout: float = 2.0
+    discovery_connect_timeout: float = 1.0
+    discovery_max_attempts: int = 3
+    discovery_backoff_base: float = 0.5
+    discovery_backoff_max: float = 5.0
+    discovery_registration_ttl: int = 90
+    register_service_interval: int = 30
 
     server_host: str
     server_port: int
@@ -33,6 +40,30 @@ class BaseAppSettings(BaseSettings):
         return f"http://{self.discovery_service_host}:{self.discovery_service_port}/api/v1.0/services"
 
 
+    # artifact checksums
+    checksum_chunk_size: int = 1024 * 1024
+    checksum_connect_timeout: float = 5.0
+    checksum_read_timeout: float = 30.0
+    # files at least this large are fetched as concurrent byte ranges
+    checksum_parallel_threshold: int = 64 * 1024 * 1024
+    checksum_parallel_ranges: int = 4
+    checksum_max_jobs: int = 2
+
+    # buffered download counters
+    download_flush_interval: float = 5.0
+    download_history_bucket: int = 3600
+    download_history_retention: int = 90 * 86400
+
+    # local content-addressed artifact store, also used to spool checksum downloads
+    artifact_store_enabled: bool = True
+    artifact_store_dir: str = "downloads"
+    artifact_store_max_bytes: int = 20 * 1024 ** 3
+    artifact_chunk_size: int = 256 * 1024
+    artifact_cache_max_age: int = 86400
+    # internal nginx location serving artifact_store_dir/sha256; downloads are
+    # then handed off with X-Accel-Redirect
+    artifact_accel_redirect_prefix: Optional[str] = None
+
     redis_user: Optional[str] = None
     redis_pass: Optional[str] = None
     redis_host: Optional[str] = None
@@ -240,14 +240,16 @@ func main() {
 			ws.InitWS(cur.SubscriberUID)
 			go func(uid string) {
 				for {
-					if err := ws.ListenWS(); err != nil {
-						logx.Infof("WebSocket listen error: %v. Reconnecting in %s...", err, constants.WSReconnectDelay)
+					err := ws.ListenWS()
+					delay := ws.ReconnectDelay(err)
+					if err != nil {
+						logx.Infof("WebSocket listen error: %v. Reconnecting in %s...", err, delay)
 					}
 					select {
 					case <-appCtx.Done():
 						logx.Infof("Shutting down WebSocket listener")
 						return
-					case <-time.After(constants.WSReconnectDelay):
+					case <-time.After(delay):
 						ws.InitWS(uid)
 					}
 				}
@@ -292,9 +294,9 @@ func main() {
 	}
 
 	defer func() {
-		if global.WSConn != nil {
+		if conn := global.CurrentWSConn(); conn != nil {
 			logx.Debugf("Closing WebSocket connection")
-			global.WSConn.Close()
+			conn.Close()
 		}
 	}()
 
@@ -23,6 +23,7 @@ const (
 	ZeroMAC      = "00:00:00:00:00:00"
 
 	EveryBoot = "every_boot"
+	FirstBoot = "first_boot"
 
 	// client boot status
 	BootStatusFirst   = "first_boot"
@@ -3,7 +3,6 @@ package discovery
 import (
 	"encoding/json"
 	"io"
-	"math"
 	"net/http"
 	"strconv"
 	"time"
@@ -13,12 +12,14 @@ import (
 
 // Server represents a server's host and port.
 type Server struct {
-	Host        string `json:"host"`
-	Port        string `json:"port"`
-	ServiceType string `json:"service_type"`
+	Host        string  `json:"host"`
+	Port        string  `json:"port"`
+	ServiceType string  `json:"service_type"`
+	Load        float64 `json:"load"`
+	Healthy     bool    `json:"healthy"`
 }
 
-// Discovery discovers a server with the minimum request time.
+// Discovery returns the best-ranked server that answers its health check.
 func Discovery(host string, port int, serviceType string, timeout time.Duration) (string, int) {
 	// HTTP client with per-request timeout (seconds expected in timeout argument).
 	client := &http.Client{Timeout: timeout * time.Second}
@@ -65,11 +66,12 @@ func Discovery(host string, port int, serviceType string, timeout time.Duration)
 		return "", 0
 	}
 
-	// Pick server with minimal /health latency.
+	// Servers arrive ranked by the discovery service: healthy first, then
+	// by load and weight. Take the first one that answers /health, so new
+	// agents land on the least-loaded reachable node.
 	var (
-		serverHost      string
-		serverPortInt   int
-		minResponseTime = time.Duration(math.MaxInt64)
+		serverHost    string
+		serverPortInt int
 	)
 
 	for _, server := range servers {
@@ -80,7 +82,7 @@ func Discovery(host string, port int, serviceType string, timeout time.Duration)
 			continue
 		}
 
-		// Health-check URL to measure latency.
+		// Confirm the server is reachable from this agent.
 		serverURL := "http://" + server.Host + ":" + server.Port + "/api/v1.0/health"
 		start := time.Now()
 		response, err := client.Get(serverURL)
@@ -89,22 +91,19 @@ func Discovery(host string, port int, serviceType string, timeout time.Duration)
 			continue
 		}
 		response.Body.Close()
-
-		// Compare and keep the best.
-		responseTime := time.Since(start)
-		if responseTime < minResponseTime {
-			serverHost = server.Host
-			serverPortInt = portInt
-			minResponseTime = responseTime
-			logx.Infof("Current best: %s, time: %s", serverHost, minResponseTime)
+		if response.StatusCode != http.StatusOK {
+			continue
 		}
+
+		serverHost = server.Host
+		serverPortInt = portInt
+		logx.Infof("Selected %s (load %.2f, healthy %t), time: %s", serverHost, server.Load, server.Healthy, time.Since(start))
+		break
 	}
 
 	// Report result and return selected host and port.
 	if serverHost == "" {
 		logx.Infof("Can't reach any %s or list of servers are empty", serviceType)
-	} else {
-		logx.Infof("Nearest %s: %s, time: %s", serviceType, serverHost, minResponseTime)
 	}
 
 	return serverHost, serverPortInt
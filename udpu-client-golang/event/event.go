@@ -13,8 +13,6 @@ import (
 	"udpuClient/global"
 	"udpuClient/logx"
 	"udpuClient/repo"
-
-	"github.com/gorilla/websocket"
 )
 
 // updateVbuser sends a PATCH request to update vbuser fields.
@@ -43,11 +41,17 @@ func updateVbuser(url string, payload map[string]string) error {
 func processJob(data global.JobData) (string, error) {
 	host := fmt.Sprintf("%s:%d", *global.ServerHost, *global.ServerPort)
 
+	// Stream the output of jobs whose output the server asked for.
+	execute := global.ExecuteTrackedCommand
+	if data.RequireOutput == "true" {
+		execute = global.ExecuteStreamedCommand
+	}
+
 	if data.VbuserID != "" {
 		logx.Infof("Vbuser id: %s", data.VbuserID)
 		logx.Infof("Job type: %s; command: %s", data.JobType, data.Command)
 
-		output, err := global.ExecuteCommand(data.Command, data.Name)
+		output, err := execute(data.Command, data.Name, data.ExecutionID)
 		if err != nil {
 			logx.Infof("Error executing command: %v;", err)
 			return "", err
@@ -79,7 +83,7 @@ func processJob(data global.JobData) (string, error) {
 
 	// No vbuser context. Just run the job.
 	logx.Infof("Job name: %s; command: %s", data.Name, data.Command)
-	output, err := global.ExecuteCommand(data.Command, data.Name)
+	output, err := execute(data.Command, data.Name, data.ExecutionID)
 	if err != nil {
 		logx.Infof("Error executing command: %v;", err)
 		return "", err
@@ -123,6 +127,8 @@ func downloadRequiredSoftware(softwareIDs []string) {
 
 // JobEvent handles job events: persist, schedule, execute, and optionally respond.
 func JobEvent(data global.JobData) {
+	defer global.EndExecution(data.ExecutionID)
+
 	// Skip locked jobs.
 	if data.Locked != "false" {
 		return
@@ -178,19 +184,15 @@ func JobEvent(data global.JobData) {
 	responseMessage := map[string]interface{}{
 		"response": output,
 	}
-	responseMsg, err := json.Marshal(responseMessage)
-	if err != nil {
-		logx.Infof("Error marshalling response message: %v", err)
-		return
-	}
-
-	if err = global.WSConn.WriteMessage(websocket.TextMessage, responseMsg); err != nil {
+	if err = global.SendWS(responseMessage); err != nil {
 		logx.Infof("Error sending response message: %v", err)
 	}
 }
 
 // QueueEvent resolves and executes jobs from a queue and optionally replies.
 func QueueEvent(data global.QueueData) {
+	defer global.EndExecution(data.ExecutionID)
+
 	// Skip locked queues.
 	if data.Locked != "false" {
 		return
@@ -200,11 +202,11 @@ func QueueEvent(data global.QueueData) {
 	sUrl := url.URL{
 		Scheme: "http",
 		Host:   serverHost,
-		Path:   "/api/v1.0/jobs/",
+		Path:   "/api/v1.0/queues/" + data.Name + "/expanded",
 	}
 
-	// Fetch filtered jobs for this queue.
-	jobs, err := global.GetFilteredJobs(sUrl.String(), data.Jobs)
+	// Fetch the queue's resolved jobs in one request.
+	jobs, err := global.GetQueueJobs(sUrl.String())
 	if err != nil {
 		logx.Infof("%v", err)
 		return
@@ -219,7 +221,7 @@ func QueueEvent(data global.QueueData) {
 
 		// Execute only if output is required.
 		if job.RequireOutput == "true" {
-			output, err := global.ExecuteCommand(job.Command, job.Name)
+			output, err := global.ExecuteStreamedCommand(job.Command, job.Name, data.ExecutionID)
 			if err != nil {
 				logx.Infof("Error executing command: %v;", err)
 				continue
@@ -228,13 +230,7 @@ func QueueEvent(data global.QueueData) {
 			responseMessage := map[string]interface{}{
 				"response": output,
 			}
-			responseMsg, err := json.Marshal(responseMessage)
-			if err != nil {
-				logx.Infof("Error marshalling response message: %v", err)
-				continue
-			}
-
-			if err = global.WSConn.WriteMessage(websocket.TextMessage, responseMsg); err != nil {
+			if err = global.SendWS(responseMessage); err != nil {
 				logx.Infof("Error sending response message: %v", err)
 			}
 		}
@@ -25,7 +25,8 @@ import (
 
 var globalHTTPClient = &http.Client{Timeout: 10 * time.Second}
 
-// WSConn is a global WebSocket connection shared across modules.
+// WSConn is a global WebSocket connection shared across modules; use
+// SetWSConn, CurrentWSConn and SendWS rather than the variable.
 var WSConn *websocket.Conn
 
 // Global pointers to runtime configuration.
@@ -48,13 +49,15 @@ type JobData struct {
 	Name             string `json:"name"`
 	RequireOutput    string `json:"require_output"`
 	JobType          string `json:"type"`
+	ExecutionID      string `json:"execution_id"`
 }
 
 // QueueData describes a queue with a list of jobs.
 type QueueData struct {
-	Name   string `json:"name"`
-	Jobs   string `json:"jobs"`
-	Locked string `json:"locked"`
+	Name        string `json:"name"`
+	Jobs        string `json:"jobs"`
+	Locked      string `json:"locked"`
+	ExecutionID string `json:"execution_id"`
 }
 
 // ExecuteJobData is a minimal payload to schedule and run a job.
@@ -64,7 +67,14 @@ type ExecuteJobData struct {
 	RequireOutput string
 }
 
-func sendJobLog(name, command, stdOut, stdErr string, statusCode int) {
+// commandRun identifies one command execution in its job log.
+type commandRun struct {
+	executionID string
+	startedAt   time.Time
+	duration    time.Duration
+}
+
+func sendJobLog(name, command, stdOut, stdErr string, statusCode int, run commandRun) {
 
 	client, err := database.GetClient()
 	if err != nil {
@@ -73,13 +83,16 @@ func sendJobLog(name, command, stdOut, stdErr string, statusCode int) {
 	}
 
 	data := types.JobLog{
-		Client:     client.Name,
-		Name:       name,
-		Command:    command,
-		StdErr:     stdErr,
-		StdOut:     stdOut,
-		StatusCode: strconv.Itoa(statusCode),
-		Timestamp:  time.Now().UTC().Format(time.RFC3339),
+		Client:      client.Name,
+		Name:        name,
+		Command:     command,
+		StdErr:      stdErr,
+		StdOut:      stdOut,
+		StatusCode:  strconv.Itoa(statusCode),
+		Timestamp:   time.Now().UTC().Format(time.RFC3339),
+		ExecutionID: run.executionID,
+		StartedAt:   run.startedAt.UTC().Format(time.RFC3339Nano),
+		DurationMs:  run.duration.Milliseconds(),
 	}
 
 	parts := make([]string, 0, 4)
@@ -123,6 +136,23 @@ func sendJobLog(name, command, stdOut, stdErr string, statusCode int) {
 
 // ExecuteCommand runs a shell command and returns stdout or stderr on error.
 func ExecuteCommand(command string, name string) (string, error) {
+	return ExecuteTrackedCommand(command, name, "")
+}
+
+// ExecuteTrackedCommand runs a shell command sent by the server; its job log
+// carries the server's execution id so the server can time every stage.
+func ExecuteTrackedCommand(command string, name string, executionID string) (string, error) {
+	return runCommand(command, name, executionID, false)
+}
+
+// ExecuteStreamedCommand is ExecuteTrackedCommand for commands whose output
+// the server asked for: the output and exit code are also streamed to the
+// server while the command runs.
+func ExecuteStreamedCommand(command string, name string, executionID string) (string, error) {
+	return runCommand(command, name, executionID, executionID != "")
+}
+
+func runCommand(command string, name string, executionID string, stream bool) (string, error) {
 	// Normalize quotes for shell execution.
 	command = strings.ReplaceAll(command, "'", "\"")
 	logx.Infof("Execute command: %s", command)
@@ -135,7 +165,17 @@ func ExecuteCommand(command string, name string) (string, error) {
 	cmd.Stdout = &stdout
 	cmd.Stderr = &stderr
 
+	var streamed *commandOutput
+	if stream {
+		streamed = newCommandOutput(executionID, name)
+		cmd.Stdout = io.MultiWriter(&stdout, streamed.stdout)
+		cmd.Stderr = io.MultiWriter(&stderr, streamed.stderr)
+		streamed.start()
+	}
+
+	startedAt := time.Now()
 	err := cmd.Run()
+	duration := time.Since(startedAt)
 
 	output := strings.TrimSpace(stdout.String())
 	errorOutput := strings.TrimSpace(stderr.String())
@@ -145,7 +185,11 @@ func ExecuteCommand(command string, name string) (string, error) {
 		exitCode = cmd.ProcessState.ExitCode()
 	}
 
-	go sendJobLog(name, command, output, errorOutput, exitCode)
+	if streamed != nil {
+		streamed.finish(exitCode)
+	}
+
+	go sendJobLog(name, command, output, errorOutput, exitCode, commandRun{executionID, startedAt, duration})
 
 	if err != nil {
 		return errorOutput, fmt.Errorf("Error: %v, stderr: %s", err, errorOutput)
@@ -167,13 +211,7 @@ func ExecuteJob(data ExecuteJobData) {
 		"response": output,
 	}
 
-	msg, err := json.Marshal(payload)
-	if err != nil {
-		logx.Infof("Error marshalling payload: %v", err)
-		return
-	}
-
-	if err := WSConn.WriteMessage(websocket.TextMessage, msg); err != nil {
+	if err := SendWS(payload); err != nil {
 		logx.Infof("Error sending payload: %v", err)
 		return
 	}
@@ -254,6 +292,36 @@ func GetJobs(url string) []JobData {
 	return jobs
 }
 
+// AgentBundle is the part of GET /agent/{uid}/bundle the agent uses at
+// boot: the jobs of its role.
+type AgentBundle struct {
+	Revision int       `json:"revision"`
+	Jobs     []JobData `json:"jobs"`
+}
+
+// GetBundle fetches the bootstrap bundle of the agent, nil on failure.
+func GetBundle(url string) *AgentBundle {
+	resp, err := http.Get(url)
+	if err != nil {
+		logx.Infof("Error making request: %v", err)
+		return nil
+	}
+	defer resp.Body.Close()
+
+	if resp.StatusCode != http.StatusOK {
+		logx.Infof("Bad status code: %d", resp.StatusCode)
+		return nil
+	}
+
+	var bundle AgentBundle
+	if err := json.NewDecoder(resp.Body).Decode(&bundle); err != nil {
+		logx.Infof("Error unmarshalling JSON: %v", err)
+		return nil
+	}
+
+	return &bundle
+}
+
 // ScheduleJob schedules periodic execution according to frequency.
 func ScheduleJob(jobFrequency string, data ExecuteJobData) {
 	c := cron.New()
@@ -285,41 +353,27 @@ func ScheduleJob(jobFrequency string, data ExecuteJobData) {
 	c.Start()
 }
 
-// GetFilteredJobs requests jobs filtered by a comma-separated list.
-func GetFilteredJobs(baseURL string, jobList string) ([]JobData, error) {
-	u, err := url.Parse(baseURL)
+// GetQueueJobs requests the resolved job definitions of a queue, in queue order.
+func GetQueueJobs(baseURL string) ([]JobData, error) {
+	resp, err := globalHTTPClient.Get(baseURL)
 	if err != nil {
-		logx.Fatalf("%v", err)
-		return nil, err
-	}
-
-	q := u.Query()
-	q.Set("filter_by", jobList)
-	u.RawQuery = q.Encode()
-
-	resp, err := http.Get(u.String())
-	if err != nil {
-		logx.Fatalf("%v", err)
+		logx.Infof("Can't get queue jobs: %v", err)
 		return nil, err
 	}
 	defer resp.Body.Close()
 
 	if resp.StatusCode != http.StatusOK {
-		logx.Infof("Can't get filtered jobs; response status: %d", resp.StatusCode)
+		logx.Infof("Can't get queue jobs; response status: %d", resp.StatusCode)
 		return nil, fmt.Errorf("bad status: %d", resp.StatusCode)
 	}
 
-	body, err := io.ReadAll(resp.Body)
-	if err != nil {
-		logx.Fatalf("%v", err)
-		return nil, err
+	var expanded struct {
+		Jobs []JobData `json:"jobs"`
 	}
-
-	var jobs []JobData
-	if err := json.Unmarshal(body, &jobs); err != nil {
-		logx.Fatalf("%v", err)
+	if err := json.NewDecoder(resp.Body).Decode(&expanded); err != nil {
+		logx.Infof("Can't decode queue jobs: %v", err)
 		return nil, err
 	}
 
-	return jobs, nil
+	return expanded.Jobs, nil
 }
@@ -0,0 +1,165 @@
+package global
+
+import (
+	"bytes"
+	"encoding/json"
+	"errors"
+	"sync"
+	"time"
+
+	"udpuClient/logx"
+
+	"github.com/gorilla/websocket"
+)
+
+// Output streaming of commands dispatched by the server:
+// while a command runs, what it prints is sent in chunks tagged with the
+// execution id, then its exit code; once a job or queue is done, an end
+// marker. The server keeps them as the execution's output.
+const (
+	outputFlushInterval = 250 * time.Millisecond // How often pending output is sent
+	outputChunkLimit    = 32 * 1024              // Bytes sent even without a line break
+)
+
+// wsWriteMu guards writes to WSConn and the swap of WSConn on reconnect.
+var wsWriteMu sync.Mutex
+
+// SetWSConn installs the connection of a new session; an ongoing write
+// finishes on the old one first.
+func SetWSConn(conn *websocket.Conn) {
+	wsWriteMu.Lock()
+	defer wsWriteMu.Unlock()
+	WSConn = conn
+}
+
+// CurrentWSConn returns the connection of the current session, or nil.
+func CurrentWSConn() *websocket.Conn {
+	wsWriteMu.Lock()
+	defer wsWriteMu.Unlock()
+	return WSConn
+}
+
+// SendWS writes payload as one JSON text frame. The connection allows a
+// single writer at a time, so every write goes through here.
+func SendWS(payload interface{}) error {
+	msg, err := json.Marshal(payload)
+	if err != nil {
+		return err
+	}
+
+	wsWriteMu.Lock()
+	defer wsWriteMu.Unlock()
+	if WSConn == nil {
+		return errors.New("websocket is not connected")
+	}
+	return WSConn.WriteMessage(websocket.TextMessage, msg)
+}
+
+// EndExecution tells the server the agent is done with an execution.
+func EndExecution(executionID string) {
+	if executionID == "" {
+		return
+	}
+	if err := SendWS(map[string]interface{}{"execution_id": executionID, "end": true}); err != nil {
+		logx.Infof("Error sending end of execution %s: %v", executionID, err)
+	}
+}
+
+// outputStream collects what a command writes to stdout or stderr.
+type outputStream struct {
+	mu          sync.Mutex
+	executionID string
+	job         string
+	name        string
+	buf         bytes.Buffer
+}
+
+func (s *outputStream) Write(p []byte) (int, error) {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	return s.buf.Write(p)
+}
+
+// flush sends the complete lines written so far; everything when final,
+// or when a line grows past outputChunkLimit.
+func (s *outputStream) flush(final bool) {
+	s.mu.Lock()
+	data := s.buf.Bytes()
+	n := len(data)
+	if !final && n < outputChunkLimit {
+		n = bytes.LastIndexByte(data, '\n') + 1
+	}
+	if n == 0 {
+		s.mu.Unlock()
+		return
+	}
+	chunk := string(data[:n])
+	s.buf.Next(n)
+	s.mu.Unlock()
+
+	payload := map[string]string{
+		"execution_id": s.executionID,
+		"job":          s.job,
+		"stream":       s.name,
+		"output":       chunk,
+	}
+	if err := SendWS(payload); err != nil {
+		logx.Infof("Error sending %s of %s: %v", s.name, s.job, err)
+	}
+}
+
+// commandOutput streams one command's stdout and stderr while it runs.
+type commandOutput struct {
+	executionID string
+	job         string
+	stdout      *outputStream
+	stderr      *outputStream
+	stop        chan struct{}
+	stopped     chan struct{}
+}
+
+func newCommandOutput(executionID, job string) *commandOutput {
+	return &commandOutput{
+		executionID: executionID,
+		job:         job,
+		stdout:      &outputStream{executionID: executionID, job: job, name: "stdout"},
+		stderr:      &outputStream{executionID: executionID, job: job, name: "stderr"},
+		stop:        make(chan struct{}),
+		stopped:     make(chan struct{}),
+	}
+}
+
+// start sends pending output every outputFlushInterval until finish.
+func (o *commandOutput) start() {
+	go func() {
+		defer close(o.stopped)
+		ticker := time.NewTicker(outputFlushInterval)
+		defer ticker.Stop()
+		for {
+			select {
+			case <-ticker.C:
+				o.stdout.flush(false)
+				o.stderr.flush(false)
+			case <-o.stop:
+				return
+			}
+		}
+	}()
+}
+
+// finish sends the rest of the output and the exit code.
+func (o *commandOutput) finish(exitCode int) {
+	close(o.stop)
+	<-o.stopped
+	o.stdout.flush(true)
+	o.stderr.flush(true)
+
+	payload := map[string]interface{}{
+		"execution_id": o.executionID,
+		"job":          o.job,
+		"exit_code":    exitCode,
+	}
+	if err := SendWS(payload); err != nil {
+		logx.Infof("Error sending exit code of %s: %v", o.job, err)
+	}
+}
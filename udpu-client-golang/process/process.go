@@ -70,8 +70,7 @@ func ProcessUdpuData(respObj *response.ServerResponse) {
 	}
 
 	if client.BootStatus == constants.BootStatusFirst {
-		urlStr := rest.CreateURL("http", nil, "roles", client.UdpuRole, "jobs")
-		firstBootJobsList := global.GetJobs(urlStr)
+		firstBootJobsList := firstBootJobs(respObj.SubscriberUID, client.UdpuRole)
 
 		if firstBootJobsList != nil {
 			jobs.UpdateJobs(firstBootJobsList)
@@ -92,3 +91,20 @@ func ProcessUdpuData(respObj *response.ServerResponse) {
 
 	jobs.ProcessScheduledJobs(database.GetJobsScheduled())
 }
+
+// firstBootJobs returns the first-boot jobs of the role from the agent
+// bundle, or from the role's jobs when the server serves no bundle.
+func firstBootJobs(subscriberUID, role string) []global.JobData {
+	bundle := global.GetBundle(rest.CreateURL("http", nil, "agent", subscriberUID, "bundle"))
+	if bundle == nil {
+		return global.GetJobs(rest.CreateURL("http", nil, "roles", role, "jobs"))
+	}
+
+	var jobsList []global.JobData
+	for _, job := range bundle.Jobs {
+		if job.Frequency == constants.FirstBoot {
+			jobsList = append(jobsList, job)
+		}
+	}
+	return jobsList
+}
@@ -53,11 +53,14 @@ func NewUdpuUpdate(r *response.ServerResponse) UdpuUpdate {
 }
 
 type JobLog struct {
-	Client     string `json:"client"`
-	Name       string `json:"name"`
-	Command    string `json:"command"`
-	StdErr     string `json:"std_err"`
-	StdOut     string `json:"std_out"`
-	StatusCode string `json:"status_code"`
-	Timestamp  string `json:"timestamp"`
+	Client      string `json:"client"`
+	Name        string `json:"name"`
+	Command     string `json:"command"`
+	StdErr      string `json:"std_err"`
+	StdOut      string `json:"std_out"`
+	StatusCode  string `json:"status_code"`
+	Timestamp   string `json:"timestamp"`
+	ExecutionID string `json:"execution_id,omitempty"` // set for commands the server dispatched
+	StartedAt   string `json:"started_at"`
+	DurationMs  int64  `json:"duration_ms"`
 }
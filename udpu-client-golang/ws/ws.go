@@ -1,9 +1,15 @@
 package ws
 
 import (
+	"errors"
+	"math/rand"
 	"net/url"
+	"strconv"
+	"strings"
 	"time"
 
+	"udpuClient/constants"
+
 	"udpuClient/global"
 	"udpuClient/logx"
 	"udpuClient/process"
@@ -30,20 +36,22 @@ func InitWS(subscriberUID string) *websocket.Conn {
 	for {
 		conn, err := connectWS(subscriberUID)
 		if err != nil {
-			logx.Infof("WebSocket connection error: %v. Retrying in 5 seconds...", err)
-			time.Sleep(5 * time.Second)
+			delay := withJitter(constants.WSReconnectDelay)
+			logx.Infof("WebSocket connection error: %v. Retrying in %s...", err, delay)
+			time.Sleep(delay)
 			continue
 		}
 		logx.Infof("WebSocket connected successfully")
-		global.WSConn = conn
+		global.SetWSConn(conn)
 		return conn
 	}
 }
 
 // ListenWS reads messages forever and dispatches processing.
 func ListenWS() error {
+	conn := global.CurrentWSConn()
 	for {
-		_, message, err := global.WSConn.ReadMessage()
+		_, message, err := conn.ReadMessage()
 		if err != nil {
 			logx.Infof("WebSocket read error: %v", err)
 			return err
@@ -51,3 +59,25 @@ func ListenWS() error {
 		process.ProcessAndRespondAsync(message)
 	}
 }
+
+// ReconnectDelay returns how long to wait before reconnecting after err.
+// A server that is busy closes with 1013 (try again later) and a
+// "retry-after=<seconds>" reason; otherwise the default delay applies.
+// Jitter spreads the reconnects of a fleet that dropped at the same time.
+func ReconnectDelay(err error) time.Duration {
+	delay := constants.WSReconnectDelay
+	var closeErr *websocket.CloseError
+	if errors.As(err, &closeErr) && closeErr.Code == websocket.CloseTryAgainLater {
+		if seconds, ok := strings.CutPrefix(closeErr.Text, "retry-after="); ok {
+			if n, err := strconv.Atoi(seconds); err == nil && n > 0 {
+				delay = time.Duration(n) * time.Second
+			}
+		}
+	}
+	return withJitter(delay)
+}
+
+// withJitter adds up to a quarter of delay at random.
+func withJitter(delay time.Duration) time.Duration {
+	return delay + time.Duration(rand.Int63n(int64(delay)/4+1))
+}